@@ -0,0 +1,426 @@
+# ====================================================================================
+# Apex BOT - オフライン バックテスト
+# 過去のOHLCV (CSV/Parquet) に対して、main_render.py と同じ指標計算・スコアリング・
+# 動的ロット・クールダウン・SL/TP決済を足ごとに再生し、取引履歴/資産曲線/統計を出力する。
+#
+# 使い方:
+#   python backtest.py all_data.csv
+#   python backtest.py data/ --timeframe 5m --initial-balance 1000 --output-dir backtest_results
+# ====================================================================================
+
+import os
+import sys
+import glob
+import json
+import math
+import heapq
+import logging
+import argparse
+from typing import Dict, List, Optional, Tuple, Any
+
+import numpy as np
+import pandas as pd
+
+import main_render as bot
+
+# OHLCVファイルの日時列として認識する列名 (小文字)
+TIME_COLUMN_CANDIDATES = ('timestamp', 'time', 'date', 'datetime', 'open_time')
+# タイムフレームの推定に使用する候補
+KNOWN_TIMEFRAMES = ('1m', '3m', '5m', '15m', '30m', '1h', '2h', '4h', '6h', '8h', '12h', '1d', '1w')
+
+DEFAULT_INITIAL_BALANCE = 1000.0 # 初期USDT残高
+DEFAULT_FEE_RATE = 0.001         # 片道の取引手数料率 (0.1%)
+DEFAULT_MAX_VOLUME_PARTICIPATION = 0.10 # IOC注文が約定できるのは、その足の出来高のこの割合まで (0以下で無制限)
+
+
+# ====================================================================================
+# DATA LOADING
+# ====================================================================================
+
+def _to_milliseconds(values: pd.Series) -> np.ndarray:
+    """ 日時列 (UNIX秒/ミリ秒 または日時文字列) をUNIXミリ秒に変換する """
+    if pd.api.types.is_numeric_dtype(values):
+        ts = values.to_numpy(dtype=np.float64)
+        # 1e11 未満はUNIX秒とみなす
+        return ts * 1000.0 if np.nanmax(ts) < 1e11 else ts
+    dt = pd.to_datetime(values, utc=True)
+    return (dt - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(milliseconds=1)
+
+def normalize_ohlcv(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    任意の列名のOHLCVを main_render.OHLCV_COLUMNS の形式 (timestamp: UNIXミリ秒) に揃える。
+    open/high/low が無いデータ (例: all_data.csv の Date/Close/Volume) は、
+    始値を前の足の終値とし、高値/安値を始値と終値から補完する。
+    """
+    columns = {col: str(col).strip().lower() for col in df.columns}
+    df = df.rename(columns=columns)
+
+    time_column = next((col for col in TIME_COLUMN_CANDIDATES if col in df.columns), None)
+    if time_column is None:
+        raise ValueError(f"日時列が見つかりません (候補: {', '.join(TIME_COLUMN_CANDIDATES)})")
+    for col in ('close', 'volume'):
+        if col not in df.columns:
+            raise ValueError(f"'{col}' 列が見つかりません")
+
+    out = pd.DataFrame({
+        'timestamp': np.asarray(_to_milliseconds(df[time_column]), dtype=np.float64),
+        'close': pd.to_numeric(df['close'], errors='coerce').to_numpy(dtype=np.float64),
+        'volume': pd.to_numeric(df['volume'], errors='coerce').to_numpy(dtype=np.float64),
+    })
+    for col in ('open', 'high', 'low'):
+        out[col] = pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64) if col in df.columns else np.nan
+
+    out = out.dropna(subset=['timestamp', 'close'])
+    out = out.sort_values('timestamp').drop_duplicates('timestamp', keep='last').reset_index(drop=True)
+
+    # 欠けている始値/高値/安値を補完
+    previous_close = out['close'].shift(1).fillna(out['close'])
+    out['open'] = out['open'].fillna(previous_close)
+    out['high'] = out['high'].fillna(np.maximum(out['open'], out['close']))
+    out['low'] = out['low'].fillna(np.minimum(out['open'], out['close']))
+    out['volume'] = out['volume'].fillna(0.0)
+    return out[list(bot.OHLCV_COLUMNS)]
+
+def _read_table(path: str) -> pd.DataFrame:
+    if path.lower().endswith(('.parquet', '.pq')):
+        # Parquetの読み込みには pyarrow (または fastparquet) が必要
+        return pd.read_parquet(path)
+    return pd.read_csv(path)
+
+def load_ohlcv_files(paths: List[str]) -> Dict[str, pd.DataFrame]:
+    """
+    CSV/Parquetファイル (またはそれらを含むディレクトリ/globパターン) からOHLCVを読み込む。
+    'symbol' 列があるファイルは銘柄ごとに分割し、無いファイルはファイル名 (拡張子なし) を銘柄名とする。
+
+    Returns:
+        Dict[str, pd.DataFrame]: 銘柄ごとのOHLCV (列: main_render.OHLCV_COLUMNS)
+    """
+    files: List[str] = []
+    for path in paths:
+        if os.path.isdir(path):
+            for pattern in ('*.csv', '*.parquet', '*.pq'):
+                files.extend(sorted(glob.glob(os.path.join(path, pattern))))
+        else:
+            matched = sorted(glob.glob(path))
+            files.extend(matched if matched else [path])
+
+    data: Dict[str, pd.DataFrame] = {}
+    for file in files:
+        table = _read_table(file)
+        symbol_column = next((col for col in table.columns if str(col).strip().lower() == 'symbol'), None)
+        if symbol_column is not None:
+            for symbol, group in table.groupby(symbol_column, sort=True):
+                data[str(symbol)] = normalize_ohlcv(group.drop(columns=[symbol_column]))
+        else:
+            data[os.path.splitext(os.path.basename(file))[0]] = normalize_ohlcv(table)
+    return data
+
+def infer_timeframe(data: Dict[str, pd.DataFrame]) -> str:
+    """ 足の間隔 (中央値) からタイムフレーム文字列を推定する """
+    intervals = [np.median(np.diff(df['timestamp'].to_numpy())) for df in data.values() if len(df) > 1]
+    if not intervals:
+        raise ValueError("タイムフレームを推定できるだけのデータがありません")
+    interval = float(np.median(intervals))
+    return min(KNOWN_TIMEFRAMES, key=lambda tf: abs(bot.get_timeframe_ms(tf) - interval))
+
+
+# ====================================================================================
+# INDICATORS & SCORING
+# ====================================================================================
+
+def prepare_indicators(data: Dict[str, pd.DataFrame]) -> Dict[str, pd.DataFrame]:
+    """
+    銘柄ごとに calculate_technical_indicators で全期間の指標を計算する。
+    スコアリング定数を変えて何度もバックテストする場合は、この結果を使い回す。
+    """
+    frames = {}
+    for symbol, df in data.items():
+        if len(df) < bot.LONG_TERM_SMA_LENGTH:
+            logging.warning(f"⚠️ {symbol}: データ不足 ({len(df)}本) のためスキップします。")
+            continue
+        frames[symbol] = bot.calculate_technical_indicators(df.copy())
+    return frames
+
+def estimate_quote_volume(df: pd.DataFrame, timeframe: str) -> float:
+    """ 流動性ボーナス用に、24時間のUSDT出来高 (quoteVolume) の中央値を推定する """
+    bars_per_day = max(1, int(24 * 60 * 60 * 1000 // bot.get_timeframe_ms(timeframe)))
+    quote_volume = (df['close'] * df['volume']).rolling(window=bars_per_day, min_periods=1).sum()
+    return float(quote_volume.median())
+
+def compute_scores(frames: Dict[str, pd.DataFrame], timeframe: str, macro_context: Dict, params: Optional[Dict[str, float]] = None) -> Dict[str, pd.DataFrame]:
+    """
+    score_signal_vectorized で銘柄ごとに全ての足のスコアを計算する。
+    score_signal がシグナルを返さない足 (データ不足、ATRが不正) のスコアは NaN にする。
+    """
+    scores = {}
+    for symbol, df in frames.items():
+        market_ticker = {'symbol': symbol, 'quoteVolume': estimate_quote_volume(df, timeframe)}
+        result = bot.score_signal_vectorized(df, market_ticker, macro_context, params)
+        atr = result['atr_value'].to_numpy()
+        invalid = np.isnan(atr) | (atr <= 0)
+        invalid[:bot.LONG_TERM_SMA_LENGTH - 1] = True
+        result.loc[invalid, 'score'] = np.nan
+        scores[symbol] = result
+    return scores
+
+
+# ====================================================================================
+# SIMULATION
+# ====================================================================================
+
+def _find_exit(high: np.ndarray, low: np.ndarray, open_: np.ndarray, start: int, stop_loss: float, take_profit: float) -> Tuple[Optional[int], float, str]:
+    """
+    start 番目以降の足で、最初にSL/TPに到達した足を探す。
+    同じ足で両方に到達した場合は、足の中の順序が分からないためSLを優先する (保守的)。
+    SLを下回って寄り付いた場合は始値で約定したものとする。
+
+    Returns:
+        Tuple[Optional[int], float, str]: (決済した足の位置, 決済価格, 理由)。到達しなかった場合の位置は None
+    """
+    n = len(high)
+    chunk = 256
+    while start < n:
+        end = min(n, start + chunk)
+        hit = np.flatnonzero((low[start:end] <= stop_loss) | (high[start:end] >= take_profit))
+        if hit.size:
+            j = start + int(hit[0])
+            if low[j] <= stop_loss:
+                return j, min(stop_loss, open_[j]), 'stop_loss'
+            return j, max(take_profit, open_[j]), 'take_profit'
+        start = end
+        chunk *= 4
+    return None, np.nan, 'end_of_data'
+
+def simulate(frames: Dict[str, pd.DataFrame], scores: Dict[str, pd.DataFrame], timeframe: str, threshold: float,
+             initial_balance: float = DEFAULT_INITIAL_BALANCE, fee_rate: float = DEFAULT_FEE_RATE,
+             max_volume_participation: float = DEFAULT_MAX_VOLUME_PARTICIPATION,
+             cooldown_seconds: float = None) -> Dict[str, Any]:
+    """
+    main_bot_loop の取引ロジックを、各足の確定時点 (終値) を1サイクルとして再生する。
+
+    - クールダウン中の銘柄は分析対象から外し、残りの銘柄で最高スコアのシグナルを1つだけ選ぶ
+    - 閾値未満、残高不足 (MIN_USDT_BALANCE_FOR_TRADE)、同じ銘柄のポジション保有中の場合は取引しない
+    - ロットは calculate_dynamic_lot_size (総資産はポジションを終値で評価した額) で決定する
+    - エントリーは終値の指値IOC注文とし、足の出来高の max_volume_participation 倍までしか約定しない (部分約定)
+    - SL/TPは calculate_stop_loss_take_profit で計算し、次の足から高値/安値で判定する
+    - クールダウンは取引の成否に関わらず、取引を試みた時点から開始する
+
+    Returns:
+        Dict[str, Any]: {'trades': 取引履歴, 'equity': 資産曲線, 'stats': 統計}
+    """
+    if cooldown_seconds is None:
+        cooldown_seconds = bot.TRADE_SIGNAL_COOLDOWN
+    cooldown_ms = cooldown_seconds * 1000.0
+
+    symbols = list(scores)
+    if not symbols:
+        raise ValueError("バックテスト可能な銘柄がありません")
+
+    # 全銘柄の足を1本の時間軸に揃える
+    timeline = np.unique(np.concatenate([frames[s]['timestamp'].to_numpy(dtype=np.float64) for s in symbols]))
+    n_bars, n_symbols = len(timeline), len(symbols)
+    positions_in_timeline = [np.searchsorted(timeline, frames[s]['timestamp'].to_numpy(dtype=np.float64)) for s in symbols]
+    score_matrix = np.full((n_bars, n_symbols), -np.inf) # シグナルが無い足は -inf
+    close_matrix = np.full((n_bars, n_symbols), np.nan)
+    for k, s in enumerate(symbols):
+        score_matrix[positions_in_timeline[k], k] = np.nan_to_num(scores[s]['score'].to_numpy(), nan=-np.inf)
+        close_matrix[positions_in_timeline[k], k] = frames[s]['close'].to_numpy(dtype=np.float64)
+    close_matrix = pd.DataFrame(close_matrix).ffill().to_numpy() # 足が無い時刻は直前の終値で評価
+
+    arrays = [{col: frames[s][col].to_numpy(dtype=np.float64) for col in ('open', 'high', 'low', 'close', 'volume')} for s in symbols]
+    atr = [scores[s]['atr_value'].to_numpy() for s in symbols]
+
+    cash = initial_balance
+    cash_changes = np.zeros(n_bars)
+    last_trade_time = np.full(n_symbols, -np.inf)
+    open_positions: Dict[int, float] = {} # 銘柄 -> 保有数量
+    exit_queue: List[Tuple[int, int, int]] = [] # (決済時刻の位置, 取引番号, 銘柄)
+    trades: List[Dict] = []
+    holdings = np.zeros(n_bars) # 保有ポジションの評価額
+
+    def settle(until: int):
+        nonlocal cash
+        while exit_queue and exit_queue[0][0] <= until:
+            g, trade_id, k = heapq.heappop(exit_queue)
+            trade = trades[trade_id]
+            proceeds = trade['amount'] * trade['exit_price'] * (1 - fee_rate)
+            cash += proceeds
+            cash_changes[g] += proceeds
+            trade['pnl_usdt'] = proceeds - trade['cost_usdt']
+            trade['pnl_percent'] = trade['pnl_usdt'] / trade['cost_usdt'] * 100
+            del open_positions[k]
+
+    # 閾値以上のシグナルが存在する足だけを処理する
+    candidate_bars = np.flatnonzero(score_matrix.max(axis=1) >= threshold)
+
+    for g in candidate_bars:
+        settle(g)
+        now = timeline[g]
+        row = np.where(now - last_trade_time < cooldown_ms, -np.inf, score_matrix[g])
+        k = int(np.argmax(row))
+        score = float(row[k])
+        if score < threshold or k in open_positions or cash < bot.MIN_USDT_BALANCE_FOR_TRADE:
+            continue
+
+        j = int(np.searchsorted(positions_in_timeline[k], g))
+        a = arrays[k]
+        entry_price = a['close'][j]
+        stop_loss, take_profit, rr_ratio = bot.calculate_stop_loss_take_profit(entry_price, atr[k][j])
+        if stop_loss >= entry_price or take_profit <= entry_price:
+            continue
+
+        equity = cash + sum(amount * close_matrix[g, i] for i, amount in open_positions.items())
+        lot_size_usdt, _ = bot.calculate_dynamic_lot_size(score, cash, equity)
+        last_trade_time[k] = now # クールダウンは取引の成否に関わらず更新
+        if lot_size_usdt <= 0:
+            continue
+
+        amount = lot_size_usdt / entry_price
+        if max_volume_participation > 0:
+            amount = min(amount, a['volume'][j] * max_volume_participation)
+        if amount <= 0:
+            continue
+
+        cost = amount * entry_price * (1 + fee_rate)
+        cash -= cost
+        cash_changes[g] -= cost
+        exit_j, exit_price, reason = _find_exit(a['high'], a['low'], a['open'], j + 1, stop_loss, take_profit)
+        if exit_j is None:
+            # データ終了まで決済されなかったポジションは最終足の終値で決済したものとする
+            exit_j, exit_price = len(a['close']) - 1, a['close'][-1]
+        exit_g = int(positions_in_timeline[k][exit_j])
+
+        trade = {
+            'symbol': symbols[k],
+            'timeframe': timeframe,
+            'score': score,
+            'entry_time': now,
+            'entry_price': entry_price,
+            'amount': amount,
+            'lot_size_usdt': lot_size_usdt,
+            'cost_usdt': cost,
+            'partial_fill': amount * entry_price < lot_size_usdt * (1 - 1e-9),
+            'stop_loss': stop_loss,
+            'take_profit': take_profit,
+            'rr_ratio': rr_ratio,
+            'exit_time': timeline[exit_g],
+            'exit_price': exit_price,
+            'exit_reason': reason,
+            'bars_held': exit_j - j,
+            'pnl_usdt': np.nan,
+            'pnl_percent': np.nan,
+        }
+        trades.append(trade)
+        open_positions[k] = amount
+        heapq.heappush(exit_queue, (exit_g, len(trades) - 1, k))
+        # 保有区間 (エントリーの足から決済の前の足まで) を終値で評価する
+        holdings[g:exit_g] += amount * close_matrix[g:exit_g, k]
+
+    settle(n_bars)
+    equity = pd.Series(initial_balance + np.cumsum(cash_changes) + holdings, index=pd.to_datetime(timeline, unit='ms', utc=True), name='equity')
+    trades_df = pd.DataFrame(trades, columns=list(trades[0]) if trades else None)
+    for col in ('entry_time', 'exit_time'):
+        if col in trades_df:
+            trades_df[col] = pd.to_datetime(trades_df[col], unit='ms', utc=True)
+    return {'trades': trades_df, 'equity': equity, 'stats': summarize(trades_df, equity, timeframe, initial_balance)}
+
+
+# ====================================================================================
+# STATISTICS & ENTRY POINT
+# ====================================================================================
+
+def summarize(trades: pd.DataFrame, equity: pd.Series, timeframe: str, initial_balance: float) -> Dict[str, Any]:
+    """ 取引履歴と資産曲線から統計をまとめる """
+    final_equity = float(equity.iloc[-1]) if len(equity) else initial_balance
+    drawdown = equity / equity.cummax() - 1.0
+    returns = equity.pct_change().dropna()
+    bars_per_year = 365 * 24 * 60 * 60 * 1000 / bot.get_timeframe_ms(timeframe)
+    sharpe = float(returns.mean() / returns.std() * math.sqrt(bars_per_year)) if len(returns) > 1 and returns.std() > 0 else 0.0
+
+    stats: Dict[str, Any] = {
+        'timeframe': timeframe,
+        'start': str(equity.index[0]) if len(equity) else None,
+        'end': str(equity.index[-1]) if len(equity) else None,
+        'initial_balance': initial_balance,
+        'final_equity': final_equity,
+        'total_return_percent': (final_equity / initial_balance - 1.0) * 100,
+        'max_drawdown_percent': float(drawdown.min() * 100) if len(drawdown) else 0.0,
+        'sharpe_ratio': sharpe,
+        'trades': int(len(trades)),
+    }
+    if len(trades):
+        pnl = trades['pnl_usdt']
+        gross_profit = float(pnl[pnl > 0].sum())
+        gross_loss = float(-pnl[pnl < 0].sum())
+        stats.update({
+            'win_rate_percent': float((pnl > 0).mean() * 100),
+            'profit_factor': gross_profit / gross_loss if gross_loss > 0 else float('inf'),
+            'average_pnl_usdt': float(pnl.mean()),
+            'average_pnl_percent': float(trades['pnl_percent'].mean()),
+            'average_bars_held': float(trades['bars_held'].mean()),
+            'take_profit_count': int((trades['exit_reason'] == 'take_profit').sum()),
+            'stop_loss_count': int((trades['exit_reason'] == 'stop_loss').sum()),
+            'open_at_end_count': int((trades['exit_reason'] == 'end_of_data').sum()),
+            'partial_fill_count': int(trades['partial_fill'].sum()),
+        })
+    return stats
+
+def run_backtest(data: Dict[str, pd.DataFrame], timeframe: Optional[str] = None, macro_context: Optional[Dict] = None,
+                 params: Optional[Dict[str, float]] = None, threshold: Optional[float] = None, **simulate_kwargs) -> Dict[str, Any]:
+    """
+    OHLCVデータに対してバックテストを実行する。
+
+    Args:
+        data (Dict[str, pd.DataFrame]): 銘柄ごとのOHLCV (load_ohlcv_files の戻り値)
+        timeframe (str): タイムフレーム (省略時は足の間隔から推定)
+        macro_context (Dict): 期間中一定とみなすマクロ環境 (省略時は中立)
+        params (Dict): 上書きするスコアリング定数 (main_render.get_scoring_params を参照)
+        threshold (float): 取引閾値 (省略時は get_current_threshold(macro_context))
+        **simulate_kwargs: simulate に渡す設定 (initial_balance, fee_rate など)
+    """
+    timeframe = timeframe or infer_timeframe(data)
+    macro_context = macro_context or {'fgi_proxy': 0.0, 'forex_bonus': 0.0}
+    if threshold is None:
+        threshold = bot.get_current_threshold(macro_context)
+    frames = prepare_indicators(data)
+    scores = compute_scores(frames, timeframe, macro_context, params)
+    return simulate(frames, scores, timeframe, threshold, **simulate_kwargs)
+
+def write_results(result: Dict[str, Any], output_dir: str):
+    """ 取引履歴 (trades.csv)、資産曲線 (equity.csv)、統計 (stats.json) を保存する """
+    os.makedirs(output_dir, exist_ok=True)
+    result['trades'].to_csv(os.path.join(output_dir, 'trades.csv'), index=False)
+    result['equity'].to_csv(os.path.join(output_dir, 'equity.csv'), index_label='time')
+    with open(os.path.join(output_dir, 'stats.json'), 'w', encoding='utf-8') as f:
+        json.dump(result['stats'], f, ensure_ascii=False, indent=2)
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Apex BOT オフライン バックテスト")
+    parser.add_argument('paths', nargs='+', help="OHLCVのCSV/Parquetファイル、ディレクトリまたはglobパターン")
+    parser.add_argument('--timeframe', help="タイムフレーム (省略時は足の間隔から推定)")
+    parser.add_argument('--initial-balance', type=float, default=DEFAULT_INITIAL_BALANCE)
+    parser.add_argument('--fee-rate', type=float, default=DEFAULT_FEE_RATE)
+    parser.add_argument('--max-volume-participation', type=float, default=DEFAULT_MAX_VOLUME_PARTICIPATION)
+    parser.add_argument('--fgi-proxy', type=float, default=0.0, help="期間中一定とみなすFGIプロキシ値")
+    parser.add_argument('--forex-bonus', type=float, default=0.0, help="期間中一定とみなす為替ボーナス")
+    parser.add_argument('--threshold', type=float, help="取引閾値 (省略時はFGIプロキシから決定)")
+    parser.add_argument('--output-dir', default='backtest_results')
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.INFO)
+    data = load_ohlcv_files(args.paths)
+    result = run_backtest(
+        data,
+        timeframe=args.timeframe,
+        macro_context={'fgi_proxy': args.fgi_proxy, 'forex_bonus': args.forex_bonus},
+        threshold=args.threshold,
+        initial_balance=args.initial_balance,
+        fee_rate=args.fee_rate,
+        max_volume_participation=args.max_volume_participation,
+    )
+    write_results(result, args.output_dir)
+    print(json.dumps(result['stats'], ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,390 @@
+# ====================================================================================
+# Apex BOT - ベンチマーク
+# 分析のホットパス (指標計算/スコアリング/取得+分析) のマイクロベンチマークと、
+# 疑似取引所 (fake_exchange.py) に対する main_bot_loop 1サイクルの所要時間・メモリ使用量を計測し、JSONで保存する。
+# 保存した結果どうしを比較して、性能の劣化を検出できる。
+#
+# 使い方:
+#   python benchmark.py run --output bench_results.json
+#   python benchmark.py run --symbols 20,100 --data all_data.csv --output new.json
+#   python benchmark.py compare bench_results.json new.json --tolerance 0.10
+# ====================================================================================
+
+import os
+import sys
+import gc
+import json
+import time
+import asyncio
+import logging
+import platform
+import argparse
+import tempfile
+import tracemalloc
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple, Any, Callable
+
+import numpy as np
+import pandas as pd
+
+try:
+    import resource # Unix のみ
+except ImportError:
+    resource = None
+
+bot = None # main_render (load_bot で環境変数を設定してから読み込む)
+
+DEFAULT_SYMBOL_COUNTS = (20, 100, 500)
+DEFAULT_WARM_CYCLES = 5
+MICRO_BARS = 500 # マイクロベンチマークで使う足の本数 (REQUIRED_OHLCV_LIMITS と同じ)
+
+
+def load_bot(state_dir: str):
+    """
+    ベンチマーク用の環境変数 (ログ/DBの保存先を一時ディレクトリにする、取引しない等) を設定してから main_render を読み込む。
+    """
+    global bot
+
+    defaults = {
+        'SIGNAL_LOG_PATH': os.path.join(state_dir, 'apex_bot_signals.json'),
+        'POSITION_STORE_PATH': os.path.join(state_dir, 'positions.db'),
+        'MARKET_CACHE_PATH': os.path.join(state_dir, 'market_cache.json'),
+        'SIGNAL_HISTORY_DB_PATH': os.path.join(state_dir, 'signal_history.db'),
+        'WARM_STATE_PATH': '', # スナップショットの保存をサイクルの計測に含めない
+        'TEST_MODE': 'True',
+        'ORDER_FEED_MODE': 'off',
+    }
+    for name, value in defaults.items():
+        os.environ.setdefault(name, value)
+
+    import main_render
+    bot = main_render
+
+
+BENCHMARK_START_MS = 1_700_000_000_000
+
+def create_exchange(symbols: List[str], latency: str = 'fixed:0'):
+    """ 仮想時計で動く疑似取引所 (fake_exchange.FakeExchange) を作成する """
+    from fake_exchange import FakeExchange
+    return FakeExchange({'options': {'symbols': symbols, 'clock': 'virtual', 'start_ms': BENCHMARK_START_MS, 'latency': latency}})
+
+
+# ====================================================================================
+# MEASUREMENT HELPERS
+# ====================================================================================
+
+def _summarize_samples(samples: List[float], number: int) -> Dict[str, float]:
+    """ 計測値 (秒/number回) を1回あたりのマイクロ秒に換算して集計する """
+    per_call = np.array(samples) / number * 1e6
+    return {
+        'min_us': float(per_call.min()),
+        'median_us': float(np.median(per_call)),
+        'p95_us': float(np.percentile(per_call, 95)),
+        'repeat': len(samples),
+        'number': number,
+    }
+
+def measure(func: Callable[[], Any], repeat: int, number: int) -> Dict[str, float]:
+    """ func を number 回実行する計測を repeat 回繰り返す (timeit と同様に計測中はGCを止める) """
+    func() # ウォームアップ
+    samples = []
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            samples.append(time.perf_counter() - start)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return _summarize_samples(samples, number)
+
+async def measure_async(func: Callable[[], Any], repeat: int, number: int) -> Dict[str, float]:
+    """ measure のコルーチン版 """
+    await func()
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            await func()
+        samples.append(time.perf_counter() - start)
+    return _summarize_samples(samples, number)
+
+def peak_rss_mb() -> Optional[float]:
+    """ プロセスの最大常駐メモリ (MB) """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+# ====================================================================================
+# MICRO BENCHMARKS
+# ====================================================================================
+
+def load_sample_candles(data_path: Optional[str]) -> pd.DataFrame:
+    """ マイクロベンチマーク用の直近 MICRO_BARS 本のOHLCV (指定が無ければ合成データ) """
+    if data_path:
+        import backtest
+        data = backtest.load_ohlcv_files([data_path])
+        df = max(data.values(), key=len)
+        if len(df) < MICRO_BARS:
+            raise ValueError(f"{data_path}: {MICRO_BARS}本以上のデータが必要です ({len(df)}本)")
+        return df.iloc[-MICRO_BARS:].reset_index(drop=True)
+
+    exchange = create_exchange(['BENCH/USDT'])
+    return pd.DataFrame(exchange.ohlcv('BENCH/USDT', '5m', limit=MICRO_BARS), columns=list(bot.OHLCV_COLUMNS))
+
+def run_micro_benchmarks(candles: pd.DataFrame, repeat: int) -> Dict[str, Dict[str, float]]:
+    rows = candles[list(bot.OHLCV_COLUMNS)].to_numpy(dtype=np.float64).tolist()
+    buffer = bot.ColumnarRingBuffer(MICRO_BARS, bot.OHLCV_COLUMNS)
+    bot.upsert_candles(buffer, rows)
+    market_ticker = {'symbol': 'BENCH/USDT', 'last': rows[-1][4], 'quoteVolume': 5e7}
+    macro_context = {'fgi_proxy': 0.0, 'forex_bonus': 0.0}
+    frame = bot.calculate_technical_indicators(buffer.to_frame())
+
+    results = {}
+    results['calculate_technical_indicators'] = measure(lambda: bot.calculate_technical_indicators(buffer.to_frame()), repeat, 5)
+
+    def rebuild():
+        engine = bot.IncrementalIndicatorEngine(MICRO_BARS)
+        engine.update(buffer)
+    results['indicator_engine_rebuild'] = measure(rebuild, repeat, 2)
+
+    # 形成中の足の更新 (ティックごとに最終足の終値が変わる) による差分更新
+    engine = bot.IncrementalIndicatorEngine(MICRO_BARS)
+    engine.update(buffer)
+    forming = list(rows[-1])
+    step = [0]
+    def update_forming_bar():
+        step[0] += 1
+        forming[4] = rows[-1][4] * (1 + 0.0001 * (step[0] % 7))
+        buffer.replace_last(forming)
+        engine.update(buffer)
+    results['indicator_engine_update'] = measure(update_forming_bar, repeat, 50)
+    results['indicator_engine_to_frame'] = measure(lambda: engine.to_frame(buffer), repeat, 50)
+
+    results['score_signal'] = measure(lambda: bot.score_signal(frame, '5m', market_ticker, macro_context), repeat, 20)
+    results['score_signal_vectorized'] = measure(lambda: bot.score_signal_vectorized(frame, market_ticker, macro_context), repeat, 20)
+    return results
+
+async def run_fetch_and_analyze_benchmark(repeat: int) -> Dict[str, Dict[str, float]]:
+    """ fetch_ohlcv_and_analyze (キャッシュ済み: 差分取得 + 差分指標 + スコアリング) """
+    exchange = create_exchange(['BENCH/USDT'])
+    await _install_exchange(exchange)
+    ticker = exchange.ticker('BENCH/USDT')
+    limit = bot.REQUIRED_OHLCV_LIMITS['5m']
+
+    async def fetch_and_analyze():
+        exchange.advance(60)
+        await bot.fetch_ohlcv_and_analyze('BENCH/USDT', '5m', limit, ticker, {'fgi_proxy': 0.0, 'forex_bonus': 0.0})
+
+    result = {'fetch_ohlcv_and_analyze': await measure_async(fetch_and_analyze, repeat, 20)}
+    _reset_bot_state()
+    return result
+
+
+# ====================================================================================
+# END-TO-END CYCLE
+# ====================================================================================
+
+def _reset_bot_state():
+    """ キャッシュやスケジュールなど、サイクル間で引き継がれる状態を初期化する """
+    bot.OHLCV_CACHE.clear()
+    bot.INDICATOR_ENGINES.clear()
+    bot.ANALYSIS_SCHEDULE.clear()
+    bot.TICKER_SNAPSHOT.update({'tickers': {}, 'timestamp': 0.0})
+    bot.ACCOUNT_STATUS_CACHE.update({'status': None, 'timestamp': 0.0, 'fill_sequence': 0})
+    bot.LAST_SIGNAL_TIME.clear()
+    bot.LAST_ANALYSIS_SIGNALS = []
+    bot.HOURLY_SIGNAL_LOG = []
+    bot.HOURLY_ATTEMPT_LOG = {}
+    bot.LAST_HOURLY_NOTIFICATION_TIME = time.time()
+
+async def _install_exchange(exchange):
+    """ EXCHANGE_CLIENT を疑似取引所に差し替え、外部通信 (マクロ指標/Telegram) を使わない設定にする """
+    await exchange.load_markets()
+    bot.EXCHANGE_CLIENT = exchange
+    bot.MARKET_RULES = bot.build_market_rules(exchange.markets)
+    bot.IS_CLIENT_READY = True
+    bot.IS_FIRST_MAIN_LOOP_COMPLETED = True
+    bot.TELEGRAM_NOTIFIER = None
+    bot.LOOP_INTERVAL = 0 # サイクル後の待機をしない
+    bot.TICKER_SNAPSHOT_TTL_SECONDS = 0.0 # 実運用 (ループ間隔 > TTL) と同様に毎サイクル取得する
+    bot.ACCOUNT_STATUS_TTL_SECONDS = 0.0
+    now = time.monotonic()
+    for name, (_, _, default, _) in bot.MACRO_SOURCES.items():
+        bot.MACRO_CACHE[name] = {'value': dict(default), 'timestamp': now}
+
+async def run_cycle_benchmark(n_symbols: int, warm_cycles: int, latency: str, trace_memory: bool = False) -> Dict[str, Any]:
+    """
+    n_symbols 銘柄を監視する main_bot_loop を、コールドスタート (全足取得) 1回と、
+    仮想時計を1分ずつ進めたウォームサイクル warm_cycles 回について計測する。
+    """
+    # 銘柄名はシナリオごとに変え、前のシナリオの指標エンジン (ワーカープロセス内を含む) を再利用しないようにする
+    symbols = [f"B{n_symbols}S{k}/USDT" for k in range(n_symbols)]
+    exchange = create_exchange(symbols, latency)
+    _reset_bot_state()
+    await _install_exchange(exchange)
+    exchange.request_counts.clear()
+    bot.TOP_SYMBOL_LIMIT = n_symbols
+    bot.DEFAULT_SYMBOLS = []
+
+    if trace_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    await bot.main_bot_loop()
+    cold = time.perf_counter() - start
+    cold_requests = dict(exchange.request_counts)
+
+    warm = []
+    for _ in range(warm_cycles):
+        exchange.advance(60)
+        start = time.perf_counter()
+        await bot.main_bot_loop()
+        warm.append(time.perf_counter() - start)
+
+    result = {
+        'symbols': len(bot.CURRENT_MONITOR_SYMBOLS),
+        'cold_seconds': cold,
+        'warm_median_seconds': float(np.median(warm)) if warm else None,
+        'warm_max_seconds': float(np.max(warm)) if warm else None,
+        'warm_cycles': warm_cycles,
+        'cold_requests': cold_requests,
+        'signals': len(bot.LAST_ANALYSIS_SIGNALS),
+    }
+    if trace_memory:
+        current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result = {'symbols': result['symbols'], 'peak_traced_mb': peak / 1e6, 'retained_traced_mb': current / 1e6}
+    _reset_bot_state()
+    return result
+
+
+# ====================================================================================
+# RUN / COMPARE
+# ====================================================================================
+
+async def run_all(args) -> Dict[str, Any]:
+    if args.rate_limit is None:
+        # 既定ではレート制限による待機を除外し、ボット側の処理時間を計測する
+        bot.EXCHANGE_SCHEDULER = bot.ExchangeRequestScheduler(1e9, 1e9, bot.EXCHANGE_MAX_CONCURRENCY, bot.EXCHANGE_RESERVED_ORDER_SLOTS)
+    else:
+        bot.EXCHANGE_SCHEDULER = bot.ExchangeRequestScheduler(args.rate_limit, bot.EXCHANGE_RATE_LIMIT_BURST, bot.EXCHANGE_MAX_CONCURRENCY, bot.EXCHANGE_RESERVED_ORDER_SLOTS)
+
+    results: Dict[str, Any] = {'micro': {}, 'end_to_end': {}, 'memory': {}}
+    results['micro'] = run_micro_benchmarks(load_sample_candles(args.data), args.repeat)
+    results['micro'].update(await run_fetch_and_analyze_benchmark(args.repeat))
+
+    for n in args.symbols:
+        logging.critical(f"ℹ️ {n} 銘柄のサイクルを計測中...")
+        results['end_to_end'][str(n)] = await run_cycle_benchmark(n, args.warm_cycles, args.latency)
+        if not args.no_memory:
+            results['memory'][str(n)] = await run_cycle_benchmark(n, 1, args.latency, trace_memory=True)
+
+    results['memory']['peak_rss_mb'] = peak_rss_mb()
+    if bot.COMPUTE_EXECUTOR is not None:
+        bot.COMPUTE_EXECUTOR.shutdown()
+    return results
+
+def build_metadata(args) -> Dict[str, Any]:
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'bot_version': bot.BOT_VERSION,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'compute_executor_mode': bot.COMPUTE_EXECUTOR_MODE,
+        'compute_executor_workers': bot.COMPUTE_EXECUTOR_WORKERS,
+        'incremental_indicators': bot.INCREMENTAL_INDICATORS,
+        'data': args.data or 'synthetic',
+        'latency': args.latency,
+        'rate_limit': args.rate_limit,
+    }
+
+def flatten_metrics(results: Dict[str, Any]) -> Dict[str, float]:
+    """ 比較対象の指標 (いずれも小さいほど良い) を 'セクション.名前.指標' のキーで取り出す """
+    metrics = {}
+    for name, stats in results.get('micro', {}).items():
+        metrics[f"micro.{name}.median_us"] = stats['median_us']
+    for n, stats in results.get('end_to_end', {}).items():
+        for key in ('cold_seconds', 'warm_median_seconds'):
+            if stats.get(key) is not None:
+                metrics[f"end_to_end.{n}.{key}"] = stats[key]
+    for n, stats in results.get('memory', {}).items():
+        if isinstance(stats, dict):
+            metrics[f"memory.{n}.peak_traced_mb"] = stats['peak_traced_mb']
+        elif stats is not None:
+            metrics[f"memory.{n}"] = stats
+    return metrics
+
+def compare_results(base: Dict[str, Any], new: Dict[str, Any], tolerance: float) -> Tuple[pd.DataFrame, bool]:
+    """ 2つの結果を比較し、(比較表, 劣化の有無) を返す。base より tolerance を超えて大きい指標を劣化とする """
+    base_metrics = flatten_metrics(base)
+    new_metrics = flatten_metrics(new)
+    rows = []
+    for key in sorted(set(base_metrics) | set(new_metrics)):
+        before = base_metrics.get(key)
+        after = new_metrics.get(key)
+        change = (after / before - 1.0) if before and after is not None else None
+        status = 'missing' if before is None or after is None else 'REGRESSION' if change > tolerance else 'improved' if change < -tolerance else 'ok'
+        rows.append({'metric': key, 'base': before, 'new': after, 'change_percent': change * 100 if change is not None else None, 'status': status})
+    table = pd.DataFrame(rows)
+    return table, bool((table['status'] == 'REGRESSION').any()) if len(table) else False
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Apex BOT ベンチマーク")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help="ベンチマークを実行して結果をJSONに保存する")
+    run_parser.add_argument('--symbols', default=','.join(map(str, DEFAULT_SYMBOL_COUNTS)), help="サイクル計測の銘柄数 (カンマ区切り)")
+    run_parser.add_argument('--warm-cycles', type=int, default=DEFAULT_WARM_CYCLES)
+    run_parser.add_argument('--repeat', type=int, default=7, help="マイクロベンチマークの繰り返し回数")
+    run_parser.add_argument('--data', help="マイクロベンチマークに使う記録済みOHLCV (CSV/Parquet)。省略時は合成データ")
+    run_parser.add_argument('--latency', default='fixed:0', help="疑似取引所の応答遅延の分布 (例: lognormal:30,0.5)")
+    run_parser.add_argument('--rate-limit', type=float, help="リクエストスケジューラのレート制限 (省略時は制限なし)")
+    run_parser.add_argument('--compute-mode', choices=('process', 'thread', 'inline'), help="COMPUTE_EXECUTOR_MODE (省略時は環境変数/既定値)")
+    run_parser.add_argument('--no-memory', action='store_true', help="tracemallocによるメモリ計測を省略する")
+    run_parser.add_argument('--output', default='bench_results.json')
+
+    compare_parser = subparsers.add_parser('compare', help="2つの結果を比較する (劣化があれば終了コード1)")
+    compare_parser.add_argument('base')
+    compare_parser.add_argument('new')
+    compare_parser.add_argument('--tolerance', type=float, default=0.10, help="劣化とみなす増加率 (既定: 10%%)")
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'compare':
+        with open(args.base, encoding='utf-8') as f:
+            base = json.load(f)
+        with open(args.new, encoding='utf-8') as f:
+            new = json.load(f)
+        for key in ('cpu_count', 'compute_executor_mode', 'data', 'latency', 'rate_limit'):
+            if base.get('meta', {}).get(key) != new.get('meta', {}).get(key):
+                print(f"⚠️ 計測条件が異なります ({key}: {base.get('meta', {}).get(key)} -> {new.get('meta', {}).get(key)})")
+        table, regressed = compare_results(base, new, args.tolerance)
+        with pd.option_context('display.max_rows', None, 'display.width', 200):
+            print(table.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+        return 1 if regressed else 0
+
+    args.symbols = [int(n) for n in args.symbols.split(',') if n.strip()]
+    if args.compute_mode:
+        os.environ['COMPUTE_EXECUTOR_MODE'] = args.compute_mode
+    with tempfile.TemporaryDirectory(prefix='apex_bench_') as state_dir:
+        load_bot(state_dir)
+        logging.disable(logging.ERROR) # 計測中のログ出力を抑制 (CRITICALの進捗表示のみ)
+        results = asyncio.run(run_all(args))
+        results['meta'] = build_metadata(args)
+        bot.SIGNAL_LOG_WRITER.close()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(json.dumps({key: round(value, 3) for key, value in flatten_metrics(results).items()}, ensure_ascii=False, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
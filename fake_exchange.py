@@ -0,0 +1,579 @@
+# ====================================================================================
+# Apex BOT - 疑似取引所 (負荷/レイテンシ試験用)
+# ボットが使用するCCXT非同期メソッドを、プロセス内で決定的に再現する取引所の代替。
+# 価格は銘柄ごとの合成価格パスから生成し、その価格パスでSL/TP注文の発動・指値の約定を判定する。
+# 応答遅延の分布、レート制限エラー、IOC注文の部分約定を設定で再現できる。
+#
+# 使い方:
+#   EXCHANGE_CLIENT=fake TEST_MODE=False uvicorn main_render:app
+#   (設定は FAKE_EXCHANGE_* 環境変数、またはコンストラクタの config['options'] で指定する)
+# ====================================================================================
+
+import os
+import math
+import time
+import random
+import asyncio
+import logging
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple, Any
+
+import numpy as np
+import ccxt
+
+QUOTE_CURRENCY = 'USDT'
+MINUTE_MS = 60 * 1000
+MAX_TRIGGER_SCAN_MINUTES = 7 * 24 * 60 # SL/TP判定で一度に遡る最大の分数
+MAX_BAR_SAMPLES = 16 # 1分足より長い足の高値/安値を求める際に参照する分の数
+
+def _env_float(name: str, default: Optional[float]) -> Optional[float]:
+    value = os.getenv(name)
+    if value is None or value == '':
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        logging.warning(f"⚠️ {name} の値が不正です ({value})。デフォルト値 {default} を使用します。")
+        return default
+
+def options_from_env() -> Dict[str, Any]:
+    """ FAKE_EXCHANGE_* 環境変数から設定を読み込む (未設定の項目は含めない) """
+    options: Dict[str, Any] = {}
+    for key, name in (
+        ('symbol_count', 'FAKE_EXCHANGE_SYMBOLS'),
+        ('seed', 'FAKE_EXCHANGE_SEED'),
+        ('start_ms', 'FAKE_EXCHANGE_START_MS'),
+        ('time_scale', 'FAKE_EXCHANGE_TIME_SCALE'),
+        ('volatility', 'FAKE_EXCHANGE_VOLATILITY'),
+        ('initial_usdt', 'FAKE_EXCHANGE_INITIAL_USDT'),
+        ('rate_limit_per_second', 'FAKE_EXCHANGE_RATE_LIMIT'),
+        ('rate_limit_error_rate', 'FAKE_EXCHANGE_RATE_LIMIT_ERROR_RATE'),
+    ):
+        value = _env_float(name, None)
+        if value is not None:
+            options[key] = int(value) if key in ('symbol_count', 'seed', 'start_ms') else value
+    for key, name in (('clock', 'FAKE_EXCHANGE_CLOCK'), ('latency', 'FAKE_EXCHANGE_LATENCY')):
+        if os.getenv(name):
+            options[key] = os.getenv(name)
+    if os.getenv('FAKE_EXCHANGE_IOC_FILL_RATIO'):
+        try:
+            low, high = (float(v) for v in os.getenv('FAKE_EXCHANGE_IOC_FILL_RATIO').split(','))
+            options['ioc_fill_ratio'] = (low, high)
+        except ValueError:
+            logging.warning("⚠️ FAKE_EXCHANGE_IOC_FILL_RATIO の値が不正です (例: 0.5,1.0)。デフォルト値を使用します。")
+    return options
+
+DEFAULT_OPTIONS: Dict[str, Any] = {
+    'symbols': None,              # 銘柄のリスト (None の場合は symbol_count 個を自動生成)
+    'symbol_count': 200,
+    'seed': 0,
+    'clock': 'real',              # 'real' (実時間。time_scale 倍速) / 'virtual' (advance() で進める)
+    'start_ms': None,             # 時計の開始時刻 (None の場合は現在時刻)
+    'time_scale': 1.0,
+    'volatility': 1.0,            # 価格パスの変動の大きさ (倍率)
+    'spread': 0.0005,             # bid/askのスプレッド (比率)
+    'fee_rate': 0.001,            # 約定手数料 (quote建て)
+    'initial_usdt': 10000.0,
+    'latency': 'fixed:0',         # 応答遅延の分布 (LatencyModel.parse の書式)
+    'rate_limit_per_second': None, # 取引所側のレート制限 (None で無制限)
+    'rate_limit_burst': None,
+    'rate_limit_error_rate': 0.0, # レート制限エラーをランダムに返す確率
+    'ioc_fill_ratio': (1.0, 1.0), # IOC注文が約定する数量の比率 (一様分布の範囲)
+    'allowed_order_types': ('limit', 'market', 'stop_loss_limit', 'take_profit_limit'),
+}
+
+
+class LatencyModel:
+    """
+    応答遅延の分布。書式 (ミリ秒):
+        'fixed:5' / 'uniform:2,20' / 'normal:20,5' / 'lognormal:20,0.5' (中央値, σ) / 'exponential:10' (平均)
+    'lognormal:30,0.5;create_order=fixed:80' のように、';' 区切りでメソッドごとの分布を指定できる。
+    """
+
+    DISTRIBUTIONS = ('fixed', 'uniform', 'normal', 'lognormal', 'exponential')
+
+    def __init__(self, default: Tuple[str, Tuple[float, ...]], overrides: Optional[Dict[str, Tuple[str, Tuple[float, ...]]]] = None):
+        self.default = default
+        self.overrides = overrides or {}
+
+    @classmethod
+    def _parse_one(cls, spec: str) -> Tuple[str, Tuple[float, ...]]:
+        kind, _, args = spec.strip().partition(':')
+        kind = kind.lower()
+        if kind not in cls.DISTRIBUTIONS:
+            raise ValueError(f"不明な遅延分布: {spec}")
+        values = tuple(float(v) for v in args.split(',') if v.strip())
+        required = {'fixed': 1, 'uniform': 2, 'normal': 2, 'lognormal': 2, 'exponential': 1}[kind]
+        if len(values) != required:
+            raise ValueError(f"遅延分布 {kind} には {required} 個の値が必要です: {spec}")
+        return kind, values
+
+    @classmethod
+    def parse(cls, spec: str) -> 'LatencyModel':
+        default = ('fixed', (0.0,))
+        overrides = {}
+        for part in spec.split(';'):
+            if not part.strip():
+                continue
+            if '=' in part:
+                method, _, method_spec = part.partition('=')
+                overrides[method.strip()] = cls._parse_one(method_spec)
+            else:
+                default = cls._parse_one(part)
+        return cls(default, overrides)
+
+    def sample(self, method: str, rng: random.Random) -> float:
+        """ 遅延 (秒) を1つ抽出する """
+        kind, values = self.overrides.get(method, self.default)
+        if kind == 'fixed':
+            ms = values[0]
+        elif kind == 'uniform':
+            ms = rng.uniform(values[0], values[1])
+        elif kind == 'normal':
+            ms = rng.gauss(values[0], values[1])
+        elif kind == 'lognormal':
+            ms = values[0] * math.exp(rng.gauss(0.0, values[1]))
+        else:
+            ms = rng.expovariate(1.0 / values[0]) if values[0] > 0 else 0.0
+        return max(0.0, ms) / 1000
+
+
+def _hash_uniform(minutes: np.ndarray, salt: int) -> np.ndarray:
+    """ 分のインデックスから [0, 1) の擬似乱数を決定的に生成する """
+    x = (minutes.astype(np.int64) * 2654435761 + salt) % 4294967296
+    x = ((x ^ (x >> 16)) * 0x45d9f3b) % 4294967296
+    x = x ^ (x >> 16)
+    return x / 4294967296.0
+
+
+class FakeExchange:
+    """
+    CCXT非同期クライアント互換の疑似取引所 (EXCHANGE_CLIENT=fake で使用)。
+
+    - 銘柄ごとの価格は、シードから決まるパラメータと時刻 (分) の関数で、同じ設定なら常に同じ値になる
+    - 注文はメソッド呼び出しのたびに、前回以降の1分足の高値/安値で発動/約定を判定する
+    - 約定は残高 (USDTとベース通貨) に反映する
+    """
+
+    id = 'fake'
+    name = 'Fake Exchange'
+
+    def __init__(self, config: Optional[Dict] = None):
+        config = config or {}
+        self.options = {**DEFAULT_OPTIONS, **options_from_env(), **(config.get('options') or {})}
+        self.apiKey = config.get('apiKey')
+        self.secret = config.get('secret')
+        self.has = {'fetchOHLCV': True, 'fetchTickers': True, 'fetchOpenOrders': True, 'watchOrders': False}
+        self.markets: Optional[Dict[str, Dict]] = None
+        self.currencies: Optional[Dict[str, Dict]] = None
+        self.request_counts: Counter = Counter()
+
+        self._rng = random.Random(self.options['seed'])
+        self._latency = LatencyModel.parse(self.options['latency'])
+
+        if self.options['clock'] not in ('real', 'virtual'):
+            raise ValueError(f"不明な時計: {self.options['clock']} (real / virtual)")
+        self._real_started_at = time.time()
+        self._start_ms = int(self.options['start_ms'] if self.options['start_ms'] is not None else self._real_started_at * 1000)
+        self._virtual_ms = self._start_ms
+
+        symbols = self.options['symbols'] or [f"FK{k:03d}/{QUOTE_CURRENCY}" for k in range(int(self.options['symbol_count']))]
+        self.symbols = list(symbols)
+        self._index = {symbol: k for k, symbol in enumerate(self.symbols)}
+        self._paths = [self._path_parameters(k) for k in range(len(self.symbols))]
+
+        self._balances: Dict[str, float] = {QUOTE_CURRENCY: float(self.options['initial_usdt'])}
+        self._orders: Dict[str, Dict] = {}
+        self._open_order_ids: Dict[str, List[str]] = {} # 銘柄 -> オープン注文ID (作成順)
+        self._checked_minute: Dict[str, int] = {} # 銘柄 -> SL/TP判定済みの分
+        self._order_sequence = 0
+
+        rate = self.options['rate_limit_per_second']
+        self._rate = float(rate) if rate else None
+        self._burst = float(self.options['rate_limit_burst'] or (self._rate * 2 if self._rate else 0.0))
+        self._tokens = self._burst
+        self._last_refill = time.monotonic()
+
+    # ------------------------------------------------------------------
+    # 時計と価格パス
+    # ------------------------------------------------------------------
+
+    def milliseconds(self) -> int:
+        if self.options['clock'] == 'virtual':
+            return self._virtual_ms
+        return self._start_ms + int((time.time() - self._real_started_at) * 1000 * self.options['time_scale'])
+
+    def advance(self, seconds: float):
+        """ 仮想時計を進める (clock='virtual' のみ) """
+        if self.options['clock'] != 'virtual':
+            raise RuntimeError("advance() は clock='virtual' の場合のみ使用できます")
+        self._virtual_ms += int(seconds * 1000)
+
+    @staticmethod
+    def iso8601(timestamp: Optional[int]) -> Optional[str]:
+        if timestamp is None:
+            return None
+        return datetime.fromtimestamp(timestamp / 1000, tz=timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+    def _path_parameters(self, k: int) -> Dict[str, float]:
+        """ 銘柄ごとの価格パスのパラメータ (シードと銘柄の番号で決まる) """
+        rng = random.Random(f"{self.options['seed']}:{k}")
+        return {
+            'base': 10 ** rng.uniform(-3, 4),
+            'periods': (rng.uniform(600, 3000), rng.uniform(60, 400), rng.uniform(10, 40)),
+            'amplitudes': (rng.uniform(0.03, 0.10), rng.uniform(0.005, 0.02), rng.uniform(0.001, 0.004)),
+            'phases': (rng.uniform(0, 2 * math.pi), rng.uniform(0, 2 * math.pi), rng.uniform(0, 2 * math.pi)),
+            'noise': rng.uniform(0.0005, 0.002),
+            'wick': rng.uniform(0.0005, 0.002),
+            'volume': 10 ** rng.uniform(3, 6),
+            'salt': rng.randrange(1 << 30),
+        }
+
+    def _close_at(self, k: int, minutes: np.ndarray) -> np.ndarray:
+        """ 各分の終値 """
+        p = self._paths[k]
+        m = minutes.astype(np.float64)
+        log_move = sum(a * np.sin(m / period + phase) for a, period, phase in zip(p['amplitudes'], p['periods'], p['phases']))
+        log_move = log_move + p['noise'] * (_hash_uniform(minutes, p['salt']) - 0.5)
+        return p['base'] * np.exp(self.options['volatility'] * log_move)
+
+    def _minute_bars(self, k: int, minutes: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """ 各分の1分足 (始値は前の分の終値) """
+        p = self._paths[k]
+        close = self._close_at(k, minutes)
+        open_ = self._close_at(k, minutes - 1)
+        wick = self.options['volatility'] * p['wick'] * _hash_uniform(minutes, p['salt'] + 1)
+        high = np.maximum(open_, close) * (1 + wick)
+        low = np.minimum(open_, close) * (1 - wick)
+        volume = p['volume'] * (0.5 + _hash_uniform(minutes, p['salt'] + 2))
+        return open_, high, low, close, volume
+
+    def ohlcv(self, symbol: str, timeframe: str = '1m', since: Optional[int] = None, limit: Optional[int] = None) -> List[List[float]]:
+        """ 現在時刻までのOHLCV (最終足は形成中)。fetch_ohlcv の同期版 """
+        k = self._symbol_index(symbol)
+        tf_minutes = max(1, ccxt.Exchange.parse_timeframe(timeframe) // 60)
+        tf_ms = tf_minutes * MINUTE_MS
+        now_minute = self.milliseconds() // MINUTE_MS
+        limit = limit or 500
+        last_bar = (now_minute * MINUTE_MS) // tf_ms
+        first_bar = -(-since // tf_ms) if since is not None else last_bar - limit + 1
+        bars = np.arange(first_bar, min(last_bar, first_bar + limit - 1) + 1, dtype=np.int64)
+        if len(bars) == 0:
+            return []
+
+        start = bars * tf_minutes
+        end = np.minimum(start + tf_minutes - 1, now_minute)
+        if tf_minutes == 1:
+            open_, high, low, close, volume = self._minute_bars(k, start)
+        else:
+            # 足の中の分を最大 MAX_BAR_SAMPLES 個参照して高値/安値を求める
+            samples = min(tf_minutes, MAX_BAR_SAMPLES)
+            offsets = np.linspace(0.0, 1.0, samples)
+            minutes = np.rint(start[:, None] + offsets[None, :] * (end - start)[:, None]).astype(np.int64)
+            _, highs, lows, _, volumes = self._minute_bars(k, minutes.ravel())
+            open_ = self._close_at(k, start - 1)
+            close = self._close_at(k, end)
+            high = np.maximum(highs.reshape(minutes.shape).max(axis=1), np.maximum(open_, close))
+            low = np.minimum(lows.reshape(minutes.shape).min(axis=1), np.minimum(open_, close))
+            volume = volumes.reshape(minutes.shape).mean(axis=1) * (end - start + 1)
+        rows = np.column_stack([open_, high, low, close, volume]).tolist()
+        return [[int(timestamp), *row] for timestamp, row in zip(bars * tf_ms, rows)]
+
+    def ticker(self, symbol: str) -> Dict:
+        """ 現在時刻のティッカー。fetch_ticker の同期版 """
+        k = self._symbol_index(symbol)
+        now = self.milliseconds()
+        last = float(self._close_at(k, np.array([now // MINUTE_MS]))[0])
+        half_spread = self.options['spread'] / 2
+        base_volume = self._paths[k]['volume'] * 24 * 60
+        return {
+            'symbol': symbol,
+            'timestamp': now,
+            'datetime': self.iso8601(now),
+            'last': last,
+            'close': last,
+            'bid': last * (1 - half_spread),
+            'ask': last * (1 + half_spread),
+            'baseVolume': base_volume,
+            'quoteVolume': base_volume * last,
+            'info': {},
+        }
+
+    def _symbol_index(self, symbol: str) -> int:
+        k = self._index.get(symbol)
+        if k is None:
+            raise ccxt.BadSymbol(f"{self.id} does not have market symbol {symbol}")
+        return k
+
+    # ------------------------------------------------------------------
+    # リクエストの共通処理 (遅延、レート制限)
+    # ------------------------------------------------------------------
+
+    async def _request(self, method: str):
+        self.request_counts[method] += 1
+        latency = self._latency.sample(method, self._rng)
+        if latency > 0:
+            await asyncio.sleep(latency)
+
+        if self._rate is not None:
+            now = time.monotonic()
+            self._tokens = min(self._burst, self._tokens + (now - self._last_refill) * self._rate)
+            self._last_refill = now
+            if self._tokens < 1:
+                self.request_counts['rate_limited'] += 1
+                raise ccxt.RateLimitExceeded(f"{self.id} 429 Too Many Requests ({method})")
+            self._tokens -= 1
+        if self.options['rate_limit_error_rate'] and self._rng.random() < self.options['rate_limit_error_rate']:
+            self.request_counts['rate_limited'] += 1
+            raise ccxt.RateLimitExceeded(f"{self.id} 429 Too Many Requests ({method})")
+
+        self._process_orders()
+
+    # ------------------------------------------------------------------
+    # マーケットデータ
+    # ------------------------------------------------------------------
+
+    def _build_markets(self) -> Dict[str, Dict]:
+        markets = {}
+        for symbol in self.symbols:
+            base, quote = symbol.split('/')
+            price = self._paths[self._index[symbol]]['base']
+            amount_precision = 10.0 ** -max(1, min(8, int(math.ceil(math.log10(price))) + 2))
+            markets[symbol] = {
+                'id': symbol.replace('/', ''),
+                'symbol': symbol,
+                'base': base,
+                'quote': quote,
+                'baseId': base,
+                'quoteId': quote,
+                'type': 'spot',
+                'spot': True,
+                'active': True,
+                'precision': {'amount': amount_precision, 'price': 10.0 ** -max(2, 6 - int(math.floor(math.log10(price))))},
+                'limits': {'amount': {'min': amount_precision, 'max': None}, 'cost': {'min': 1.0, 'max': None}},
+                'info': {'options': {'default_allowed_orders': list(self.options['allowed_order_types'])}},
+            }
+        return markets
+
+    def set_markets(self, markets: Dict[str, Dict], currencies: Optional[Dict[str, Dict]] = None):
+        self.markets = markets
+        self.currencies = currencies or {
+            code: {'id': code, 'code': code, 'precision': 8}
+            for code in sorted({m['base'] for m in markets.values()} | {QUOTE_CURRENCY})
+        }
+        return self.markets
+
+    async def load_markets(self, reload: bool = False, params: Optional[Dict] = None) -> Dict[str, Dict]:
+        if self.markets is None or reload:
+            await self._request('load_markets')
+            self.set_markets(self._build_markets())
+        return self.markets
+
+    async def fetch_ticker(self, symbol: str, params: Optional[Dict] = None) -> Dict:
+        await self._request('fetch_ticker')
+        return self.ticker(symbol)
+
+    async def fetch_tickers(self, symbols: Optional[List[str]] = None, params: Optional[Dict] = None) -> Dict[str, Dict]:
+        await self._request('fetch_tickers')
+        return {symbol: self.ticker(symbol) for symbol in (symbols or self.symbols)}
+
+    async def fetch_ohlcv(self, symbol: str, timeframe: str = '1m', since: Optional[int] = None, limit: Optional[int] = None, params: Optional[Dict] = None) -> List[List[float]]:
+        await self._request('fetch_ohlcv')
+        return self.ohlcv(symbol, timeframe, since, limit)
+
+    def amount_to_precision(self, symbol: str, amount: float) -> str:
+        precision = self.markets[symbol]['precision']['amount']
+        digits = max(0, int(round(-math.log10(precision))))
+        return f"{math.floor(amount * 10 ** digits + 1e-9) / 10 ** digits:.{digits}f}"
+
+    def price_to_precision(self, symbol: str, price: float) -> str:
+        precision = self.markets[symbol]['precision']['price']
+        digits = max(0, int(round(-math.log10(precision))))
+        return f"{round(price, digits):.{digits}f}"
+
+    # ------------------------------------------------------------------
+    # 口座と注文
+    # ------------------------------------------------------------------
+
+    async def fetch_balance(self, params: Optional[Dict] = None) -> Dict:
+        await self._request('fetch_balance')
+        balance: Dict[str, Any] = {'info': {}, 'free': {}, 'used': {}, 'total': {}}
+        for currency, amount in self._balances.items():
+            balance[currency] = {'free': amount, 'used': 0.0, 'total': amount}
+            balance['free'][currency] = amount
+            balance['used'][currency] = 0.0
+            balance['total'][currency] = amount
+        balance['timestamp'] = self.milliseconds()
+        balance['datetime'] = self.iso8601(balance['timestamp'])
+        return balance
+
+    def _new_order(self, symbol: str, type: str, side: str, amount: float, price: Optional[float], params: Dict) -> Dict:
+        self._order_sequence += 1
+        now = self.milliseconds()
+        stop_price = params.get('stopPrice') or params.get('triggerPrice')
+        return {
+            'id': f"F{self._order_sequence:010d}",
+            'clientOrderId': params.get('clientOrderId'),
+            'timestamp': now,
+            'datetime': self.iso8601(now),
+            'lastTradeTimestamp': None,
+            'symbol': symbol,
+            'type': type,
+            'timeInForce': params.get('timeInForce', 'GTC'),
+            'side': side,
+            'price': price,
+            'stopPrice': stop_price,
+            'triggerPrice': stop_price,
+            'amount': amount,
+            'filled': 0.0,
+            'remaining': amount,
+            'average': None,
+            'cost': 0.0,
+            'status': 'open',
+            'fee': {'currency': QUOTE_CURRENCY, 'cost': 0.0},
+            'trades': [],
+            'info': {'triggered': stop_price is None},
+        }
+
+    def _fill(self, order: Dict, amount: float, price: float, timestamp: int) -> bool:
+        """ 注文を約定させて残高に反映する。残高不足の場合は約定させずに False を返す """
+        base = order['symbol'].split('/')[0]
+        amount, price = float(amount), float(price)
+        cost = amount * price
+        fee = cost * self.options['fee_rate']
+        if order['side'] == 'buy':
+            if cost + fee > self._balances.get(QUOTE_CURRENCY, 0.0) + 1e-9:
+                return False
+            self._balances[QUOTE_CURRENCY] -= cost + fee
+            self._balances[base] = self._balances.get(base, 0.0) + amount
+        else:
+            if amount > self._balances.get(base, 0.0) * (1 + 1e-9):
+                return False
+            self._balances[base] = max(0.0, self._balances.get(base, 0.0) - amount)
+            self._balances[QUOTE_CURRENCY] += cost - fee
+
+        order['filled'] += amount
+        order['remaining'] = max(0.0, order['amount'] - order['filled'])
+        order['cost'] += cost
+        order['average'] = order['cost'] / order['filled']
+        order['fee']['cost'] += fee
+        order['lastTradeTimestamp'] = timestamp
+        order['trades'].append({'timestamp': timestamp, 'price': price, 'amount': amount, 'cost': cost})
+        return True
+
+    def _close_order(self, order: Dict, status: str):
+        order['status'] = status
+        open_ids = self._open_order_ids.get(order['symbol'])
+        if open_ids and order['id'] in open_ids:
+            open_ids.remove(order['id'])
+
+    async def create_order(self, symbol: str, type: str, side: str, amount: float, price: Optional[float] = None, params: Optional[Dict] = None) -> Dict:
+        await self._request('create_order')
+        params = params or {}
+        if self.markets is None:
+            raise ccxt.ExchangeError(f"{self.id} markets not loaded")
+        self._symbol_index(symbol)
+        if type not in self.options['allowed_order_types']:
+            raise ccxt.InvalidOrder(f"{self.id} does not support order type {type}")
+        if side not in ('buy', 'sell'):
+            raise ccxt.InvalidOrder(f"{self.id} invalid order side {side}")
+        if amount is None or amount <= 0:
+            raise ccxt.InvalidOrder(f"{self.id} amount must be positive")
+        if type != 'market' and not price:
+            raise ccxt.ArgumentsRequired(f"{self.id} {type} order requires a price")
+        if type in ('stop_loss_limit', 'take_profit_limit') and not (params.get('stopPrice') or params.get('triggerPrice')):
+            raise ccxt.ArgumentsRequired(f"{self.id} {type} order requires params['stopPrice']")
+
+        order = self._new_order(symbol, type, side, float(amount), price, params)
+        ticker = self.ticker(symbol)
+        reference = ticker['ask'] if side == 'buy' else ticker['bid']
+
+        if type == 'market':
+            if not self._fill(order, order['amount'], reference, order['timestamp']):
+                raise ccxt.InsufficientFunds(f"{self.id} insufficient balance for {side} {amount} {symbol}")
+            order['status'] = 'closed'
+        elif type == 'limit' and (price >= reference if side == 'buy' else price <= reference):
+            # 即時約定可能な指値: IOCは設定された比率で部分約定し、残りはキャンセルする
+            fill_amount = order['amount']
+            if order['timeInForce'] in ('IOC', 'FOK'):
+                low, high = self.options['ioc_fill_ratio']
+                ratio = 1.0 if order['timeInForce'] == 'FOK' else self._rng.uniform(low, high)
+                fill_amount = float(self.amount_to_precision(symbol, fill_amount * ratio))
+            if fill_amount > 0 and not self._fill(order, fill_amount, reference, order['timestamp']):
+                raise ccxt.InsufficientFunds(f"{self.id} insufficient balance for {side} {amount} {symbol}")
+            order['status'] = 'closed' if order['remaining'] <= 0 else 'canceled'
+        elif order['timeInForce'] in ('IOC', 'FOK'):
+            order['status'] = 'canceled'
+        else:
+            self._open_order_ids.setdefault(symbol, []).append(order['id'])
+            self._checked_minute.setdefault(symbol, order['timestamp'] // MINUTE_MS)
+
+        self._orders[order['id']] = order
+        return dict(order)
+
+    def _process_orders(self):
+        """ 前回の判定以降の1分足で、オープン注文の発動 (SL/TP) と約定を判定する """
+        now_minute = self.milliseconds() // MINUTE_MS
+        for symbol, open_ids in self._open_order_ids.items():
+            checked = self._checked_minute.get(symbol, now_minute)
+            if not open_ids or checked >= now_minute:
+                continue
+            first = max(checked + 1, now_minute - MAX_TRIGGER_SCAN_MINUTES + 1)
+            minutes = np.arange(first, now_minute + 1, dtype=np.int64)
+            _, high, low, _, _ = self._minute_bars(self._index[symbol], minutes)
+            self._checked_minute[symbol] = now_minute
+
+            # 各注文が最初に約定する分を求め、時刻順 (同じ分ではSLを先) に処理する
+            events = []
+            for order_id in open_ids:
+                order = self._orders[order_id]
+                valid = minutes > order['timestamp'] // MINUTE_MS
+                hit = self._trigger_mask(order, high, low) & valid
+                if hit.any():
+                    events.append((int(np.argmax(hit)), order['type'] != 'stop_loss_limit', order_id))
+            for position, _, order_id in sorted(events):
+                order = self._orders[order_id]
+                if order['status'] != 'open':
+                    continue
+                order['info']['triggered'] = True
+                timestamp = int(minutes[position]) * MINUTE_MS
+                if self._fill(order, order['remaining'], order['price'], timestamp):
+                    self._close_order(order, 'closed')
+                else:
+                    # 先に約定した注文でベース通貨が無くなった場合 (SLとTPの両方が発動した場合など)
+                    self._close_order(order, 'canceled')
+
+    @staticmethod
+    def _trigger_mask(order: Dict, high: np.ndarray, low: np.ndarray) -> np.ndarray:
+        if order['type'] == 'stop_loss_limit':
+            return low <= order['stopPrice'] if order['side'] == 'sell' else high >= order['stopPrice']
+        if order['type'] == 'take_profit_limit':
+            return high >= order['stopPrice'] if order['side'] == 'sell' else low <= order['stopPrice']
+        return high >= order['price'] if order['side'] == 'sell' else low <= order['price']
+
+    def _get_order(self, id: str) -> Dict:
+        order = self._orders.get(id)
+        if order is None:
+            raise ccxt.OrderNotFound(f"{self.id} order {id} not found")
+        return order
+
+    async def fetch_order(self, id: str, symbol: Optional[str] = None, params: Optional[Dict] = None) -> Dict:
+        await self._request('fetch_order')
+        return dict(self._get_order(id))
+
+    async def fetch_open_orders(self, symbol: Optional[str] = None, since: Optional[int] = None, limit: Optional[int] = None, params: Optional[Dict] = None) -> List[Dict]:
+        await self._request('fetch_open_orders')
+        symbols = [symbol] if symbol else list(self._open_order_ids)
+        return [dict(self._orders[order_id]) for s in symbols for order_id in self._open_order_ids.get(s, [])]
+
+    async def cancel_order(self, id: str, symbol: Optional[str] = None, params: Optional[Dict] = None) -> Dict:
+        await self._request('cancel_order')
+        order = self._get_order(id)
+        if order['status'] != 'open':
+            raise ccxt.OrderNotFound(f"{self.id} order {id} is already {order['status']}")
+        self._close_order(order, 'canceled')
+        return dict(order)
+
+    async def close(self):
+        pass
@@ -13,25 +13,45 @@
 import os
 import time
 import logging
-import requests
 import ccxt.async_support as ccxt_async
+import aiohttp
+try:
+    import ccxt.pro as ccxt_pro # 注文更新のWebSocket購読 (watch_orders) に使用
+except ImportError:
+    ccxt_pro = None
 import ccxt
 import numpy as np
 import pandas as pd
 import pandas_ta as ta
 from datetime import datetime, timezone, timedelta
-from typing import Dict, List, Optional, Tuple, Any, Callable
+from typing import Dict, List, Optional, Tuple, Any, Callable, AsyncIterator
 import asyncio
+import abc
 from fastapi import FastAPI
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, PlainTextResponse
 import uvicorn
 from dotenv import load_dotenv
 import sys
 import random
 import json
+import pickle
 import re
 import uuid 
 import math 
+import sqlite3
+import threading
+import queue
+import gzip
+import zlib
+import shutil
+import glob
+import atexit
+import bisect
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict, deque
 
 # .envファイルから環境変数を読み込む
 load_dotenv()
@@ -68,19 +88,106 @@ DEFAULT_SYMBOLS = [
     "VIRTUAL/USDT", "PIPPIN/USDT", "GIGGLE/USDT", "H/USDT", "AIXBT/USDT", 
 ]
 TOP_SYMBOL_LIMIT = 20               # 監視対象銘柄の最大数 (出来高TOPから選出)
-LOOP_INTERVAL = 60 * 5              # メインループの実行間隔 (秒) - 5分ごと
+LOOP_INTERVAL = int(os.getenv("LOOP_INTERVAL", 60 * 5)) # メインループの実行間隔 (秒) - 5分ごと (足確定スケジューリング有効時は60秒でも負荷は小さい)
 MONITOR_INTERVAL = 10               # オープン注文監視ループの実行間隔 (秒) - 10秒ごと
+# 注文更新フィード: 'auto' (ccxt.pro の watch_orders が使えれば使用) / 'replay' (ORDER_FEED_REPLAY_PATH を再生) / 'off'
+ORDER_FEED_MODE = os.getenv("ORDER_FEED_MODE", "auto").lower()
+ORDER_FEED_REPLAY_PATH = os.getenv("ORDER_FEED_REPLAY_PATH")
+POSITION_STORE_PATH = os.getenv("POSITION_STORE_PATH", "positions.db") # ポジションの永続化先 (SQLite)
+ORDER_FEED_SAFETY_POLL_INTERVAL = 60 # 注文更新フィードの購読中は、ポーリングを安全確認としてこの間隔 (秒) に落とす
 HOURLY_SCORE_REPORT_INTERVAL = 60 * 60 # ★ 1時間ごとのスコア通知間隔 (60分ごと)
 
 # 💡 クライアント設定
-CCXT_CLIENT_NAME = os.getenv("EXCHANGE_CLIENT", "mexc") # ★デフォルトはmexc
+CCXT_CLIENT_NAME = os.getenv("EXCHANGE_CLIENT", "mexc") # ★デフォルトはmexc ("fake" で疑似取引所 fake_exchange.py を使用)
 TELEGRAM_BOT_TOKEN = os.getenv("TELEGRAM_TOKEN")
 TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
+# Telegram送信キュー設定 (Telegramの制限: 同一チャットへは概ね1秒に1通)
+TELEGRAM_QUEUE_MAX_SIZE = 200             # 未送信メッセージの上限 (超えた場合は古いものから破棄)
+TELEGRAM_MIN_INTERVAL_SECONDS = 1.0       # 同一チャットへの送信間隔
+TELEGRAM_MAX_RETRIES = 3                  # 5xx/通信エラー/429時の最大再試行回数
+TELEGRAM_RETRY_BASE_DELAY_SECONDS = 1.0   # 再試行の待機時間 (1, 2, 4秒...)
 API_KEY = os.getenv(f"{CCXT_CLIENT_NAME.upper()}_API_KEY") # 環境変数 MEXC_API_KEY を参照
 SECRET_KEY = os.getenv(f"{CCXT_CLIENT_NAME.upper()}_SECRET") # 環境変数 MEXC_SECRET を参照
 TEST_MODE = os.getenv("TEST_MODE", "False").lower() in ('true', '1', 't')
 SKIP_MARKET_UPDATE = os.getenv("SKIP_MARKET_UPDATE", "False").lower() in ('true', '1', 't')
 
+# 💡 取引所リクエストスケジューラ設定 (全てのEXCHANGE_CLIENT呼び出しを一元管理)
+EXCHANGE_SCHEDULER_ENABLED = os.getenv("EXCHANGE_SCHEDULER_ENABLED", "True").lower() in ('true', '1', 't')
+EXCHANGE_RATE_LIMIT_PER_SECOND = float(os.getenv("EXCHANGE_RATE_LIMIT_PER_SECOND", "20")) # 1秒あたりに補充されるウェイト
+EXCHANGE_RATE_LIMIT_BURST = float(os.getenv("EXCHANGE_RATE_LIMIT_BURST", "40"))           # トークンバケットの最大容量
+EXCHANGE_RATE_LIMIT_BACKOFF_SECONDS = 2.0 # レート制限エラー (429) 受信時に全体を減速させる秒数
+EXCHANGE_MAX_CONCURRENCY = int(os.getenv("EXCHANGE_MAX_CONCURRENCY", "8"))                 # 同時実行リクエスト数の上限
+EXCHANGE_RESERVED_ORDER_SLOTS = int(os.getenv("EXCHANGE_RESERVED_ORDER_SLOTS", "2"))       # 注文管理専用に予約する同時実行枠
+# ティッカーのスナップショットの有効期間 (秒)。この間は全ての処理が同じ fetch_tickers の結果を共有する
+try:
+    TICKER_SNAPSHOT_TTL_SECONDS = float(os.getenv("TICKER_SNAPSHOT_TTL_SECONDS", "20"))
+except ValueError:
+    TICKER_SNAPSHOT_TTL_SECONDS = 20.0
+# マーケットデータのディスクキャッシュ (再起動時の load_markets をスキップする)
+MARKET_CACHE_PATH = os.getenv("MARKET_CACHE_PATH", "market_cache.json")
+try:
+    MARKET_CACHE_TTL_SECONDS = float(os.getenv("MARKET_CACHE_TTL_SECONDS", str(60 * 60 * 6))) # 6時間
+except ValueError:
+    MARKET_CACHE_TTL_SECONDS = 60 * 60 * 6
+MARKET_CACHE_VERSION = 1 # キャッシュの形式を変更した場合に上げる (古い形式のキャッシュは破棄される)
+# ウォーム状態のスナップショット (再起動時に、ローソク足/指標の状態・クールダウン・監視銘柄・分析結果を復元する。空文字で無効)
+WARM_STATE_PATH = os.getenv("WARM_STATE_PATH", "warm_state.pkl")
+try:
+    WARM_STATE_SAVE_INTERVAL_SECONDS = float(os.getenv("WARM_STATE_SAVE_INTERVAL_SECONDS", "300")) # 5分ごと (終了時にも保存する)
+except ValueError:
+    WARM_STATE_SAVE_INTERVAL_SECONDS = 300.0
+try:
+    WARM_STATE_MAX_AGE_SECONDS = float(os.getenv("WARM_STATE_MAX_AGE_SECONDS", str(60 * 60 * 24))) # これより古いスナップショットは使わない
+except ValueError:
+    WARM_STATE_MAX_AGE_SECONDS = 60 * 60 * 24
+WARM_STATE_VERSION = 1 # スナップショットの形式を変更した場合に上げる
+# シグナル/取引ログ (JSON Lines) の書き込み設定
+SIGNAL_LOG_PATH = os.getenv("SIGNAL_LOG_PATH", "apex_bot_signals.json")
+SIGNAL_LOG_FLUSH_INTERVAL_SECONDS = 1.0  # バッファをファイルに書き出す間隔
+SIGNAL_LOG_BATCH_SIZE = 500               # この件数に達したら間隔を待たずに書き出す
+SIGNAL_LOG_FSYNC_POLICY = os.getenv("SIGNAL_LOG_FSYNC_POLICY", "interval").lower() # 'always' / 'interval' / 'never'
+SIGNAL_LOG_FSYNC_INTERVAL_SECONDS = 10.0 # 'interval' の場合のfsync間隔
+SIGNAL_LOG_MAX_BYTES = int(os.getenv("SIGNAL_LOG_MAX_BYTES", str(50 * 1024 * 1024))) # 50MBでローテーション
+SIGNAL_LOG_ROTATE_INTERVAL_SECONDS = 60 * 60 * 24 # 1日ごとにローテーション
+SIGNAL_LOG_BACKUP_COUNT = int(os.getenv("SIGNAL_LOG_BACKUP_COUNT", "30")) # 保持する圧縮済みファイル数
+SIGNAL_HISTORY_DB_PATH = os.getenv("SIGNAL_HISTORY_DB_PATH", "signal_history.db") # ログ検索用のSQLite (/history/*)
+# マクロデータ (FGI/為替) の取得先とキャッシュ有効期間 (秒)
+FGI_API_URL = "https://api.alternative.me/fng/?limit=1"
+# USDX/DXYの代理としてUSD/JPY (ドル円) の値動きを使用
+# CCXTでUSDTペアが存在しないため、ここでは外部APIを使用する (例としてBinance Klinesを使う)
+FOREX_API_URL = "https://api.binance.com/api/v3/klines?symbol=USDCJPY&interval=1h&limit=50" # USDCJPYを想定
+FGI_CACHE_TTL_SECONDS = 60 * 60    # FGIは1日1回更新のため、1時間ごとに確認すれば十分
+FOREX_CACHE_TTL_SECONDS = 60 * 10  # 1時間足ベースのため、10分ごとに更新
+MACRO_FAILURE_RETRY_SECONDS = 60   # 一度も取得できていないソースの失敗時は、デフォルト値をこの秒数だけキャッシュする
+# 口座ステータスのキャッシュ有効期間 (秒)。期限切れ後もキャッシュを返しつつバックグラウンドで再取得する
+try:
+    ACCOUNT_STATUS_TTL_SECONDS = float(os.getenv("ACCOUNT_STATUS_TTL_SECONDS", "60"))
+except ValueError:
+    ACCOUNT_STATUS_TTL_SECONDS = 60.0
+ACCOUNT_DUST_THRESHOLD_USDT = 1.0 # 評価額がこれ未満の保有資産 (ダスト) は保有資産リストに含めない
+# 💡 メトリクス (/metrics でPrometheusのテキスト形式で公開する)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "True").lower() in ('true', '1', 't')
+METRICS_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0) # ヒストグラムのバケット (秒)
+# 💡 イベントループの遅延監視 (/health, /status で報告する)
+try:
+    LOOP_LAG_CHECK_INTERVAL_SECONDS = float(os.getenv("LOOP_LAG_CHECK_INTERVAL_SECONDS", "0.5")) # 遅延を測定する間隔
+except ValueError:
+    LOOP_LAG_CHECK_INTERVAL_SECONDS = 0.5
+try:
+    LOOP_LAG_THRESHOLD_SECONDS = float(os.getenv("LOOP_LAG_THRESHOLD_SECONDS", "0.25")) # この遅延を超えたらブロックした処理を記録する
+except ValueError:
+    LOOP_LAG_THRESHOLD_SECONDS = 0.25
+LOOP_LAG_HISTORY_SIZE = 1200   # p50/p99の算出に使う直近のサンプル数 (0.5秒間隔で約10分)
+LOOP_LAG_MAX_OFFENDERS = 5     # 保持するブロックの記録数
+LOOP_LAG_STACK_DEPTH = 12      # 記録するスタックの深さ
+# メソッドごとのリクエストウェイト (未定義のメソッドは1)
+EXCHANGE_REQUEST_WEIGHTS = {
+    'fetch_tickers': 20,
+    'fetch_balance': 5,
+    'fetch_open_orders': 3,
+    'fetch_order': 2,
+}
+
 # 💡 自動売買設定 (動的ロットのベースサイズ)
 try:
     # 総資産額が不明な場合や、動的ロットの最小値として使用
@@ -111,10 +218,26 @@ LAST_ANALYSIS_SIGNALS: List[Dict] = []
 LAST_HOURLY_NOTIFICATION_TIME: float = 0.0 # ★ 1時間ごとの通知時刻
 GLOBAL_MACRO_CONTEXT: Dict = {'fgi_proxy': 0.0, 'fgi_raw_value': 'N/A', 'forex_bonus': 0.0} # ★初期値を設定
 IS_FIRST_MAIN_LOOP_COMPLETED: bool = False # 初回メインループ完了フラグ
-OPEN_POSITIONS: List[Dict] = [] # 現在保有中のポジション (注文IDトラッキング用)
 GLOBAL_TOTAL_EQUITY: float = 0.0 # 総資産額を格納するグローバル変数
 HOURLY_SIGNAL_LOG: List[Dict] = [] # ★ 1時間内のシグナルを一時的に保持するリスト (V19.0.34で追加)
 HOURLY_ATTEMPT_LOG: Dict[str, str] = {} # ★ 1時間内の分析試行を保持するリスト (Symbol: Reason)
+OHLCV_CACHE: Dict[Tuple[str, str], 'ColumnarRingBuffer'] = {} # (symbol, timeframe) ごとの直近OHLCV (増分取得用リングバッファ)
+INDICATOR_ENGINES: Dict[Tuple[str, str], 'IncrementalIndicatorEngine'] = {} # (symbol, timeframe) ごとの指標計算状態
+ANALYSIS_SCHEDULE: Dict[Tuple[str, str], Dict] = {} # (symbol, timeframe) ごとの次回足確定時刻と前回の分析結果
+TICKER_SNAPSHOT: Dict[str, Any] = {'tickers': {}, 'timestamp': 0.0} # 全銘柄ティッカーの共有スナップショット (timestampはtime.monotonic)
+TICKER_SNAPSHOT_TASK: Optional[asyncio.Task] = None # 実行中のスナップショット更新 (同時呼び出しで共有する)
+ACCOUNT_STATUS_CACHE: Dict[str, Any] = {'status': None, 'timestamp': 0.0, 'fill_sequence': 0} # 口座ステータスのキャッシュ (timestampはtime.monotonic)
+ACCOUNT_STATUS_TASK: Optional[asyncio.Task] = None # 実行中の口座ステータスのバックグラウンド更新
+HTTP_SESSION: Optional[aiohttp.ClientSession] = None # 外部API用の共有セッション
+MACRO_CACHE: Dict[str, Dict] = {'fgi': {'value': None, 'timestamp': 0.0}, 'forex': {'value': None, 'timestamp': 0.0}} # マクロデータのソースごとのキャッシュ
+MACRO_REFRESH_TASKS: Dict[str, asyncio.Task] = {} # 実行中のマクロデータのバックグラウンド更新
+ORDER_FEED: Optional['OrderUpdateFeed'] = None # 注文更新フィード
+ORDER_FEED_ACTIVE: bool = False # 注文更新フィードを購読中かどうか
+POSITION_LOCKS: Dict[str, asyncio.Lock] = {} # ポジションIDごとの処理ロック
+MARKET_RULES: Dict[str, Dict] = {} # 銘柄ごとの注文ルール (数量/価格の刻み、最小数量/金額、利用可能な注文タイプ)
+COMPUTE_EXECUTOR: Optional['ComputeExecutor'] = None # 指標計算/スコアリングの実行先
+LAST_WARM_STATE_SAVE_TIME: float = 0.0 # 最後にウォーム状態のスナップショットを保存した時刻
+IS_WARM_STATE_CHECKED: bool = False # 起動時のスナップショット復元を試みたかどうか
 
 # ★ 新規追加: ボットのバージョン (v19.0.53-p1: レポート修正＆推定損益表示版)
 BOT_VERSION = "v19.0.53-p1"
@@ -131,6 +254,36 @@ SIGNAL_THRESHOLD = 0.65             # 動的閾値のベースライン（使わ
 TOP_SIGNAL_COUNT = 3                # 通知するシグナルの最大数
 REQUIRED_OHLCV_LIMITS = {'1m': 500, '5m': 500, '15m': 500, '1h': 500, '4h': 500} # 1m, 5mを含む
 
+# 💡 OHLCV増分取得設定
+# キャッシュ済みの (symbol, timeframe) は、最終足のタイムスタンプ以降 (since=) の足だけを取得する
+OHLCV_INCREMENTAL_FETCH = os.getenv("OHLCV_INCREMENTAL_FETCH", "True").lower() in ('true', '1', 't')
+# キャッシュ (リングバッファ) の価格/出来高列のdtype。メモリを節約したい場合は float32 を指定 (timestampは常にfloat64)
+CANDLE_STORE_DTYPE = np.float32 if os.getenv("CANDLE_STORE_DTYPE", "float64").lower() == "float32" else np.float64
+OHLCV_COLUMNS = ('timestamp', 'open', 'high', 'low', 'close', 'volume')
+# 指標を新しい足の分だけ差分更新する (False の場合は毎回pandas_taで全件計算)
+INCREMENTAL_INDICATORS = os.getenv("INCREMENTAL_INDICATORS", "True").lower() in ('true', '1', 't')
+# 💡 計算エグゼキューター設定
+# 指標計算とスコアリング (CPU処理) の実行場所 ('process': プロセスプール, 'thread': スレッドプール, 'inline': イベントループ上)
+COMPUTE_EXECUTOR_MODE = os.getenv("COMPUTE_EXECUTOR_MODE", "process").lower()
+if COMPUTE_EXECUTOR_MODE not in ('process', 'thread', 'inline'):
+    logging.warning(f"⚠️ COMPUTE_EXECUTOR_MODEが不正な値です ({COMPUTE_EXECUTOR_MODE})。'process' を使用します。")
+    COMPUTE_EXECUTOR_MODE = 'process'
+# ワーカー数の既定値は、イベントループ用に1コアを残した数 (最大4)
+DEFAULT_COMPUTE_EXECUTOR_WORKERS = max(1, min(4, (os.cpu_count() or 1) - 1))
+try:
+    COMPUTE_EXECUTOR_WORKERS = int(os.getenv("COMPUTE_EXECUTOR_WORKERS", str(DEFAULT_COMPUTE_EXECUTOR_WORKERS)))
+except ValueError:
+    COMPUTE_EXECUTOR_WORKERS = DEFAULT_COMPUTE_EXECUTOR_WORKERS
+# 上位足をローカルで下位足から合成する (上位足: 元になる下位足)。コールドスタート時のみ取引所から直接取得する
+DERIVE_HIGHER_TIMEFRAMES = os.getenv("DERIVE_HIGHER_TIMEFRAMES", "True").lower() in ('true', '1', 't')
+DERIVED_TIMEFRAME_SOURCES = {'5m': '1m', '15m': '1m', '4h': '1h'}
+# 足確定スケジューリング: 新しい足が確定するか、価格が前回分析時からバンド以上動いた (symbol, timeframe) だけを再分析する
+CANDLE_CLOSE_SCHEDULING = os.getenv("CANDLE_CLOSE_SCHEDULING", "True").lower() in ('true', '1', 't')
+try:
+    ANALYSIS_PRICE_BAND_PERCENT = float(os.getenv("ANALYSIS_PRICE_BAND_PERCENT", "0.005")) # 0.5%
+except ValueError:
+    ANALYSIS_PRICE_BAND_PERCENT = 0.005
+
 # ====================================================================================
 # 【★スコアリング定数変更 V19.0.33: 最大スコア100点に正規化 (要件4)】
 # (合計最大スコアが1.00になるように調整)
@@ -371,19 +524,20 @@ def format_startup_message(
         )
         
         # ボットが管理しているポジション
-        if OPEN_POSITIONS:
-            total_managed_value = sum(p['filled_usdt'] for p in OPEN_POSITIONS)
+        if POSITION_STORE:
+            managed_positions = POSITION_STORE.all()
+            total_managed_value = sum(p['filled_usdt'] for p in managed_positions)
             
             balance_section += (
-                f"  - **管理中ポジション**: <code>{len(OPEN_POSITIONS)}</code> 銘柄 (投入合計: <code>{format_usdt(total_managed_value)}</code> USDT)\n"
+                f"  - **管理中ポジション**: <code>{len(managed_positions)}</code> 銘柄 (投入合計: <code>{format_usdt(total_managed_value)}</code> USDT)\n"
             )
-            for i, pos in enumerate(OPEN_POSITIONS[:3]): # Top 3のみ表示
+            for i, pos in enumerate(managed_positions[:3]): # Top 3のみ表示
                 base_currency = pos['symbol'].replace('/USDT', '')
                 sl_display = format_price_precision(pos['stop_loss'])
                 tp_display = format_price_precision(pos['take_profit'])
                 balance_section += f"    - Top {i+1}: {base_currency} (SL: {sl_display} / TP: {tp_display})\n"
-            if len(OPEN_POSITIONS) > 3:
-                balance_section += f"    - ...他 {len(OPEN_POSITIONS) - 3} 銘柄\n"
+            if len(managed_positions) > 3:
+                balance_section += f"    - ...他 {len(managed_positions) - 3} 銘柄\n"
         else:
              balance_section += f"  - **管理中ポジション**: <code>なし</code>\n"
 
@@ -422,7 +576,7 @@ def format_telegram_message(signal: Dict, context: str, current_threshold: float
     now_jst = datetime.now(JST).strftime("%Y/%m/%d %H:%M:%S")
     symbol = signal['symbol']
     timeframe = signal['timeframe']
-    score = signal['score']
+    score = signal.get('score', 0.0) # 決済通知 (ポジションデータ) の場合はスコアが無いことがある
     
     # trade_resultから値を取得する場合があるため、get()を使用
     entry_price = signal.get('entry_price', trade_result.get('entry_price', 0.0) if trade_result else 0.0)
@@ -648,22 +802,177 @@ def format_hourly_report(signals: List[Dict], attempt_log: Dict[str, str], start
     
     return message
 
-def _to_json_compatible(data: Any) -> Any:
-    """JSONシリアライズ可能でない型 (numpy, pandas) を標準のPython型に変換するヘルパー関数"""
-    if isinstance(data, (np.ndarray, list)):
-        return [_to_json_compatible(item) for item in data]
-    elif isinstance(data, (pd.Series, pd.DataFrame)):
+def _json_default(data: Any) -> Any:
+    """ json.dumps の default。JSONシリアライズ可能でない型 (numpy, pandas, datetime) のみを変換する """
+    if isinstance(data, np.generic):
+        return data.item()
+    elif isinstance(data, (np.ndarray, pd.Series)):
         return data.tolist()
-    elif isinstance(data, (np.float64, float)):
-        return float(data)
-    elif isinstance(data, (np.int64, int)):
-        return int(data)
-    elif isinstance(data, (datetime)):
+    elif isinstance(data, pd.DataFrame):
+        return data.values.tolist()
+    elif isinstance(data, datetime):
         return data.isoformat()
-    return data
+    elif isinstance(data, (set, frozenset)):
+        return list(data)
+    return str(data)
+
+def _sort_by_mtime(paths: List[str]) -> List[str]:
+    """ ファイルを更新日時の古い順に並べる (並べ替え中に削除されたファイルは除く) """
+    mtimes = []
+    for path in paths:
+        try:
+            mtimes.append((os.path.getmtime(path), path))
+        except FileNotFoundError:
+            continue
+    return [path for _, path in sorted(mtimes)]
+
+class SignalLogWriter:
+    """
+    シグナル/取引ログ (JSON Lines) のバックグラウンド書き込み。
+
+    - write() は呼び出し時点のレコードを1行のJSONにしてキューに追加するだけで、ファイル書き込みは専用スレッドで行う
+      (呼び出し元がネストしたdictを後から変更しても、書き込まれる内容に影響しない)
+    - flush_interval 秒ごと (または batch_size 件ごと) にまとめて書き込む
+    - fsync_policy: 'always' (書き込みごと) / 'interval' (fsync_interval 秒ごと) / 'never' (OSに任せる)
+    - ファイルが max_bytes を超えるか rotate_interval 秒経過したら、gzip圧縮して退避し、
+      退避ファイルは新しいものから backup_count 個まで保持する
+    """
+
+    def __init__(self, path: str, flush_interval: float, batch_size: int, fsync_policy: str, fsync_interval: float,
+                 max_bytes: int, rotate_interval: float, backup_count: int):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self.fsync_policy = fsync_policy
+        self.fsync_interval = fsync_interval
+        self.max_bytes = max_bytes
+        self.rotate_interval = rotate_interval
+        self.backup_count = backup_count
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._file = None
+        self._opened_at = 0.0
+        self._last_fsync = 0.0
+
+    @property
+    def queue_size(self) -> int:
+        """ 書き込み待ちのレコード数 """
+        return self._queue.qsize()
+
+    def write(self, record: Dict):
+        """ レコードをシリアライズして書き込みキューに追加する (ファイルへの書き込みは待たない) """
+        line = json.dumps(record, default=_json_default) + '\n'
+        if self._thread is None or not self._thread.is_alive():
+            self._start()
+        self._queue.put(line)
+
+    def close(self, timeout: float = 5.0):
+        """ キューに残ったレコードを書き込んでからスレッドを終了する """
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="SignalLogWriter", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        batch: List[str] = []
+        deadline = time.monotonic() + self.flush_interval
+        running = True
+        while running:
+            try:
+                line = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                if line is None:
+                    running = False
+                else:
+                    batch.append(line)
+            except queue.Empty:
+                pass
+
+            if batch and (not running or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                try:
+                    self._write_batch(batch)
+                except Exception as e:
+                    logging.error(f"❌ シグナルログの書き込みに失敗しました: {e}")
+                batch = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+
+        if self._file is not None:
+            self._sync(force=True)
+            self._file.close()
+            self._file = None
+
+    def _open(self):
+        self._file = open(self.path, 'a', encoding='utf-8')
+        # 既存ファイルに追記する場合は、先頭レコードの時刻 (ファイルの開始時刻) からの経過でローテーションを判定する
+        # (st_ctime は追記のたびに更新されるため使えない)
+        self._opened_at = self._segment_started_at() if self._file.tell() > 0 else time.time()
+
+    def _segment_started_at(self) -> float:
+        """ 既存ファイルの先頭レコードの timestamp_jst を返す (読めない場合は現在時刻) """
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                first_line = f.readline()
+            return datetime.fromisoformat(json.loads(first_line)['timestamp_jst']).timestamp()
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            logging.warning(f"⚠️ シグナルログの開始時刻を取得できませんでした ({e})。現在時刻から起算します。")
+            return time.time()
+
+    def _write_batch(self, batch: List[str]):
+        if self._file is None:
+            self._open()
+        if self._file.tell() >= self.max_bytes or time.time() - self._opened_at >= self.rotate_interval:
+            self._rotate()
+
+        self._file.write(''.join(batch))
+        self._file.flush()
+        self._sync()
+
+    def _sync(self, force: bool = False):
+        now = time.monotonic()
+        if self.fsync_policy == 'always' or (force and self.fsync_policy != 'never') or \
+                (self.fsync_policy == 'interval' and now - self._last_fsync >= self.fsync_interval):
+            os.fsync(self._file.fileno())
+            self._last_fsync = now
+
+    def _rotate(self):
+        """ 現在のファイルを gzip 圧縮して退避し、新しいファイルを開く """
+        self._sync(force=True)
+        self._file.close()
+        self._file = None
+
+        root, ext = os.path.splitext(self.path)
+        stamp = datetime.now(JST).strftime('%Y%m%d-%H%M%S')
+        rotated_path = f"{root}.{stamp}{ext}"
+        suffix = 1
+        while os.path.exists(rotated_path) or os.path.exists(f"{rotated_path}.gz"): # 同じ秒に複数回ローテーションした場合
+            rotated_path = f"{root}.{stamp}-{suffix}{ext}"
+            suffix += 1
+        os.replace(self.path, rotated_path)
+        with open(rotated_path, 'rb') as src, gzip.open(f"{rotated_path}.gz", 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(rotated_path)
+
+        # 古い退避ファイルを削除
+        backups = _sort_by_mtime(glob.glob(f"{glob.escape(root)}.*{ext}.gz"))
+        for old_path in backups[:-self.backup_count] if self.backup_count > 0 else backups:
+            os.remove(old_path)
+
+        self._open()
+
+SIGNAL_LOG_WRITER = SignalLogWriter(
+    SIGNAL_LOG_PATH, SIGNAL_LOG_FLUSH_INTERVAL_SECONDS, SIGNAL_LOG_BATCH_SIZE, SIGNAL_LOG_FSYNC_POLICY, SIGNAL_LOG_FSYNC_INTERVAL_SECONDS,
+    SIGNAL_LOG_MAX_BYTES, SIGNAL_LOG_ROTATE_INTERVAL_SECONDS, SIGNAL_LOG_BACKUP_COUNT
+)
+atexit.register(SIGNAL_LOG_WRITER.close)
 
 def log_signal(signal: Dict, context: str):
-    """シグナルまたは取引結果をJSON形式でログに記録する"""
+    """シグナルまたは取引結果をJSON形式でログに記録する (書き込みはバックグラウンドで行う)"""
     log_data = {
         'timestamp_jst': datetime.now(JST).isoformat(),
         'context': context,
@@ -675,33 +984,834 @@ def log_signal(signal: Dict, context: str):
         'take_profit': signal.get('take_profit'),
         'rr_ratio': signal.get('rr_ratio'),
         'trade_result': signal.get('trade_result'), # 取引結果 (成功/失敗) を含む
-        'tech_data': _to_json_compatible(signal.get('tech_data', {})) # テクニカルデータを標準Python型に変換
+        'tech_data': signal.get('tech_data', {}) # シリアライズ時に numpy/pandas の型を変換する
     }
     
+    SIGNAL_LOG_WRITER.write(log_data)
+
+
+# ====================================================================================
+# SIGNAL HISTORY (シグナル/取引ログの検索)
+# ====================================================================================
+
+class SignalHistoryStore:
+    """
+    シグナル/取引ログ (SIGNAL_LOG_PATH と、ローテーション済みの .gz ファイル) をSQLiteに取り込み、検索・集計する。
+
+    取り込みは差分のみ: 現在のログファイルは前回読み込んだバイト位置から、.gz ファイルは未取り込みのもののみ読む。
+    (ローテーション前に取り込んだ行は、一意キー (時刻, コンテキスト, 銘柄, 時間足) で重複を無視する)
+    現在のログファイルはファイルの識別子 (デバイス/inodeと先頭行) も記録し、ローテーションで別のファイルになった場合は先頭から読む。
+    """
+
+    FINGERPRINT_BYTES = 4096 # 識別子に含める先頭行の最大バイト数
+
+    COLUMNS = (
+        'ts', 'timestamp_jst', 'context', 'symbol', 'timeframe', 'score', 'entry_price', 'stop_loss', 'take_profit',
+        'rr_ratio', 'trade_status', 'exit_type', 'exit_price', 'pnl_usdt', 'pnl_percent', 'data',
+    )
+
+    def __init__(self, db_path: str, log_path: str):
+        self.db_path = db_path
+        self.log_path = log_path
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS signals (
+                    ts REAL NOT NULL, timestamp_jst TEXT NOT NULL, context TEXT, symbol TEXT, timeframe TEXT,
+                    score REAL, entry_price REAL, stop_loss REAL, take_profit REAL, rr_ratio REAL,
+                    trade_status TEXT, exit_type TEXT, exit_price REAL, pnl_usdt REAL, pnl_percent REAL, data TEXT
+                );
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_signals_unique ON signals (timestamp_jst, context, symbol, timeframe);
+                CREATE INDEX IF NOT EXISTS idx_signals_symbol ON signals (symbol, timeframe, ts);
+                CREATE INDEX IF NOT EXISTS idx_signals_symbol_ts ON signals (symbol, ts);
+                CREATE INDEX IF NOT EXISTS idx_signals_context ON signals (context, ts);
+                CREATE INDEX IF NOT EXISTS idx_signals_ts ON signals (ts);
+                CREATE TABLE IF NOT EXISTS ingested_files (path TEXT PRIMARY KEY, offset INTEGER NOT NULL, file_id TEXT);
+                """
+            )
+            # 識別子の列が無い古いDBは列を追加する (識別子が一致しないため、現在のログファイルは次回先頭から読み直す)
+            columns = {row['name'] for row in self._conn.execute("PRAGMA table_info(ingested_files)")}
+            if 'file_id' not in columns:
+                self._conn.execute("ALTER TABLE ingested_files ADD COLUMN file_id TEXT")
+        return self._conn
+
+    @classmethod
+    def _file_id(cls, f) -> str:
+        """
+        開いているファイルの識別子。ローテーション後の新しいファイルが古いファイルのinodeを再利用する場合があるため、
+        デバイス/inodeに先頭行のハッシュを加える。
+        """
+        stat = os.fstat(f.fileno())
+        f.seek(0)
+        head = f.read(cls.FINGERPRINT_BYTES)
+        first_line = head[:head.find(b'\n') + 1] if b'\n' in head else b''
+        return f"{stat.st_dev}:{stat.st_ino}:{zlib.crc32(first_line):08x}"
+
+    @staticmethod
+    def _to_row(line: str) -> Optional[Tuple]:
+        try:
+            record = json.loads(line)
+            ts = datetime.fromisoformat(record['timestamp_jst']).timestamp()
+        except (ValueError, KeyError, TypeError):
+            return None
+        trade_result = record.get('trade_result') or {}
+        return (
+            ts, record['timestamp_jst'], record.get('context'), record.get('symbol'), record.get('timeframe'),
+            record.get('score'), record.get('entry_price'), record.get('stop_loss'), record.get('take_profit'),
+            record.get('rr_ratio'), trade_result.get('status'), trade_result.get('exit_type'), trade_result.get('exit_price'),
+            trade_result.get('pnl_usdt'), trade_result.get('pnl_percent'), line.strip(),
+        )
+
+    def _insert_lines(self, conn: sqlite3.Connection, lines) -> int:
+        rows = [row for row in map(self._to_row, lines) if row is not None]
+        placeholders = ', '.join('?' * len(self.COLUMNS))
+        conn.executemany(f"INSERT OR IGNORE INTO signals ({', '.join(self.COLUMNS)}) VALUES ({placeholders})", rows)
+        return len(rows)
+
+    def sync(self) -> int:
+        """ 未取り込みのログを取り込み、取り込んだ行数を返す """
+        with self._lock:
+            conn = self._connect()
+            offsets = {path: (offset, file_id) for path, offset, file_id in conn.execute("SELECT path, offset, file_id FROM ingested_files")}
+            count = 0
+
+            # 1. ローテーション済みの圧縮ファイル (1ファイルにつき1回だけ取り込む)
+            root, ext = os.path.splitext(self.log_path)
+            for path in _sort_by_mtime(glob.glob(f"{glob.escape(root)}.*{ext}.gz")):
+                if path in offsets:
+                    continue
+                try:
+                    with gzip.open(path, 'rt', encoding='utf-8') as f:
+                        count += self._insert_lines(conn, f)
+                except FileNotFoundError:
+                    continue # 取り込み前に古い退避ファイルとして削除された
+                conn.execute("INSERT OR REPLACE INTO ingested_files (path, offset, file_id) VALUES (?, ?, NULL)", (path, 0))
+
+            # 2. 現在のログファイル (前回の位置から。ローテーションで別のファイルになった、または縮んだ場合は先頭から)
+            try:
+                with open(self.log_path, 'rb') as f:
+                    file_id = self._file_id(f)
+                    offset, previous_id = offsets.get(self.log_path, (0, None))
+                    if file_id != previous_id or os.fstat(f.fileno()).st_size < offset:
+                        offset = 0
+                    f.seek(offset)
+                    data = f.read()
+            except FileNotFoundError:
+                data = None
+            if data is not None:
+                # 書き込み途中の最終行は次回に回す
+                complete = data[:data.rfind(b'\n') + 1]
+                if complete:
+                    count += self._insert_lines(conn, complete.decode('utf-8').splitlines())
+                conn.execute("INSERT OR REPLACE INTO ingested_files (path, offset, file_id) VALUES (?, ?, ?)", (self.log_path, offset + len(complete), file_id))
+
+            conn.commit()
+            return count
+
+    @staticmethod
+    def _where(symbol: Optional[str] = None, timeframe: Optional[str] = None, context: Optional[str] = None,
+               since: Optional[float] = None, until: Optional[float] = None) -> Tuple[str, List]:
+        clauses, params = [], []
+        for column, value in (('symbol', symbol), ('timeframe', timeframe), ('context', context)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        if since is not None:
+            clauses.append("ts >= ?")
+            params.append(since)
+        if until is not None:
+            clauses.append("ts < ?")
+            params.append(until)
+        return (" WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+    def _query(self, sql: str, params: List) -> List[Dict]:
+        with self._lock:
+            return [dict(row) for row in self._connect().execute(sql, params).fetchall()]
+
+    def signals(self, limit: int = 100, **filters) -> List[Dict]:
+        """ 条件に一致するログを新しい順に返す """
+        where, params = self._where(**filters)
+        rows = self._query(
+            f"SELECT timestamp_jst, context, symbol, timeframe, score, entry_price, stop_loss, take_profit, rr_ratio, "
+            f"trade_status, exit_type, exit_price, pnl_usdt, pnl_percent FROM signals{where} ORDER BY ts DESC LIMIT ?",
+            params + [limit]
+        )
+        return rows
+
+    def score_distribution(self, bins: int = 10, **filters) -> Dict:
+        """ スコアの統計値とヒストグラム (0.0〜1.0 を bins 等分) を返す """
+        where, params = self._where(**filters)
+        score_filter = (where + " AND" if where else " WHERE") + " score IS NOT NULL"
+        summary = self._query(
+            f"SELECT COUNT(*) AS count, AVG(score) AS mean, MIN(score) AS min, MAX(score) AS max FROM signals{score_filter}",
+            params
+        )[0]
+        histogram = self._query(
+            f"SELECT MIN(MAX(CAST(score * ? AS INTEGER), 0), ? - 1) AS bin, COUNT(*) AS count FROM signals{score_filter} GROUP BY bin ORDER BY bin",
+            [bins, bins] + params
+        )
+        return {
+            **summary,
+            'histogram': [
+                {'from': row['bin'] / bins, 'to': (row['bin'] + 1) / bins, 'count': row['count']} for row in histogram
+            ],
+        }
+
+    def trade_stats(self, **filters) -> Dict:
+        """ 決済のPnLを決済タイプ別に集計し、エントリーの成功率とTP到達率を返す """
+        filters.pop('context', None)
+        where, params = self._where(context="ポジション決済", **filters)
+        by_exit_type = self._query(
+            f"SELECT exit_type, COUNT(*) AS count, SUM(pnl_usdt) AS pnl_usdt, AVG(pnl_percent) AS avg_pnl_percent, "
+            f"AVG(CASE WHEN pnl_usdt > 0 THEN 1.0 ELSE 0.0 END) AS win_rate FROM signals{where} GROUP BY exit_type ORDER BY exit_type",
+            params
+        )
+        where, params = self._where(context="取引シグナル", **filters)
+        entries = self._query(
+            f"SELECT COUNT(*) AS attempts, SUM(CASE WHEN trade_status = 'ok' THEN 1 ELSE 0 END) AS filled FROM signals{where}",
+            params
+        )[0]
+
+        closed = sum(row['count'] for row in by_exit_type)
+        take_profits = sum(row['count'] for row in by_exit_type if row['exit_type'] == 'Take Profit')
+        return {
+            'by_exit_type': by_exit_type,
+            'total_pnl_usdt': sum(row['pnl_usdt'] or 0.0 for row in by_exit_type),
+            'closed_positions': closed,
+            'take_profit_hit_rate': take_profits / closed if closed else None,
+            'entry_attempts': entries['attempts'],
+            'entry_fill_rate': (entries['filled'] or 0) / entries['attempts'] if entries['attempts'] else None,
+        }
+
+SIGNAL_HISTORY = SignalHistoryStore(SIGNAL_HISTORY_DB_PATH, SIGNAL_LOG_PATH)
+
+def _parse_history_time(value: Optional[str]) -> Optional[float]:
+    """ クエリパラメータの日時 (UNIX秒、またはISO形式。タイムゾーン省略時はJST) をUNIX秒に変換する """
+    if value is None:
+        return None
     try:
-        # ログをJSONファイルに追記
-        log_file = 'apex_bot_signals.json'
-        with open(log_file, 'a') as f:
-            f.write(json.dumps(log_data) + '\n')
-    except Exception as e:
-        logging.error(f"❌ シグナルログの書き込みに失敗しました: {e}")
+        return float(value)
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        return (parsed if parsed.tzinfo else parsed.replace(tzinfo=JST)).timestamp()
+
+async def query_signal_history(method: str, **kwargs) -> Any:
+    """ ログの差分取り込みと検索を、イベントループを止めないよう別スレッドで実行する """
+    def run():
+        SIGNAL_HISTORY.sync()
+        return getattr(SIGNAL_HISTORY, method)(**kwargs)
+    return await asyncio.to_thread(run)
+
+
+# ====================================================================================
+# METRICS (ステージ別の計測とPrometheus形式の出力)
+# ====================================================================================
+
+def _escape_label_value(value: Any) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+class MetricsTimer:
+    """ with ブロックの所要時間をヒストグラムに記録する """
+
+    __slots__ = ('registry', 'name', 'labels', 'started')
+
+    def __init__(self, registry: 'MetricsRegistry', name: str, labels: Dict[str, str]):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.registry.observe(self.name, time.perf_counter() - self.started, **self.labels)
+
+class MetricsLaps:
+    """ 連続するステージの所要時間を、lap() を呼ぶたびに前回からの経過時間として記録する """
+
+    __slots__ = ('registry', 'name', 'last')
+
+    def __init__(self, registry: 'MetricsRegistry', name: str):
+        self.registry = registry
+        self.name = name
+        self.last = time.perf_counter()
+
+    def lap(self, stage: str):
+        now = time.perf_counter()
+        self.registry.observe(self.name, now - self.last, stage=stage)
+        self.last = now
+
+class MetricsRegistry:
+    """
+    カウンター/ゲージ/ヒストグラムの最小限のレジストリ。render() でPrometheusのテキスト形式を返す。
+
+    - 記録はdictの更新とbisectのみで、ロックは取らない (記録も render() もイベントループのスレッドから呼び出すこと)
+    - ラベルはキーワード引数で渡す (同じメトリクスには毎回同じ順序で渡すこと)
+    - キューの長さなど、出力時に取得すればよい値はコールバックとして登録する
+    """
+
+    def __init__(self, buckets: Tuple[float, ...], enabled: bool = True):
+        self.buckets = tuple(sorted(buckets))
+        self.enabled = enabled
+        self._metadata: Dict[str, Tuple[str, str]] = {} # name -> (type, help)
+        self._values: Dict[str, Dict[Tuple, float]] = {}
+        self._histograms: Dict[str, Dict[Tuple, List[float]]] = {} # labels -> [各バケットの件数..., +Infの件数, 合計, 件数]
+        self._callbacks: Dict[str, Callable[[], float]] = {}
+
+    def describe(self, name: str, metric_type: str, help_text: str):
+        self._metadata[name] = (metric_type, help_text)
+        if metric_type == 'histogram':
+            self._histograms.setdefault(name, {})
+        else:
+            self._values.setdefault(name, {})
+
+    def inc(self, name: str, value: float = 1.0, **labels):
+        if self.enabled:
+            series = self._values[name]
+            key = tuple(labels.items())
+            series[key] = series.get(key, 0.0) + value
+
+    def set(self, name: str, value: float, **labels):
+        if self.enabled:
+            self._values[name][tuple(labels.items())] = value
+
+    def observe(self, name: str, value: float, **labels):
+        if not self.enabled:
+            return
+        series = self._histograms[name]
+        key = tuple(labels.items())
+        counts = series.get(key)
+        if counts is None:
+            counts = series[key] = [0.0] * (len(self.buckets) + 3)
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    def timer(self, name: str, **labels) -> MetricsTimer:
+        return MetricsTimer(self, name, labels)
+
+    def laps(self, name: str) -> MetricsLaps:
+        return MetricsLaps(self, name)
+
+    def register_callback(self, name: str, metric_type: str, help_text: str, callback: Callable[[], float]):
+        """ 出力時に callback() の値を返すメトリクスを登録する """
+        self._metadata[name] = (metric_type, help_text)
+        self._callbacks[name] = callback
+
+    @staticmethod
+    def _format_labels(labels: Tuple, extra: Optional[Tuple[str, str]] = None) -> str:
+        items = list(labels) + ([extra] if extra else [])
+        if not items:
+            return ""
+        return "{" + ",".join(f'{key}="{_escape_label_value(value)}"' for key, value in items) + "}"
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for name, (metric_type, help_text) in self._metadata.items():
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            if name in self._callbacks:
+                try:
+                    lines.append(f"{name} {float(self._callbacks[name]())!r}")
+                except Exception as e:
+                    logging.warning(f"⚠️ メトリクス {name} の取得に失敗しました: {e}")
+                continue
+            if metric_type == 'histogram':
+                for labels, counts in list(self._histograms[name].items()):
+                    # 件数は整数で、合計/ゲージは丸めずに出力する (:g は6桁に丸めるため、100万件を超えると rate() が段階的になる)
+                    cumulative = 0
+                    for bound, count in zip(self.buckets, counts):
+                        cumulative += int(count)
+                        lines.append(f"{name}_bucket{self._format_labels(labels, ('le', repr(bound)))} {cumulative}")
+                    lines.append(f"{name}_bucket{self._format_labels(labels, ('le', '+Inf'))} {int(counts[-1])}")
+                    lines.append(f"{name}_sum{self._format_labels(labels)} {float(counts[-2])!r}")
+                    lines.append(f"{name}_count{self._format_labels(labels)} {int(counts[-1])}")
+            else:
+                for labels, value in list(self._values[name].items()):
+                    lines.append(f"{name}{self._format_labels(labels)} {float(value)!r}")
+        return "\n".join(lines) + "\n"
+
+METRICS = MetricsRegistry(METRICS_LATENCY_BUCKETS, enabled=METRICS_ENABLED)
+METRICS.describe('apex_cycle_duration_seconds', 'histogram', "main_bot_loop 1サイクルの所要時間")
+METRICS.describe('apex_cycles_total', 'counter', "main_bot_loop の実行回数")
+METRICS.describe('apex_cycle_overruns_total', 'counter', "LOOP_INTERVAL を超過したサイクル数")
+METRICS.describe('apex_cycle_errors_total', 'counter', "例外で中断したサイクル数")
+METRICS.describe('apex_cycle_signals', 'gauge', "直近のサイクルで得られたシグナル数")
+METRICS.describe('apex_signals_total', 'counter', "分析で得られたシグナルの累計")
+METRICS.describe('apex_stage_duration_seconds', 'histogram', "main_bot_loop のステージごとの所要時間")
+METRICS.describe('apex_analysis_duration_seconds', 'histogram', "銘柄/タイムフレームごとの分析処理 (ohlcv: 足の取得, compute: 計算エグゼキューター, indicators/scoring: 指標計算/スコアリング本体)")
+METRICS.describe('apex_exchange_request_duration_seconds', 'histogram', "EXCHANGE_CLIENT のメソッドの応答時間 (スケジューラの待ち時間を除く)")
+METRICS.describe('apex_exchange_request_wait_seconds', 'histogram', "リクエストスケジューラでの待ち時間")
+METRICS.describe('apex_exchange_request_errors_total', 'counter', "EXCHANGE_CLIENT のメソッドのエラー数")
+METRICS.describe('apex_telegram_send_duration_seconds', 'histogram', "Telegram通知1件の送信 (再試行を含む) の所要時間")
+METRICS.describe('apex_telegram_messages_total', 'counter', "Telegram通知の送信結果")
+# キューの長さなどは出力時に取得する
+METRICS.register_callback('apex_exchange_queue_depth', 'gauge', "リクエストスケジューラで待機中のリクエスト数",
+                          lambda: EXCHANGE_SCHEDULER.queue_depth if EXCHANGE_SCHEDULER else 0)
+METRICS.register_callback('apex_exchange_in_flight', 'gauge', "実行中の取引所リクエスト数",
+                          lambda: EXCHANGE_SCHEDULER.in_flight if EXCHANGE_SCHEDULER else 0)
+METRICS.register_callback('apex_telegram_queue_depth', 'gauge', "未送信のTelegram通知数",
+                          lambda: TELEGRAM_NOTIFIER.queue_size if TELEGRAM_NOTIFIER else 0)
+METRICS.register_callback('apex_telegram_dropped_total', 'counter', "送信キューの上限により破棄したTelegram通知数",
+                          lambda: TELEGRAM_NOTIFIER.dropped_count if TELEGRAM_NOTIFIER else 0)
+METRICS.register_callback('apex_signal_log_queue_depth', 'gauge', "書き込み待ちのシグナルログ数",
+                          lambda: SIGNAL_LOG_WRITER.queue_size)
+METRICS.register_callback('apex_monitored_symbols', 'gauge', "監視中の銘柄数", lambda: len(CURRENT_MONITOR_SYMBOLS))
+METRICS.register_callback('apex_open_positions', 'gauge', "管理中のポジション数", lambda: len(POSITION_STORE))
+METRICS.register_callback('apex_ohlcv_cache_entries', 'gauge', "キャッシュ済みの (銘柄, タイムフレーム) 数", lambda: len(OHLCV_CACHE))
+
+
+# ====================================================================================
+# EVENT LOOP LAG MONITOR (イベントループの遅延とブロック箇所の検出)
+# ====================================================================================
+
+ASYNCIO_PACKAGE_DIR = os.path.dirname(asyncio.__file__)
+
+class EventLoopLagMonitor:
+    """
+    イベントループのスケジューリング遅延を測定し、ループをブロックした処理を記録する。
+
+    - 監視タスクが interval 秒ごとにスリープし、予定より遅れて再開した時間を遅延として記録する
+    - 監視スレッドが監視タスクの心拍を確認し、threshold 秒以上途絶えた時点で
+      イベントループのスレッドのスタックと実行中のタスクを取得する (ブロック中の処理そのものを記録できる)
+    """
+
+    def __init__(self, interval: float, threshold: float, history_size: int, max_offenders: int, stack_depth: int):
+        self.interval = interval
+        self.threshold = threshold
+        self.stack_depth = stack_depth
+        self.stall_count = 0
+        self._lags: deque = deque(maxlen=history_size)
+        self._offenders: deque = deque(maxlen=max_offenders)
+        self._pending: Optional[Dict] = None # 監視スレッドが取得した、まだ終わっていないブロックの記録
+        self._lock = threading.Lock()
+        self._heartbeat = time.monotonic()
+        self._stop = threading.Event()
+        self._task: Optional[asyncio.Task] = None
+        self._thread: Optional[threading.Thread] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+
+    def start(self):
+        """ 監視タスクと監視スレッドを開始する (イベントループのスレッドから呼び出す) """
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._loop_thread_id = threading.get_ident()
+            self._heartbeat = time.monotonic()
+            self._task = loop.create_task(self._measure_loop())
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="LoopLagWatchdog", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _measure_loop(self):
+        while True:
+            started = time.monotonic()
+            self._heartbeat = started
+            await asyncio.sleep(self.interval)
+            self._record(max(0.0, time.monotonic() - started - self.interval))
+
+    def _record(self, lag: float):
+        self._lags.append(lag)
+        METRICS.observe('apex_event_loop_lag_seconds', lag)
+        with self._lock:
+            offender, self._pending = self._pending, None
+        if lag < self.threshold:
+            return
+
+        self.stall_count += 1
+        METRICS.inc('apex_event_loop_stalls_total')
+        if offender is None:
+            # 監視スレッドが検出する前に終わったブロック (スタックは取得できない)
+            offender = {'detected_at': datetime.now(JST).strftime("%Y/%m/%d %H:%M:%S"), 'task': None, 'stack': []}
+        offender['lag_ms'] = round(lag * 1000, 1)
+        self._offenders.append(offender)
+        location = offender['stack'][-1] if offender['stack'] else "不明"
+        logging.warning(f"⚠️ イベントループが {lag:.2f}秒ブロックされました (タスク: {offender['task']}, 位置: {location})")
+
+    def _watch(self):
+        captured_heartbeat = None
+        while not self._stop.wait(max(0.01, self.threshold / 4)):
+            heartbeat = self._heartbeat
+            if heartbeat == captured_heartbeat or time.monotonic() - heartbeat < self.interval + self.threshold:
+                continue
+            captured_heartbeat = heartbeat # 1回のブロックにつき1回だけ取得する
+            offender = self._capture()
+            with self._lock:
+                self._pending = offender
+
+    def _capture(self) -> Dict:
+        """ イベントループのスレッドで実行中のスタックとタスクを取得する (監視スレッドから呼び出す) """
+        frame = sys._current_frames().get(self._loop_thread_id)
+        stack = []
+        if frame is not None:
+            # asyncio内部 (イベントループのディスパッチ) のフレームは省く
+            entries = [entry for entry in traceback.extract_stack(frame) if not entry.filename.startswith(ASYNCIO_PACKAGE_DIR)]
+            for entry in entries[-self.stack_depth:]:
+                stack.append(f"{os.path.basename(entry.filename)}:{entry.lineno} {entry.name}" + (f" | {entry.line}" if entry.line else ""))
+        task_name = None
+        try:
+            task = asyncio.current_task(self._loop)
+            if task is not None:
+                coro = task.get_coro()
+                task_name = f"{task.get_name()} ({getattr(coro, '__qualname__', coro)})"
+        except Exception:
+            pass
+        return {'detected_at': datetime.now(JST).strftime("%Y/%m/%d %H:%M:%S"), 'task': task_name, 'stack': stack}
+
+    def summary(self) -> Dict[str, Any]:
+        """ 直近の遅延のp50/p99/最大値 (ミリ秒) と、最近のブロックの記録 """
+        lags = np.array(list(self._lags), dtype=np.float64)
+        if len(lags):
+            p50, p99 = np.percentile(lags, [50, 99]) * 1000
+            lag_stats = {'p50_ms': round(float(p50), 2), 'p99_ms': round(float(p99), 2), 'max_ms': round(float(lags.max()) * 1000, 2)}
+        else:
+            lag_stats = {'p50_ms': None, 'p99_ms': None, 'max_ms': None}
+        return {
+            **lag_stats,
+            'samples': len(lags),
+            'threshold_ms': self.threshold * 1000,
+            'stall_count': self.stall_count,
+            'last_offenders': list(self._offenders)[::-1], # 新しい順
+        }
+
+LOOP_LAG_MONITOR = EventLoopLagMonitor(
+    LOOP_LAG_CHECK_INTERVAL_SECONDS, LOOP_LAG_THRESHOLD_SECONDS, LOOP_LAG_HISTORY_SIZE, LOOP_LAG_MAX_OFFENDERS, LOOP_LAG_STACK_DEPTH
+)
+METRICS.describe('apex_event_loop_lag_seconds', 'histogram', "イベントループのスケジューリング遅延")
+METRICS.describe('apex_event_loop_stalls_total', 'counter', "遅延が LOOP_LAG_THRESHOLD_SECONDS を超えた回数")
+
+
+# ====================================================================================
+# EXCHANGE REQUEST SCHEDULER (レート制限対応リクエストスケジューラ)
+# ====================================================================================
+
+# 優先度クラス (値が小さいほど優先)
+PRIORITY_ORDER_MANAGEMENT = 0 # SL/TPの監視・設定・キャンセル、強制クローズ
+PRIORITY_TRADE_EXECUTION = 1  # 新規エントリー注文、口座残高
+PRIORITY_MARKET_DATA = 2      # OHLCV、ティッカー
+
+class ExchangeRequestScheduler:
+    """
+    EXCHANGE_CLIENTへの全リクエストを仲介する非同期スケジューラ。
+
+    - トークンバケット (取引所のリクエストウェイト単位) でレート制限内に収める
+    - 同時実行数を制限し、そのうち reserved_slots 枠は注文管理専用とする
+    - 優先度クラスの順 (注文管理 > 取引実行 > マーケットデータ) に処理し、
+      同じ優先度内ではキー (銘柄) ごとにラウンドロビンで公平に処理する
+    - 注文管理のリクエストはトークン不足でも待たずに実行する (不足分は後続のリクエストが待つ)
+    """
+
+    def __init__(self, rate_per_second: float, burst: float, max_concurrency: int, reserved_slots: int):
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.reserved_slots = min(reserved_slots, max_concurrency - 1)
+        self._tokens = burst
+        self._last_refill = time.monotonic()
+        self._in_flight = 0
+        self._queues: Dict[int, 'OrderedDict[str, deque]'] = {}
+        self._tasks: set = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def queue_depth(self) -> int:
+        """ 待機中のリクエスト数 """
+        return sum(len(queue) for queues in self._queues.values() for queue in queues.values())
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    async def submit(self, func: Callable, priority: int, key: str, weight: float) -> Any:
+        """ リクエスト (コルーチンを返す関数) をキューに追加し、実行結果を待つ """
+        self._ensure_dispatcher()
+        future = self._loop.create_future()
+        queues = self._queues.setdefault(priority, OrderedDict())
+        queues.setdefault(key, deque()).append((func, min(weight, self.burst), future))
+        self._wakeup.set()
+        return await future
+
+    def _ensure_dispatcher(self):
+        loop = asyncio.get_running_loop()
+        if self._dispatcher is None or self._dispatcher.done() or self._loop is not loop:
+            self._loop = loop
+            self._wakeup = asyncio.Event()
+            self._dispatcher = loop.create_task(self._dispatch_loop())
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._last_refill) * self.rate_per_second)
+        self._last_refill = now
+
+    def _has_slot(self, priority: int) -> bool:
+        limit = self.max_concurrency if priority == PRIORITY_ORDER_MANAGEMENT else self.max_concurrency - self.reserved_slots
+        return self._in_flight < limit
+
+    def _peek(self) -> Optional[Tuple[int, str]]:
+        """ 次に実行すべきリクエストの (優先度, キー) を返す """
+        for priority in sorted(self._queues):
+            queues = self._queues[priority]
+            # キャンセル済みのリクエストを取り除く
+            for key in list(queues):
+                queue = queues[key]
+                while queue and queue[0][2].done():
+                    queue.popleft()
+                if not queue:
+                    del queues[key]
+            if queues and self._has_slot(priority):
+                return priority, next(iter(queues))
+        return None
+
+    def _pop(self, priority: int, key: str):
+        queues = self._queues[priority]
+        queue = queues[key]
+        item = queue.popleft()
+        if queue:
+            queues.move_to_end(key) # ラウンドロビン: 処理したキーを末尾へ
+        else:
+            del queues[key]
+        return item
+
+    async def _dispatch_loop(self):
+        while True:
+            target = self._peek()
+            if target is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            priority, key = target
+            weight = self._queues[priority][key][0][1]
+            self._refill()
+            if self._tokens < weight and priority != PRIORITY_ORDER_MANAGEMENT:
+                # トークンが貯まるまで待機 (より優先度の高いリクエストが来たら再評価)
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=(weight - self._tokens) / self.rate_per_second)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            func, weight, future = self._pop(priority, key)
+            self._tokens -= weight
+            self._in_flight += 1
+            task = self._loop.create_task(self._run(func, future))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, func: Callable, future: asyncio.Future):
+        try:
+            result = await func()
+            if not future.done():
+                future.set_result(result)
+        except (ccxt.RateLimitExceeded, ccxt.DDoSProtection) as e:
+            # 429を受けた場合はトークンを使い切った状態にして、後続のリクエストを減速させる
+            self._tokens = min(self._tokens, 0.0) - EXCHANGE_RATE_LIMIT_BACKOFF_SECONDS * self.rate_per_second
+            logging.warning(f"⚠️ 取引所のレート制限に到達しました。リクエストを減速します: {e}")
+            if not future.done():
+                future.set_exception(e)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            if not future.done():
+                future.set_exception(e)
+        finally:
+            self._in_flight -= 1
+            self._wakeup.set()
 
+EXCHANGE_SCHEDULER: Optional[ExchangeRequestScheduler] = ExchangeRequestScheduler(
+    EXCHANGE_RATE_LIMIT_PER_SECOND, EXCHANGE_RATE_LIMIT_BURST, EXCHANGE_MAX_CONCURRENCY, EXCHANGE_RESERVED_ORDER_SLOTS
+) if EXCHANGE_SCHEDULER_ENABLED else None
+
+async def exchange_request(method: str, *args, priority: int = PRIORITY_MARKET_DATA, key: Optional[str] = None, **kwargs) -> Any:
+    """
+    EXCHANGE_CLIENTのメソッドを、リクエストスケジューラ経由で呼び出す。
+    key (通常は銘柄) は同じ優先度内での公平なラウンドロビンに使用する。
+    """
+    func = getattr(EXCHANGE_CLIENT, method)
+    # 応答時間はメソッド (fetch_ohlcv はタイムフレームも) ごとに記録する
+    timeframe = (args[1] if len(args) > 1 else kwargs.get('timeframe', '')) if method == 'fetch_ohlcv' else ''
+    requested_at = time.perf_counter()
+    started_at: Optional[float] = None
+
+    async def call():
+        nonlocal started_at
+        started_at = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        except Exception as e:
+            METRICS.inc('apex_exchange_request_errors_total', method=method, error=type(e).__name__)
+            raise
+        finally:
+            METRICS.observe('apex_exchange_request_duration_seconds', time.perf_counter() - started_at, method=method, timeframe=timeframe)
+
+    if EXCHANGE_SCHEDULER is None:
+        return await call()
+
+    weight = EXCHANGE_REQUEST_WEIGHTS.get(method, 1)
+    try:
+        return await EXCHANGE_SCHEDULER.submit(call, priority, key or method, weight)
+    finally:
+        if started_at is not None:
+            METRICS.observe('apex_exchange_request_wait_seconds', started_at - requested_at, method=method)
+
+async def _refresh_ticker_snapshot(priority: int) -> Dict[str, Dict]:
+    global TICKER_SNAPSHOT
+
+    tickers = await exchange_request('fetch_tickers', priority=priority)
+    TICKER_SNAPSHOT = {'tickers': tickers, 'timestamp': time.monotonic()}
+    return tickers
+
+async def get_ticker_snapshot(max_age: Optional[float] = None, priority: int = PRIORITY_MARKET_DATA) -> Dict[str, Dict]:
+    """
+    全銘柄のティッカーのスナップショットを返す。
+    max_age (デフォルト: TICKER_SNAPSHOT_TTL_SECONDS) 以内に取得したものがあればそれを返し、
+    期限切れの場合は fetch_tickers を1回だけ実行する (更新中に呼ばれた場合は同じリクエストの結果を待つ)。
+    """
+    global TICKER_SNAPSHOT_TASK
+
+    max_age = TICKER_SNAPSHOT_TTL_SECONDS if max_age is None else max_age
+    if TICKER_SNAPSHOT['tickers'] and time.monotonic() - TICKER_SNAPSHOT['timestamp'] < max_age:
+        return TICKER_SNAPSHOT['tickers']
+
+    if TICKER_SNAPSHOT_TASK is None or TICKER_SNAPSHOT_TASK.done():
+        TICKER_SNAPSHOT_TASK = asyncio.create_task(_refresh_ticker_snapshot(priority))
+    # 呼び出し元がキャンセルされても、他の待機者のために更新は継続する
+    return await asyncio.shield(TICKER_SNAPSHOT_TASK)
+
+async def get_ticker(symbol: str, priority: int = PRIORITY_MARKET_DATA) -> Dict:
+    """
+    スナップショットから銘柄のティッカーを返す。スナップショットに無い銘柄のみ個別に取得する。
+    注文管理の優先度では、市場データの優先度で待機中のスナップショット更新 (fetch_tickers) を待たず、
+    有効期間内のスナップショットが無ければ自分の優先度で fetch_ticker を発行する。
+    """
+    if priority == PRIORITY_ORDER_MANAGEMENT:
+        is_fresh = time.monotonic() - TICKER_SNAPSHOT['timestamp'] < TICKER_SNAPSHOT_TTL_SECONDS
+        ticker = TICKER_SNAPSHOT['tickers'].get(symbol) if is_fresh else None
+    else:
+        tickers = await get_ticker_snapshot(priority=priority)
+        ticker = tickers.get(symbol)
+    if ticker is None or ticker.get('last') is None:
+        ticker = await exchange_request('fetch_ticker', symbol, priority=priority, key=symbol)
+    return ticker
 
 # ====================================================================================
 # CCXT & EXCHANGE CLIENT 
 # ====================================================================================
 
+def _precision_to_digits(precision: Any) -> int:
+    """ CCXTのprecision (刻み幅 0.0001 または桁数 4) を小数点以下の桁数に変換する """
+    if precision is None:
+        # 精度が設定されていない場合は、一旦小数点以下4桁としておく
+        return 4
+    elif isinstance(precision, float) and precision < 1:
+        # 例: 0.0001
+        try:
+            return max(0, int(-math.log10(precision)))
+        except ValueError: # math.log10(0) を避ける
+            return 8
+    elif isinstance(precision, int):
+        # 例: 4 (小数第4位)
+        return precision
+    return 4
+
+def build_market_rules(markets: Dict[str, Dict]) -> Dict[str, Dict]:
+    """ マーケットデータから、注文時に参照する銘柄ごとのルールを事前計算する """
+    rules = {}
+    for symbol, market in markets.items():
+        precision = market.get('precision') or {}
+        limits = market.get('limits') or {}
+        amount_digits = _precision_to_digits(precision.get('amount'))
+        rules[symbol] = {
+            'amount_digits': amount_digits,
+            'amount_scale': 10 ** amount_digits,
+            'price_digits': _precision_to_digits(precision.get('price')),
+            'min_amount': (limits.get('amount') or {}).get('min') or 0.0,
+            'min_notional': (limits.get('cost') or {}).get('min') or 0.0,
+            'order_types': frozenset((market.get('info') or {}).get('options', {}).get('default_allowed_orders', [])),
+        }
+    return rules
+
+def _read_market_cache(path: str) -> Optional[Dict]:
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def _write_market_cache(path: str, data: Dict):
+    # 書き込み途中のファイルを読まないよう、一時ファイルに書いてから置き換える
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, default=str)
+    os.replace(tmp_path, path)
+
+async def load_market_cache() -> Optional[Dict]:
+    """ ディスクキャッシュのマーケットデータを返す。存在しない/形式や取引所が異なる/期限切れの場合は None """
+    if not MARKET_CACHE_PATH or not os.path.exists(MARKET_CACHE_PATH):
+        return None
+    try:
+        cache = await asyncio.to_thread(_read_market_cache, MARKET_CACHE_PATH)
+    except Exception as e:
+        logging.warning(f"⚠️ マーケットデータのキャッシュを読み込めませんでした: {e}")
+        return None
+
+    if cache.get('version') != MARKET_CACHE_VERSION or cache.get('exchange') != CCXT_CLIENT_NAME.lower() or cache.get('ccxt_version') != ccxt.__version__:
+        logging.info("ℹ️ マーケットデータのキャッシュの形式が異なるため、再取得します。")
+        return None
+    age = time.time() - cache.get('saved_at', 0.0)
+    if age > MARKET_CACHE_TTL_SECONDS:
+        logging.info(f"ℹ️ マーケットデータのキャッシュが期限切れです ({age / 3600:.1f}時間前)。再取得します。")
+        return None
+    return cache
+
+async def save_market_cache():
+    """ ロード済みのマーケットデータをディスクキャッシュに保存する """
+    if not MARKET_CACHE_PATH:
+        return
+    data = {
+        'version': MARKET_CACHE_VERSION,
+        'exchange': CCXT_CLIENT_NAME.lower(),
+        'ccxt_version': ccxt.__version__,
+        'saved_at': time.time(),
+        'markets': EXCHANGE_CLIENT.markets,
+        'currencies': EXCHANGE_CLIENT.currencies,
+    }
+    try:
+        await asyncio.to_thread(_write_market_cache, MARKET_CACHE_PATH, data)
+    except Exception as e:
+        logging.warning(f"⚠️ マーケットデータのキャッシュを保存できませんでした: {e}")
+
 async def initialize_exchange_client():
     """CCXTクライアントを初期化する"""
-    global EXCHANGE_CLIENT, IS_CLIENT_READY
+    global EXCHANGE_CLIENT, IS_CLIENT_READY, MARKET_RULES
     
     if IS_CLIENT_READY:
         return
         
     logging.info(f"💡 CCXTクライアント ({CCXT_CLIENT_NAME.upper()}) の初期化を開始します...")
 
-    # CCXTの取引所クラスを動的に取得
-    exchange_class = getattr(ccxt_async, CCXT_CLIENT_NAME.lower(), None)
+    # CCXTの取引所クラスを動的に取得 ('fake' は負荷/レイテンシ試験用の疑似取引所)
+    if CCXT_CLIENT_NAME.lower() == 'fake':
+        from fake_exchange import FakeExchange
+        exchange_class = FakeExchange
+    else:
+        exchange_class = getattr(ccxt_async, CCXT_CLIENT_NAME.lower(), None)
     
     if exchange_class is None:
         logging.critical(f"🚨 サポートされていない取引所です: {CCXT_CLIENT_NAME}")
@@ -711,15 +1821,22 @@ async def initialize_exchange_client():
     EXCHANGE_CLIENT = exchange_class({
         'apiKey': API_KEY,
         'secret': SECRET_KEY,
-        'enableRateLimit': True, # レート制限を有効にする
+        'enableRateLimit': not EXCHANGE_SCHEDULER_ENABLED, # レート制限はリクエストスケジューラで行う (無効時はCCXT側で制限)
         'timeout': 30000, # タイムアウトを30秒に設定
         # MEXC specific settings, if needed
         # 'options': { ... }
     })
     
     try:
-        # マーケットデータをロード (初回のみ)
-        await EXCHANGE_CLIENT.load_markets()
+        # マーケットデータをロード (ディスクキャッシュが有効な場合はダウンロードをスキップ)
+        cache = await load_market_cache()
+        if cache is not None:
+            EXCHANGE_CLIENT.set_markets(cache['markets'], cache.get('currencies') or None)
+            logging.info(f"✅ マーケットデータをキャッシュから読み込みました ({len(EXCHANGE_CLIENT.markets)}銘柄)。")
+        else:
+            await EXCHANGE_CLIENT.load_markets()
+            await save_market_cache()
+        MARKET_RULES = build_market_rules(EXCHANGE_CLIENT.markets)
         IS_CLIENT_READY = True
         logging.info(f"✅ CCXTクライアント ({CCXT_CLIENT_NAME.upper()}) の初期化に成功しました。")
         
@@ -728,90 +1845,328 @@ async def initialize_exchange_client():
         IS_CLIENT_READY = False
         await EXCHANGE_CLIENT.close() # 失敗時はクローズ
 
+class TelegramNotifier:
+    """
+    Telegram通知の送信キュー。
+
+    - telegram_send_message() はキューに追加するだけで、送信はバックグラウンドのタスクが行う
+    - 接続は keep-alive の aiohttp セッションを使い回す
+    - チャットごとに送信間隔 (min_interval) を空け、その間に溜まったメッセージは1通 (最大4096文字) にまとめる
+    - 429 (Too Many Requests) は retry_after に従い、5xx/通信エラーは指数バックオフで再試行する
+    - キューが上限に達した場合は、全チャットを通じて最も古い (最初に追加された) メッセージを破棄する
+    """
+
+    MAX_MESSAGE_LENGTH = 4096 # Telegramの1メッセージあたりの最大文字数
+    MESSAGE_SEPARATOR = "\n\n"
+
+    def __init__(self, token: str, max_queue_size: int, min_interval: float, max_retries: int):
+        self.url = f"https://api.telegram.org/bot{token}/sendMessage"
+        self.max_queue_size = max_queue_size
+        self.min_interval = min_interval
+        self.max_retries = max_retries
+        self.dropped_count = 0
+        self._pending: 'OrderedDict[str, deque]' = OrderedDict() # chat_id -> 未送信メッセージ (追加順の番号, 本文)
+        self._size = 0
+        self._sequence = 0 # メッセージの追加順 (破棄するメッセージの選択に使う)
+        self._last_sent: Dict[str, float] = {}
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    @property
+    def queue_size(self) -> int:
+        return self._size
+
+    def start(self):
+        """ 送信タスクを開始する (実行中のイベントループに紐付ける) """
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._loop is not loop:
+            self._loop = loop
+            self._session = None
+            self._wakeup = asyncio.Event()
+            self._task = loop.create_task(self._drain_loop())
+
+    def enqueue(self, text: str, chat_id: str):
+        """ メッセージをキューに追加する (送信は待たない) """
+        self.start()
+        if self._size >= self.max_queue_size:
+            # 各チャットの先頭が、そのチャットで最も古いメッセージ
+            oldest_chat = min((c for c in self._pending if self._pending[c]), key=lambda c: self._pending[c][0][0])
+            self._pending[oldest_chat].popleft()
+            self._size -= 1
+            self.dropped_count += 1
+            logging.warning(f"⚠️ Telegram送信キューが上限 ({self.max_queue_size}) に達したため、最も古い通知を破棄しました。")
+        self._sequence += 1
+        self._pending.setdefault(chat_id, deque()).append((self._sequence, text))
+        self._size += 1
+        self._wakeup.set()
+
+    async def close(self, flush_timeout: float = 5.0):
+        """ 未送信のメッセージを (flush_timeout秒まで) 送信してから、タスクとセッションを終了する """
+        if self._task is not None and not self._task.done():
+            deadline = time.monotonic() + flush_timeout
+            while self._size > 0 and time.monotonic() < deadline:
+                await asyncio.sleep(0.1)
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                timeout=aiohttp.ClientTimeout(total=10),
+                connector=aiohttp.TCPConnector(limit=4, keepalive_timeout=60),
+            )
+        return self._session
+
+    def _next_chat(self) -> Optional[str]:
+        for chat_id, queue in self._pending.items():
+            if queue:
+                return chat_id
+        return None
+
+    def _take_batch(self, chat_id: str) -> str:
+        """ チャットの未送信メッセージを、最大文字数に収まる範囲で1通にまとめて取り出す """
+        queue = self._pending[chat_id]
+        sequence, text = queue.popleft()
+        self._size -= 1
+
+        if len(text) > self.MAX_MESSAGE_LENGTH:
+            # 長すぎるメッセージは改行位置で分割し、残りを (元の追加順のまま) 先頭に戻す
+            cut = text.rfind("\n", 0, self.MAX_MESSAGE_LENGTH)
+            cut = cut if cut > 0 else self.MAX_MESSAGE_LENGTH
+            queue.appendleft((sequence, text[cut:].lstrip("\n")))
+            self._size += 1
+            text = text[:cut]
+        else:
+            while queue and len(text) + len(self.MESSAGE_SEPARATOR) + len(queue[0][1]) <= self.MAX_MESSAGE_LENGTH:
+                text += self.MESSAGE_SEPARATOR + queue.popleft()[1]
+                self._size -= 1
+
+        self._pending.move_to_end(chat_id) # 複数チャット間のラウンドロビン
+        return text
+
+    async def _drain_loop(self):
+        while True:
+            chat_id = self._next_chat()
+            if chat_id is None:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+                continue
+
+            # チャットごとの送信間隔を守る (待機中に届いたメッセージは同じ送信にまとめる)
+            wait = self._last_sent.get(chat_id, 0.0) + self.min_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            text = self._take_batch(chat_id)
+            started = time.perf_counter()
+            sent = await self._send_with_retry(chat_id, text)
+            METRICS.observe('apex_telegram_send_duration_seconds', time.perf_counter() - started)
+            METRICS.inc('apex_telegram_messages_total', result='sent' if sent else 'failed')
+            self._last_sent[chat_id] = time.monotonic()
+
+    async def _send_with_retry(self, chat_id: str, text: str) -> bool:
+        payload = {
+            'chat_id': chat_id,
+            'text': text,
+            'parse_mode': 'HTML' # MarkdownではなくHTML形式を使用
+        }
+        for attempt in range(self.max_retries + 1):
+            delay = TELEGRAM_RETRY_BASE_DELAY_SECONDS * (2 ** attempt)
+            try:
+                session = await self._get_session()
+                async with session.post(self.url, data=payload) as response:
+                    if response.status == 200:
+                        return True
+                    try:
+                        body = await response.json(content_type=None)
+                    except Exception:
+                        body = {}
+                    if response.status == 429:
+                        delay = float(body.get('parameters', {}).get('retry_after', delay))
+                        logging.warning(f"⚠️ Telegramのレート制限に到達しました。{delay:.0f}秒後に再送します。")
+                    elif response.status < 500:
+                        # 400 (HTMLの解析エラーなど) は再送しても成功しないため破棄する
+                        logging.error(f"❌ Telegram通知の送信に失敗しました (HTTP {response.status}): {body.get('description')}")
+                        return False
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.warning(f"⚠️ Telegram通知の送信中に通信エラーが発生 (再試行 {attempt + 1}/{self.max_retries}): {e}")
+            except Exception as e:
+                logging.error(f"❌ Telegram通知の送信中にエラーが発生: {e}")
+                return False
+
+            if attempt < self.max_retries:
+                await asyncio.sleep(delay)
+
+        logging.error(f"❌ Telegram通知の送信を {self.max_retries} 回再試行しましたが失敗しました。通知を破棄します。")
+        return False
+
+TELEGRAM_NOTIFIER: Optional[TelegramNotifier] = TelegramNotifier(
+    TELEGRAM_BOT_TOKEN, TELEGRAM_QUEUE_MAX_SIZE, TELEGRAM_MIN_INTERVAL_SECONDS, TELEGRAM_MAX_RETRIES
+) if TELEGRAM_BOT_TOKEN else None
+
 async def telegram_send_message(message: str):
-    """Telegramにメッセージを送信する"""
-    if not TELEGRAM_BOT_TOKEN or not TELEGRAM_CHAT_ID:
+    """Telegramにメッセージを送信する (送信キューに追加するだけで、送信完了は待たない)"""
+    if not TELEGRAM_NOTIFIER or not TELEGRAM_CHAT_ID:
         logging.warning("⚠️ TelegramのトークンまたはチャットIDが設定されていません。通知をスキップします。")
         return
-        
-    url = f"https://api.telegram.org/bot{TELEGRAM_BOT_TOKEN}/sendMessage"
-    payload = {
-        'chat_id': TELEGRAM_CHAT_ID,
-        'text': message,
-        'parse_mode': 'HTML' # MarkdownではなくHTML形式を使用
+
+    TELEGRAM_NOTIFIER.enqueue(message, TELEGRAM_CHAT_ID)
+
+async def _fetch_account_status_from_exchange() -> Dict:
+    """ 口座残高を取得し、保有資産を共有ティッカースナップショットで一括評価する """
+    # 1. 口座残高の取得
+    balance = await exchange_request('fetch_balance', priority=PRIORITY_TRADE_EXECUTION)
+    totals = balance.get('total', {})
+
+    # 2. 利用可能なUSDT残高 (取引に使用可能な残高)
+    total_usdt_balance = balance.get('free', {}).get('USDT', 0.0)
+
+    # 3. 総資産額 (Equity) の計算
+    # USDT残高をまずEquityに加算
+    total_equity = totals.get('USDT', 0.0) or 0.0
+    open_ccxt_positions = [] # CCXTが認識している保有資産 (ボット管理外を含む)
+
+    # その他の保有資産（BTC, ETHなど）の評価額を、1回のティッカー取得とベクトル演算でUSDT建てに換算
+    currencies = [
+        currency for currency, amount in totals.items()
+        if currency not in ['USDT', 'USD'] and amount is not None and amount > 0.000001
+    ]
+    if currencies:
+        tickers = await get_ticker_snapshot()
+        symbols = [f"{currency}/USDT" for currency in currencies]
+        amounts = np.array([totals[currency] for currency in currencies], dtype=np.float64)
+        prices = np.array([(tickers.get(symbol) or {}).get('last') or np.nan for symbol in symbols], dtype=np.float64)
+        values = amounts * prices
+
+        valued = np.isfinite(values)
+        total_equity += float(values[valued].sum())
+
+        if not valued.all():
+            # 取引所がそのシンボルを持っていない可能性など
+            missing = [currencies[i] for i in np.flatnonzero(~valued)]
+            logging.warning(f"⚠️ USDT評価額を取得できない資産があります: {', '.join(missing)}")
+
+        # ダスト (評価額が閾値未満) はポジションリストに含めない
+        for i in np.flatnonzero(valued & (values >= ACCOUNT_DUST_THRESHOLD_USDT)):
+            open_ccxt_positions.append({
+                'symbol': symbols[i],
+                'base_currency': currencies[i],
+                'amount': float(amounts[i]),
+                'usdt_value': float(values[i]),
+                'current_price': float(prices[i])
+            })
+
+    return {
+        'total_usdt_balance': total_usdt_balance,
+        'total_equity': total_equity,
+        'open_positions': open_ccxt_positions,
+        'error': False
     }
 
+async def _refresh_account_status() -> Dict:
+    """ 口座ステータスを取引所から再取得してキャッシュを更新する """
+    global ACCOUNT_STATUS_CACHE, GLOBAL_TOTAL_EQUITY
+
+    fill_sequence = ACCOUNT_STATUS_CACHE['fill_sequence']
+    status = await _fetch_account_status_from_exchange()
+
+    if ACCOUNT_STATUS_CACHE['fill_sequence'] == fill_sequence:
+        ACCOUNT_STATUS_CACHE.update({'status': status, 'timestamp': time.monotonic()})
+        GLOBAL_TOTAL_EQUITY = status['total_equity'] # グローバル変数を更新
+    else:
+        # 取得中に約定が反映されたため、この結果はキャッシュせず次回の呼び出しで再取得する
+        ACCOUNT_STATUS_CACHE['timestamp'] = 0.0
+    return status
+
+async def _background_refresh_account_status():
     try:
-        # requestsはブロッキングなので、別スレッドで実行する必要がある
-        await asyncio.to_thread(requests.post, url, data=payload, timeout=5)
-        # logging.debug("✅ Telegram通知を送信しました。")
+        await _refresh_account_status()
     except Exception as e:
-        logging.error(f"❌ Telegram通知の送信中にエラーが発生: {e}")
+        logging.error(f"❌ 口座ステータスのバックグラウンド更新に失敗しました (キャッシュを継続使用): {e}")
+
+def _copy_account_status(status: Dict) -> Dict:
+    return {**status, 'open_positions': list(status['open_positions'])}
+
+async def fetch_account_status(force_refresh: bool = False) -> Dict:
+    """
+    口座ステータス (USDT残高、総資産額) を取得する。
 
-async def fetch_account_status() -> Dict:
-    """口座ステータス (USDT残高、総資産額) を取得する"""
-    global EXCHANGE_CLIENT, IS_CLIENT_READY, GLOBAL_TOTAL_EQUITY, MIN_USDT_BALANCE_FOR_TRADE
+    キャッシュがあれば即座に返し、ACCOUNT_STATUS_TTL_SECONDS を過ぎている場合はバックグラウンドで再取得する。
+    キャッシュは再取得の間も apply_fill_to_account_status() で約定分が反映される。
+    初回 (キャッシュなし) または force_refresh=True の場合のみ、取引所からの取得を待つ。
+    """
+    global EXCHANGE_CLIENT, IS_CLIENT_READY, ACCOUNT_STATUS_TASK
     
     if not EXCHANGE_CLIENT or not IS_CLIENT_READY:
         logging.critical("🚨 口座ステータスの取得に失敗しました。クライアントが準備できていません。")
         return {'total_usdt_balance': 0.0, 'total_equity': 0.0, 'open_positions': [], 'error': True}
-        
-    total_equity = 0.0
-    total_usdt_balance = 0.0
-    open_ccxt_positions = [] # CCXTが認識している保有資産 (ボット管理外を含む)
+
+    cached = ACCOUNT_STATUS_CACHE['status']
+    if cached is not None and not force_refresh:
+        is_stale = time.monotonic() - ACCOUNT_STATUS_CACHE['timestamp'] >= ACCOUNT_STATUS_TTL_SECONDS
+        if is_stale and (ACCOUNT_STATUS_TASK is None or ACCOUNT_STATUS_TASK.done()):
+            ACCOUNT_STATUS_TASK = asyncio.create_task(_background_refresh_account_status())
+        return _copy_account_status(cached)
 
     try:
-        # 1. 口座残高の取得
-        balance = await EXCHANGE_CLIENT.fetch_balance()
-        
-        # 2. 利用可能なUSDT残高 (取引に使用可能な残高)
-        total_usdt_balance = balance.get('free', {}).get('USDT', 0.0)
-        
-        # 3. 総資産額 (Equity) の計算
-        # USDT残高をまずEquityに加算
-        total_equity += balance.get('total', {}).get('USDT', 0.0)
-        
-        # その他の保有資産（BTC, ETHなど）の評価額をUSDT建てで加算
-        for currency, amount in balance.get('total', {}).items():
-            if currency not in ['USDT', 'USD'] and amount is not None and amount > 0.000001:
-                try:
-                    # シンボル形式に変換 (例: BTC/USDT)
-                    symbol = f"{currency}/USDT"
-                    
-                    # Tickerを取得してUSDT建ての価格を調べる
-                    ticker = await EXCHANGE_CLIENT.fetch_ticker(symbol)
-                    current_price = ticker['last']
-                    usdt_value = amount * current_price
-                    
-                    total_equity += usdt_value
-                    
-                    # ポジションリストに追加
-                    open_ccxt_positions.append({
-                        'symbol': symbol,
-                        'base_currency': currency,
-                        'amount': amount,
-                        'usdt_value': usdt_value,
-                        'current_price': current_price
-                    })
-                    
-                except Exception as e:
-                    # 取引所がそのシンボルを持っていない可能性など
-                    logging.warning(f"⚠️ {currency} のUSDT評価額取得に失敗しました: {e}")
-                    
-        GLOBAL_TOTAL_EQUITY = total_equity # グローバル変数を更新
-        
-        # 4. 結果を返す
-        return {
-            'total_usdt_balance': total_usdt_balance,
-            'total_equity': total_equity,
-            'open_positions': open_ccxt_positions,
-            'error': False
-        }
+        return _copy_account_status(await _refresh_account_status())
 
     except Exception as e:
         logging.critical(f"🚨 口座ステータスの取得中にCCXTエラーが発生しました: {e}", exc_info=True)
+        if cached is not None:
+            return _copy_account_status(cached)
         return {'total_usdt_balance': 0.0, 'total_equity': 0.0, 'open_positions': [], 'error': True}
 
+def apply_fill_to_account_status(symbol: str, side: str, amount: float, price: float):
+    """
+    約定 (買い/売り) をキャッシュ済みの口座ステータスに反映する。
+    次回の再取得までの間、USDT残高・保有資産・総資産額を約定価格で概算更新する。
+    """
+    global ACCOUNT_STATUS_CACHE, GLOBAL_TOTAL_EQUITY
+
+    ACCOUNT_STATUS_CACHE['fill_sequence'] += 1
+    status = ACCOUNT_STATUS_CACHE['status']
+    if status is None or amount <= 0 or price is None or price <= 0:
+        return
+
+    usdt_delta = amount * price if side == 'sell' else -amount * price
+    base_delta = amount if side == 'buy' else -amount
+
+    positions = status['open_positions']
+    index = next((i for i, p in enumerate(positions) if p['symbol'] == symbol), None)
+    old_value = positions[index]['usdt_value'] if index is not None else 0.0
+    old_amount = positions[index]['amount'] if index is not None else 0.0
+    new_amount = max(0.0, old_amount + base_delta)
+    new_value = new_amount * price
+
+    # 保有資産リストは辞書を置き換える (返却済みのコピーに影響させない)
+    new_positions = [p for p in positions if p['symbol'] != symbol]
+    if new_value >= ACCOUNT_DUST_THRESHOLD_USDT:
+        new_positions.append({
+            'symbol': symbol,
+            'base_currency': symbol.split('/')[0],
+            'amount': new_amount,
+            'usdt_value': new_value,
+            'current_price': price
+        })
+
+    total_equity = status['total_equity'] + usdt_delta + (new_value - old_value)
+    ACCOUNT_STATUS_CACHE['status'] = {
+        **status,
+        'total_usdt_balance': max(0.0, status['total_usdt_balance'] + usdt_delta),
+        'total_equity': total_equity,
+        'open_positions': new_positions,
+    }
+    GLOBAL_TOTAL_EQUITY = total_equity
+
 async def update_monitor_symbols() -> List[str]:
     """
     取引所の出来高上位銘柄を取得し、監視対象リストを更新する。
@@ -830,8 +2185,8 @@ async def update_monitor_symbols() -> List[str]:
     logging.info("💡 出来高上位銘柄 (TOP_SYMBOL_LIMIT) の更新を試みます...")
     
     try:
-        # すべてのティッカー情報を取得
-        tickers = await EXCHANGE_CLIENT.fetch_tickers()
+        # すべてのティッカー情報を取得 (共有スナップショット)
+        tickers = await get_ticker_snapshot()
         
         # USDTペアのみを抽出し、24時間出来高 (quoteVolume) でソートする
         usdt_tickers = {}
@@ -855,96 +2210,141 @@ async def update_monitor_symbols() -> List[str]:
         logging.error(f"❌ 出来高上位銘柄の取得に失敗しました: {e}。デフォルトの銘柄を使用します。")
         return DEFAULT_SYMBOLS.copy()
 
-async def fetch_fgi_data() -> Dict:
-    """Fear & Greed Index (FGI) と為替レート（USDX）のデータを取得する"""
-    
-    # 外部APIのURL
-    FGI_API_URL = "https://api.alternative.me/fng/?limit=1"
-    # USDX/DXYの代理としてUSD/JPY (ドル円) の値動きを使用
-    # CCXTでUSDTペアが存在しないため、ここでは外部APIを使用する (例としてBinance Klinesを使う)
-    FOREX_API_URL = "https://api.binance.com/api/v3/klines?symbol=USDCJPY&interval=1h&limit=50" # USDCJPYを想定
-    
-    fgi_proxy = 0.0
-    fgi_raw_value = 'N/A'
+async def get_http_session() -> aiohttp.ClientSession:
+    """ 外部API (FGI、為替など) 用の keep-alive セッションを返す """
+    global HTTP_SESSION
+
+    if HTTP_SESSION is None or HTTP_SESSION.closed:
+        HTTP_SESSION = aiohttp.ClientSession(
+            timeout=aiohttp.ClientTimeout(total=5),
+            connector=aiohttp.TCPConnector(limit=8, keepalive_timeout=60),
+        )
+    return HTTP_SESSION
+
+async def _fetch_fgi_context() -> Dict:
+    """ Fear & Greed Index (FGI) を取得し、-1.0〜+1.0 のプロキシ値に変換する """
+    session = await get_http_session()
+    async with session.get(FGI_API_URL) as response:
+        data = await response.json(content_type=None)
+
+    if not data or not data.get('data'):
+        raise ValueError("FGIのレスポンスにデータがありません")
+
+    fgi_value = int(data['data'][0]['value']) # 0 (Extreme Fear) - 100 (Extreme Greed)
+    fgi_raw_value = data['data'][0]['value_classification']
+
+    # FGIを-1.0から+1.0の範囲に正規化し、感情の強さを表すプロキシとする
+    # 50(Neutral)を中心に、0を-1.0、100を+1.0とする
+    fgi_proxy = (fgi_value - 50) / 50.0
+    logging.info(f"✅ FGIデータ取得成功: {fgi_raw_value} (Score: {fgi_value}, Proxy: {fgi_proxy:.2f})")
+    return {'fgi_proxy': fgi_proxy, 'fgi_raw_value': fgi_raw_value}
+
+async def _fetch_forex_context() -> Dict:
+    """ 為替データ (USDX代替) を取得し、ドル高/ドル安に応じたボーナスを計算する """
+    # USD/JPY (またはUSDC/JPY) の直近50時間のデータでトレンドを分析
+    # 目的: ドル高 (リスクオフ/暗号通貨不利) or ドル安 (リスクオン/暗号通貨有利) を判断する
+    session = await get_http_session()
+    async with session.get(FOREX_API_URL) as response:
+        klines = await response.json(content_type=None)
+
     forex_bonus = 0.0
+    if klines and len(klines) >= 50:
+        closes = np.array([float(kline[4]) for kline in klines], dtype=np.float64)
 
-    # 1. Fear & Greed Index (FGI) の取得
-    try:
-        response = await asyncio.to_thread(requests.get, FGI_API_URL, timeout=5)
-        data = response.json()
-        if data and data.get('data'):
-            fgi_value = int(data['data'][0]['value']) # 0 (Extreme Fear) - 100 (Extreme Greed)
-            fgi_raw_value = data['data'][0]['value_classification']
-            
-            # FGIを-1.0から+1.0の範囲に正規化し、感情の強さを表すプロキシとする
-            # 50(Neutral)を中心に、0を-1.0、100を+1.0とする
-            fgi_proxy = (fgi_value - 50) / 50.0 
-            logging.info(f"✅ FGIデータ取得成功: {fgi_raw_value} (Score: {fgi_value}, Proxy: {fgi_proxy:.2f})")
-            
-    except Exception as e:
-        logging.error(f"❌ FGIデータ取得失敗: {e}。デフォルト値を使用します。")
-        
-    # 2. 為替データ (USDX代替) の取得とボーナスの計算
-    try:
-        # USD/JPY (またはUSDC/JPY) の直近50時間のデータでトレンドを分析
-        # 目的: ドル高 (リスクオフ/暗号通貨不利) or ドル安 (リスクオン/暗号通貨有利) を判断する
-        response = await asyncio.to_thread(requests.get, FOREX_API_URL, timeout=5)
-        klines = response.json()
-        
-        if klines and len(klines) >= 50:
-            forex_df = pd.DataFrame(klines, columns=['time', 'open', 'high', 'low', 'close', 'volume', 'close_time', 'quote_volume', 'trades', 'buy_base_volume', 'buy_quote_volume', 'ignore'])
-            forex_df['close'] = pd.to_numeric(forex_df['close'])
-            
-            # 直近の終値と50期間SMAを比較
-            sma_50 = forex_df['close'].rolling(window=50).mean().iloc[-1]
-            last_close = forex_df['close'].iloc[-1]
-            
-            # 乖離率の計算
-            deviation = (last_close - sma_50) / sma_50
-            
-            # ドル安 (deviation < 0) は暗号通貨に有利 (+ボーナス)
-            # ドル高 (deviation > 0) は暗号通貨に不利 (-ペナルティ)
-            # 最大ボーナス/ペナルティを FGI_PROXY_BONUS_MAX に制限
-            
-            # 乖離率が-0.5% (0.005) で最大ボーナス、+0.5% (0.005) で最大ペナルティとする
-            MAX_DEVIATION = 0.005
-            
-            if abs(deviation) > MAX_DEVIATION:
-                # 最大ボーナス/ペナルティを適用
-                factor = FGI_PROXY_BONUS_MAX if deviation < 0 else -FGI_PROXY_BONUS_MAX
-                forex_bonus = factor
-                
-            elif deviation != 0:
-                # 線形にボーナス/ペナルティを適用
-                forex_bonus = - (deviation / MAX_DEVIATION) * FGI_PROXY_BONUS_MAX
-            
-            # logging.info(f"✅ 為替データ取得成功: 終値={last_close:.4f}, SMA50={sma_50:.4f}, Deviation={deviation*100:.2f}%, Bonus={forex_bonus*100:.2f}点")
-            
-    except Exception as e:
-        logging.error(f"❌ 為替データ取得失敗: {e}。デフォルト値を使用します。")
-        
-    # 3. 結果を返す
-    return {
-        'fgi_proxy': fgi_proxy,
-        'fgi_raw_value': fgi_raw_value,
-        'forex_bonus': forex_bonus
-    }
+        # 直近の終値と50期間SMAを比較
+        sma_50 = closes[-50:].mean()
+        last_close = closes[-1]
 
-# ====================================================================================
-# TRADING LOGIC - TECHNICAL ANALYSIS & SCORING
-# ====================================================================================
+        # 乖離率の計算
+        deviation = (last_close - sma_50) / sma_50
 
-def calculate_technical_indicators(df: pd.DataFrame) -> pd.DataFrame:
-    """ Pandas DataFrameにテクニカル指標を追加する """
-    
-    # 終値が float であることを確認 (ccxtのOHLCVは数値だが、念のため)
-    df['close'] = pd.to_numeric(df['close'])
-    df['high'] = pd.to_numeric(df['high'])
-    df['low'] = pd.to_numeric(df['low'])
-    df['volume'] = pd.to_numeric(df['volume'])
+        # ドル安 (deviation < 0) は暗号通貨に有利 (+ボーナス)
+        # ドル高 (deviation > 0) は暗号通貨に不利 (-ペナルティ)
+        # 最大ボーナス/ペナルティを FGI_PROXY_BONUS_MAX に制限
 
-    # Simple Moving Averages (SMA)
-    df['SMA_50'] = ta.sma(df['close'], length=50)
+        # 乖離率が-0.5% (0.005) で最大ボーナス、+0.5% (0.005) で最大ペナルティとする
+        MAX_DEVIATION = 0.005
+
+        if abs(deviation) > MAX_DEVIATION:
+            # 最大ボーナス/ペナルティを適用
+            forex_bonus = FGI_PROXY_BONUS_MAX if deviation < 0 else -FGI_PROXY_BONUS_MAX
+        elif deviation != 0:
+            # 線形にボーナス/ペナルティを適用
+            forex_bonus = - (deviation / MAX_DEVIATION) * FGI_PROXY_BONUS_MAX
+
+    return {'forex_bonus': float(forex_bonus)}
+
+# マクロデータのソースごとの (取得関数, キャッシュ有効期間, 取得失敗時のデフォルト値, ログ用の名称)
+MACRO_SOURCES = {
+    'fgi': (_fetch_fgi_context, FGI_CACHE_TTL_SECONDS, {'fgi_proxy': 0.0, 'fgi_raw_value': 'N/A'}, 'FGIデータ'),
+    'forex': (_fetch_forex_context, FOREX_CACHE_TTL_SECONDS, {'forex_bonus': 0.0}, '為替データ'),
+}
+
+async def _refresh_macro_source(name: str) -> Dict:
+    """
+    マクロデータのソースを1つ取得してキャッシュする。失敗時は前回の値 (無ければデフォルト値) を返す。
+    一度も取得できていない場合はデフォルト値を MACRO_FAILURE_RETRY_SECONDS 後に期限切れとなるようにキャッシュし、
+    以降のサイクルがタイムアウトを待たずに済むようにする (再取得はバックグラウンドで行われる)。
+    """
+    fetch, ttl, default, label = MACRO_SOURCES[name]
+    try:
+        value = await fetch()
+        MACRO_CACHE[name] = {'value': value, 'timestamp': time.monotonic()}
+        return value
+    except Exception as e:
+        entry = MACRO_CACHE[name]
+        if entry['value'] is not None:
+            logging.error(f"❌ {label}取得失敗: {e}。前回の値を継続使用します。")
+            return entry['value']
+        logging.error(f"❌ {label}取得失敗: {e}。デフォルト値を使用します ({MACRO_FAILURE_RETRY_SECONDS}秒後に再取得)。")
+        MACRO_CACHE[name] = {'value': dict(default), 'timestamp': time.monotonic() - ttl + MACRO_FAILURE_RETRY_SECONDS}
+        return default
+
+async def fetch_fgi_data() -> Dict:
+    """
+    Fear & Greed Index (FGI) と為替レート（USDX）のデータを取得する。
+
+    各ソースはそれぞれのTTLでキャッシュし、期限切れ時は前回の値を即座に返してバックグラウンドで再取得する。
+    キャッシュが無い (起動直後) ソースのみ、並列に取得して結果を待つ。
+    """
+    context: Dict[str, Any] = {}
+    cold_sources = []
+    now = time.monotonic()
+
+    for name, (_, ttl, _, _) in MACRO_SOURCES.items():
+        entry = MACRO_CACHE[name]
+        if entry['value'] is None:
+            cold_sources.append(name)
+            continue
+        context.update(entry['value'])
+        task = MACRO_REFRESH_TASKS.get(name)
+        if now - entry['timestamp'] >= ttl and (task is None or task.done()):
+            MACRO_REFRESH_TASKS[name] = asyncio.create_task(_refresh_macro_source(name))
+
+    if cold_sources:
+        for value in await asyncio.gather(*(_refresh_macro_source(name) for name in cold_sources)):
+            context.update(value)
+
+    return {
+        'fgi_proxy': context['fgi_proxy'],
+        'fgi_raw_value': context['fgi_raw_value'],
+        'forex_bonus': context['forex_bonus']
+    }
+
+# ====================================================================================
+# TRADING LOGIC - TECHNICAL ANALYSIS & SCORING
+# ====================================================================================
+
+def calculate_technical_indicators(df: pd.DataFrame) -> pd.DataFrame:
+    """ Pandas DataFrameにテクニカル指標を追加する """
+    
+    # 終値が float であることを確認 (リングバッファ由来の列は既にfloatのため変換不要)
+    for col in ['close', 'high', 'low', 'volume']:
+        if not pd.api.types.is_float_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col])
+
+    # Simple Moving Averages (SMA)
+    df['SMA_50'] = ta.sma(df['close'], length=50)
     df['SMA_200'] = ta.sma(df['close'], length=LONG_TERM_SMA_LENGTH) # 長期トレンド用
 
     # Relative Strength Index (RSI) - 14期間
@@ -1035,6 +2435,54 @@ def calculate_stop_loss_take_profit(current_price: float, atr_value: float) -> T
 
     return stop_loss, take_profit, rr_ratio
 
+def calculate_liquidity_bonus(market_ticker: Dict, liquidity_bonus_max: Optional[float] = None) -> float:
+    """
+    流動性/板の厚みボーナスを計算する。
+    ATR/価格でボラティリティを計測し、ボラティリティが低すぎず（取引機会）、高すぎない（安定性）
+    より簡略化し、単に出来高の大きさに比例させる (出来高上位銘柄が優位になる)
+    """
+    if liquidity_bonus_max is None:
+        liquidity_bonus_max = LIQUIDITY_BONUS_MAX
+    liquidity_bonus_value = 0.0
+    
+    # 24H Quote Volume (USDT出来高) を正規化して使用
+    # 出来高の絶対値に基づいてスコアを付与 (対数スケールで計算)
+    try:
+        quote_volume = market_ticker['quoteVolume']
+        if quote_volume > 0:
+            # log10(volume) を使用して、ボリュームの大きさに応じて線形にスコアを付与
+            # 例: 1,000,000 (log6) から 1,000,000,000 (log9) の範囲で正規化
+            # 最小出来高を10^6 (1M)、最大出来高を10^9 (1B) と想定
+            min_log = 6.0
+            max_log = 9.0
+            log_volume = math.log10(quote_volume)
+            
+            # log_volumeを0から1に正規化
+            if log_volume <= min_log:
+                ratio = 0.0
+            elif log_volume >= max_log:
+                ratio = 1.0
+            else:
+                ratio = (log_volume - min_log) / (max_log - min_log)
+                
+            liquidity_bonus_value = liquidity_bonus_max * ratio
+            
+    except Exception:
+        # volume情報がない場合はボーナスなし
+        pass
+
+    return liquidity_bonus_value
+
+def calculate_macro_bonus(macro_context: Dict, fgi_proxy_bonus_max: Optional[float] = None) -> float:
+    """ マクロ環境ボーナス/ペナルティ (FGIプロキシ + 為替ボーナス を FGI_PROXY_BONUS_MAX の範囲に制限) """
+    if fgi_proxy_bonus_max is None:
+        fgi_proxy_bonus_max = FGI_PROXY_BONUS_MAX
+    # FGIプロキシ + 為替ボーナス をそのままスコアに加算
+    sentiment_fgi_proxy_bonus = macro_context.get('fgi_proxy', 0.0) + macro_context.get('forex_bonus', 0.0)
+    
+    # 最大ボーナス/ペナルティを FGI_PROXY_BONUS_MAX に制限
+    return min(max(sentiment_fgi_proxy_bonus, -fgi_proxy_bonus_max), fgi_proxy_bonus_max)
+
 def score_signal(df: pd.DataFrame, timeframe: str, market_ticker: Dict, macro_context: Dict) -> Optional[Dict]:
     """
     分析されたOHLCVデータとテクニカル指標に基づいて取引スコアを計算する (ロングシグナルのみ)。
@@ -1072,7 +2520,7 @@ def score_signal(df: pd.DataFrame, timeframe: str, market_ticker: Dict, macro_co
         return None
         
     total_score = 0.0
-    tech_data = {} # スコア詳細格納用
+    tech_data = {'atr_value': last_candle['ATR']} # スコア詳細格納用 (ATRは価格更新時のSL/TP再計算に使用)
 
     # ====================================================================
     # SCORING COMPONENTS (ロングシグナルを想定)
@@ -1181,35 +2629,7 @@ def score_signal(df: pd.DataFrame, timeframe: str, market_ticker: Dict, macro_co
     tech_data['volume_increase_bonus_value'] = volume_increase_bonus_value
     
     # I. 流動性/板の厚みボーナス (7点)
-    # ATR/価格でボラティリティを計測し、ボラティリティが低すぎず（取引機会）、高すぎない（安定性）
-    # より簡略化し、単に出来高の大きさに比例させる (出来高上位銘柄が優位になる)
-    liquidity_bonus_value = 0.0
-    
-    # 24H Quote Volume (USDT出来高) を正規化して使用
-    # 出来高の絶対値に基づいてスコアを付与 (対数スケールで計算)
-    try:
-        quote_volume = market_ticker['quoteVolume']
-        if quote_volume > 0:
-            # log10(volume) を使用して、ボリュームの大きさに応じて線形にスコアを付与
-            # 例: 1,000,000 (log6) から 1,000,000,000 (log9) の範囲で正規化
-            # 最小出来高を10^6 (1M)、最大出来高を10^9 (1B) と想定
-            min_log = 6.0
-            max_log = 9.0
-            log_volume = math.log10(quote_volume)
-            
-            # log_volumeを0から1に正規化
-            if log_volume <= min_log:
-                ratio = 0.0
-            elif log_volume >= max_log:
-                ratio = 1.0
-            else:
-                ratio = (log_volume - min_log) / (max_log - min_log)
-                
-            liquidity_bonus_value = LIQUIDITY_BONUS_MAX * ratio
-            
-    except Exception:
-        # volume情報がない場合はボーナスなし
-        pass
+    liquidity_bonus_value = calculate_liquidity_bonus(market_ticker)
         
     total_score += liquidity_bonus_value
     tech_data['liquidity_bonus_value'] = liquidity_bonus_value
@@ -1226,11 +2646,7 @@ def score_signal(df: pd.DataFrame, timeframe: str, market_ticker: Dict, macro_co
     tech_data['volatility_penalty_value'] = volatility_penalty_value
 
     # K. マクロ環境ボーナス/ペナルティ (5点)
-    # FGIプロキシ + 為替ボーナス をそのままスコアに加算
-    sentiment_fgi_proxy_bonus = macro_context.get('fgi_proxy', 0.0) + macro_context.get('forex_bonus', 0.0)
-    
-    # 最大ボーナス/ペナルティを FGI_PROXY_BONUS_MAX に制限
-    sentiment_fgi_proxy_bonus = min(max(sentiment_fgi_proxy_bonus, -FGI_PROXY_BONUS_MAX), FGI_PROXY_BONUS_MAX)
+    sentiment_fgi_proxy_bonus = calculate_macro_bonus(macro_context)
     
     total_score += sentiment_fgi_proxy_bonus
     tech_data['sentiment_fgi_proxy_bonus'] = sentiment_fgi_proxy_bonus
@@ -1254,9 +2670,777 @@ def score_signal(df: pd.DataFrame, timeframe: str, market_ticker: Dict, macro_co
     
     return signal
 
+# スコアリングのパラメータ (score_signal_vectorized の params で上書き可能な定数)
+SCORING_PARAMETER_NAMES = (
+    'BASE_SCORE', 'LONG_TERM_REVERSAL_PENALTY', 'TREND_ALIGNMENT_BONUS', 'STRUCTURAL_PIVOT_BONUS', 'MACD_CROSS_PENALTY',
+    'RSI_MOMENTUM_LOW', 'RSI_MOMENTUM_BONUS_MAX', 'OBV_MOMENTUM_BONUS', 'VOLUME_INCREASE_BONUS', 'LIQUIDITY_BONUS_MAX',
+    'VOLATILITY_BB_PENALTY_THRESHOLD', 'FGI_PROXY_BONUS_MAX',
+)
+
+def get_scoring_params(params: Optional[Dict[str, float]] = None) -> Dict[str, float]:
+    """ 現在のスコアリング定数を辞書で返す (params で指定したものは上書き) """
+    scoring_params = {name: globals()[name] for name in SCORING_PARAMETER_NAMES}
+    if params:
+        unknown = set(params) - set(SCORING_PARAMETER_NAMES)
+        if unknown:
+            raise ValueError(f"不明なスコアリングパラメータ: {', '.join(sorted(unknown))}")
+        scoring_params.update(params)
+    return scoring_params
+
+def score_signal_vectorized(df: pd.DataFrame, market_ticker: Dict, macro_context: Dict, params: Optional[Dict[str, float]] = None) -> pd.DataFrame:
+    """
+    score_signal と同じスコアリングを、全ての足に対してNumPyでまとめて計算する。
+
+    最終足の 'score' と各要素の値は、score_signal がシグナルを返す場合の score / tech_data と完全に一致する
+    (同じ順序で加算するため、浮動小数点の丸めも一致する)。流動性とマクロ環境の要素は全ての足で同じ値になる。
+    指標が揃っていない足のスコアは NaN になる。
+
+    Args:
+        df (pd.DataFrame): テクニカル指標が追加されたOHLCVデータ
+        market_ticker (Dict): ティッカー情報 (流動性ボーナスに使用)
+        macro_context (Dict): FGIや為替などのマクロ環境データ
+        params (Dict): 上書きするスコアリング定数 (get_scoring_params を参照)
+
+    Returns:
+        pd.DataFrame: df と同じインデックスで、各要素の値 (tech_dataと同じ列名)、'score' (0.0〜1.0にクリップ) を持つ
+    """
+    p = get_scoring_params(params)
+    column = lambda name: np.asarray(df[name], dtype=np.float64)
+    close, low = column('close'), column('low')
+    sma_50, sma_200 = column('SMA_50'), column('SMA_200')
+    rsi, obv = column('RSI'), column('OBV')
+    n = len(df)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        # B. 長期トレンド逆行ペナルティ (NaN比較は False になり、スカラー版と同様にNaNが伝播する)
+        deviation_ratio = (sma_200 - close) / sma_200
+        reversal_penalty = p['LONG_TERM_REVERSAL_PENALTY'] * np.minimum(deviation_ratio / 0.02, 1.0)
+        reversal_penalty = np.where(reversal_penalty > p['LONG_TERM_REVERSAL_PENALTY'], p['LONG_TERM_REVERSAL_PENALTY'], reversal_penalty)
+        long_term_reversal_penalty_value = np.where(close > sma_200, 0.0, reversal_penalty)
+
+        # C. 中期/長期トレンドアライメントボーナス
+        trend_alignment_bonus_value = np.where(sma_50 > sma_200, p['TREND_ALIGNMENT_BONUS'], 0.0)
+
+        # D. 価格構造/ピボット支持ボーナス (直前3本の安値の最小値)
+        low_min_3 = pd.Series(low).rolling(window=3, min_periods=1).min().shift(1).to_numpy()
+        structural_pivot_bonus = np.where(close > low_min_3, p['STRUCTURAL_PIVOT_BONUS'], 0.0)
+
+        # E. MACDペナルティ
+        is_macd_bullish = (column('MACD') > column('MACDs')) & (column('MACDh') > 0)
+        macd_penalty_value = np.where(is_macd_bullish, 0.0, p['MACD_CROSS_PENALTY'])
+
+        # F. RSIモメンタムボーナス
+        rsi_3_ago = np.full(n, np.nan)
+        rsi_3_ago[3:] = rsi[:-3]
+        max_distance = 50.0 - (p['RSI_MOMENTUM_LOW'] - 5)
+        if max_distance > 0:
+            rsi_bonus = p['RSI_MOMENTUM_BONUS_MAX'] * np.minimum((50.0 - rsi) / max_distance, 1.0)
+        else:
+            rsi_bonus = np.zeros(n)
+        rsi_momentum_bonus_value = np.where((rsi <= p['RSI_MOMENTUM_LOW']) & (rsi > rsi_3_ago), rsi_bonus, 0.0)
+
+        # G. OBVモメンタム確証ボーナス (スカラー版と同じ rolling で計算)
+        obv_sma_5 = df['OBV'].rolling(window=5).mean().to_numpy(dtype=np.float64)
+        obv_momentum_bonus_value = np.where(obv > obv_sma_5, p['OBV_MOMENTUM_BONUS'], 0.0)
+
+        # H. 出来高スパイクボーナス
+        volume_increase_bonus_value = np.where(column('Volume_Change') > 0.50, p['VOLUME_INCREASE_BONUS'], 0.0)
+
+        # J. ボラティリティペナルティ (低ボラティリティ)
+        bbl, bbu, bbm = column('BBL'), column('BBU'), column('BBM')
+        bb_width_ratio = (bbu - bbl) / bbm
+        is_low_volatility = ~np.isnan(bbl) & ~np.isnan(bbu) & (bbm > 0) & (bb_width_ratio < p['VOLATILITY_BB_PENALTY_THRESHOLD'])
+        volatility_penalty_value = np.where(is_low_volatility, -0.05, 0.0)
+
+    # I/K. 流動性とマクロ環境 (足によらず一定)
+    liquidity_bonus_value = calculate_liquidity_bonus(market_ticker, p['LIQUIDITY_BONUS_MAX'])
+    sentiment_fgi_proxy_bonus = calculate_macro_bonus(macro_context, p['FGI_PROXY_BONUS_MAX'])
+
+    # スカラー版と同じ順序で加算する
+    total_score = np.zeros(n)
+    total_score += p['BASE_SCORE']
+    total_score -= long_term_reversal_penalty_value
+    total_score += trend_alignment_bonus_value
+    total_score += structural_pivot_bonus
+    total_score -= macd_penalty_value
+    total_score += rsi_momentum_bonus_value
+    total_score += obv_momentum_bonus_value
+    total_score += volume_increase_bonus_value
+    total_score += liquidity_bonus_value
+    total_score += volatility_penalty_value
+    total_score += sentiment_fgi_proxy_bonus
+
+    return pd.DataFrame({
+        'score': np.minimum(np.maximum(total_score, 0.0), 1.0),
+        'atr_value': column('ATR'),
+        'long_term_reversal_penalty_value': long_term_reversal_penalty_value,
+        'trend_alignment_bonus_value': trend_alignment_bonus_value,
+        'structural_pivot_bonus': structural_pivot_bonus,
+        'macd_penalty_value': macd_penalty_value,
+        'rsi_value': rsi,
+        'rsi_momentum_bonus_value': rsi_momentum_bonus_value,
+        'obv_momentum_bonus_value': obv_momentum_bonus_value,
+        'volume_increase_bonus_value': volume_increase_bonus_value,
+        'liquidity_bonus_value': np.full(n, liquidity_bonus_value),
+        'volatility_penalty_value': volatility_penalty_value,
+        'sentiment_fgi_proxy_bonus': np.full(n, sentiment_fgi_proxy_bonus),
+    }, index=df.index)
+
+# ====================================================================================
+# OHLCV CACHE (増分取得)
+# ====================================================================================
+
+def get_timeframe_ms(tf: str) -> int:
+    """ タイムフレーム文字列 (例: '15m') をミリ秒に変換する """
+    return ccxt.Exchange.parse_timeframe(tf) * 1000
+
+class ColumnarRingBuffer:
+    """
+    固定容量の列指向リングバッファ (NumPy)。
+
+    各列は容量の2倍の配列を持ち、同じ値を i と i + capacity の2箇所に書き込む。
+    これにより、古い順に並んだ直近 N 本が常に連続したメモリ領域となり、
+    view() はコピーなしのビューを返すことができる。
+    """
+
+    def __init__(self, capacity: int, columns: Tuple[str, ...], dtype=np.float64, column_dtypes: Optional[Dict[str, Any]] = None):
+        self.capacity = capacity
+        self.columns = tuple(columns)
+        column_dtypes = column_dtypes or {}
+        self._data: Dict[str, np.ndarray] = {
+            col: np.full(capacity * 2, np.nan, dtype=column_dtypes.get(col, dtype)) for col in self.columns
+        }
+        self._start = 0 # 最も古い行の物理位置
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _write(self, pos: int, row):
+        for col, value in zip(self.columns, row):
+            arr = self._data[col]
+            arr[pos] = value
+            arr[pos + self.capacity] = value
+
+    def append(self, row):
+        """ 行を末尾に追加する (満杯の場合は最も古い行を上書きする) """
+        if self._size < self.capacity:
+            self._write((self._start + self._size) % self.capacity, row)
+            self._size += 1
+        else:
+            self._write(self._start, row)
+            self._start = (self._start + 1) % self.capacity
+
+    def replace_last(self, row):
+        """ 末尾の行 (形成中の足) を置き換える """
+        if self._size == 0:
+            self.append(row)
+            return
+        self._write((self._start + self._size - 1) % self.capacity, row)
+
+    def replace_at(self, index: int, row):
+        """ 論理インデックス (0 = 最も古い行) の行を置き換える """
+        self._write((self._start + index) % self.capacity, row)
+
+    def last(self, col: str) -> float:
+        """ 指定列の末尾の値を返す """
+        return self._data[col][self._start + self._size - 1]
+
+    def view(self, col: str) -> np.ndarray:
+        """ 指定列の直近 N 本を古い順に並べた読み取り専用ビュー (コピーなし) を返す """
+        arr = self._data[col][self._start:self._start + self._size]
+        arr.flags.writeable = False
+        return arr
+
+    def clear(self):
+        self._start = 0
+        self._size = 0
+
+    @classmethod
+    def from_columns(cls, capacity: int, columns: Dict[str, np.ndarray], dtype=np.float64, column_dtypes: Optional[Dict[str, Any]] = None) -> 'ColumnarRingBuffer':
+        """ 列ごとの配列 (古い順、同じ長さ) からバッファを作成する """
+        buffer = cls(capacity, tuple(columns), dtype, column_dtypes)
+        size = min(capacity, len(next(iter(columns.values()))))
+        for col, values in columns.items():
+            arr = buffer._data[col]
+            arr[:size] = values[-size:]
+            arr[capacity:capacity + size] = values[-size:]
+        buffer._size = size
+        return buffer
+
+    def to_columns(self) -> Dict[str, np.ndarray]:
+        """ 各列の直近 N 本を古い順に並べたコピーを返す (from_columns で復元できる形式) """
+        return {col: np.array(self.view(col)) for col in self.columns}
+
+    def to_frame(self) -> pd.DataFrame:
+        """ 各列のビューからDataFrameを作成する (列データはコピーしない) """
+        return pd.DataFrame({col: self.view(col) for col in self.columns}, copy=False)
+
+def upsert_candles(buffer: ColumnarRingBuffer, ohlcv: List[List[float]]):
+    """
+    ccxt形式のOHLCVをリングバッファにマージする。
+    最終足と同じタイムスタンプの足は置き換え (形成中の足の更新)、新しい足は末尾に追加する。
+    """
+    for candle in ohlcv:
+        timestamp = candle[0]
+        if len(buffer) == 0 or timestamp > buffer.last('timestamp'):
+            buffer.append(candle)
+        elif timestamp == buffer.last('timestamp'):
+            buffer.replace_last(candle)
+        else:
+            # 過去の足の訂正 (通常は発生しない)
+            timestamps = buffer.view('timestamp')
+            index = int(np.searchsorted(timestamps, timestamp))
+            if index < len(timestamps) and timestamps[index] == timestamp:
+                buffer.replace_at(index, candle)
+
+async def fetch_ohlcv_incremental(symbol: str, tf: str, limit: int) -> ColumnarRingBuffer:
+    """
+    (symbol, timeframe) ごとのOHLCVリングバッファを使い、前回取得以降に確定した足だけを取得する。
+
+    - キャッシュが無い、または前回取得から limit 本以上経過している場合は、limit 本を丸ごと取得する。
+    - それ以外は、キャッシュの最終足 (形成中の足) のタイムスタンプを since に指定して取得し、
+      形成中だった最終足を新しいデータで置き換える。
+
+    Returns:
+        ColumnarRingBuffer: 直近 limit 本のOHLCV (列: OHLCV_COLUMNS)
+    """
+    global EXCHANGE_CLIENT, OHLCV_CACHE
+
+    key = (symbol, tf)
+    buffer = OHLCV_CACHE.get(key)
+
+    if OHLCV_INCREMENTAL_FETCH and buffer is not None and len(buffer) > 0 and buffer.capacity == limit:
+        tf_ms = get_timeframe_ms(tf)
+        last_timestamp = buffer.last('timestamp')
+
+        # 最終足 (形成中) から現在までに必要な足の本数
+        bars_needed = int((EXCHANGE_CLIENT.milliseconds() - last_timestamp) // tf_ms) + 1
+
+        if bars_needed < limit:
+            new_ohlcv = await exchange_request('fetch_ohlcv', symbol, tf, since=int(last_timestamp), limit=bars_needed + 1, key=symbol)
+            upsert_candles(buffer, new_ohlcv)
+            return buffer
+
+    # 初回 (コールドスタート) またはギャップが大きい場合は全件取得
+    ohlcv = await exchange_request('fetch_ohlcv', symbol, tf, limit=limit, key=symbol)
+    buffer = ColumnarRingBuffer(limit, OHLCV_COLUMNS, dtype=CANDLE_STORE_DTYPE, column_dtypes={'timestamp': np.float64})
+    upsert_candles(buffer, ohlcv[-limit:])
+    OHLCV_CACHE[key] = buffer
+    return buffer
+
+def aggregate_candles(candles: ColumnarRingBuffer, start: int, tf_ms: int) -> List[List[float]]:
+    """
+    下位足バッファの start 番目以降を、上位足 (tf_ms) のバケットごとにOHLCVへ集約する。
+    バケットの境界はUTCエポック基準 (取引所の足の区切りと同じ) とし、最後のバケットは形成中の足となる。
+    """
+    timestamps = candles.view('timestamp')[start:]
+    if len(timestamps) == 0:
+        return []
+
+    buckets = timestamps - (timestamps % tf_ms)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(buckets)] - 1
+
+    return np.column_stack([
+        buckets[starts],
+        candles.view('open')[start:][starts],
+        np.maximum.reduceat(candles.view('high')[start:], starts),
+        np.minimum.reduceat(candles.view('low')[start:], starts),
+        candles.view('close')[start:][ends],
+        np.add.reduceat(candles.view('volume')[start:], starts),
+    ]).tolist()
+
+def derive_candles_from_base(derived: ColumnarRingBuffer, base: ColumnarRingBuffer, tf: str, base_tf: str) -> bool:
+    """
+    上位足バッファの形成中の足以降を、下位足バッファから合成して更新する。
+
+    Returns:
+        bool: 合成できた場合は True。下位足が最新でない、または形成中のバケットの先頭を
+              カバーしていない (部分的なバケットになる) 場合は False (直接取得にフォールバック)
+    """
+    if len(derived) == 0 or len(base) == 0:
+        return False
+
+    tf_ms = get_timeframe_ms(tf)
+    base_tf_ms = get_timeframe_ms(base_tf)
+    now_ms = EXCHANGE_CLIENT.milliseconds()
+
+    # 下位足が最新の足まで取得済みであること (1本の遅れまでは許容)
+    if base.last('timestamp') < now_ms - (now_ms % base_tf_ms) - base_tf_ms:
+        return False
+
+    # 上位足の形成中の足 (キャッシュの最終足) の先頭から、下位足がカバーしていること
+    bucket_start = derived.last('timestamp')
+    base_timestamps = base.view('timestamp')
+    if base_timestamps[0] > bucket_start:
+        return False
+
+    start = int(np.searchsorted(base_timestamps, bucket_start))
+    upsert_candles(derived, aggregate_candles(base, start, tf_ms))
+    return True
+
+async def fetch_candles(symbol: str, tf: str, limit: int) -> ColumnarRingBuffer:
+    """
+    分析用のOHLCVバッファを取得する。
+    上位足 (DERIVED_TIMEFRAME_SOURCES) はキャッシュ済みの下位足から合成し、取引所へのリクエストを省略する。
+    コールドスタートや下位足が使えない場合は、fetch_ohlcv_incremental で直接取得する。
+    """
+    base_tf = DERIVED_TIMEFRAME_SOURCES.get(tf) if DERIVE_HIGHER_TIMEFRAMES else None
+
+    if base_tf:
+        derived = OHLCV_CACHE.get((symbol, tf))
+        base = OHLCV_CACHE.get((symbol, base_tf))
+        if derived is not None and base is not None and derived.capacity == limit:
+            if derive_candles_from_base(derived, base, tf, base_tf):
+                return derived
+
+    return await fetch_ohlcv_incremental(symbol, tf, limit)
+
+def prune_ohlcv_cache(symbols: List[str]):
+    """ 監視対象から外れた銘柄のOHLCVキャッシュ、指標エンジン、分析スケジュールを削除する """
+    global OHLCV_CACHE, INDICATOR_ENGINES, ANALYSIS_SCHEDULE
+
+    active_symbols = set(symbols)
+    for key in [key for key in OHLCV_CACHE if key[0] not in active_symbols]:
+        del OHLCV_CACHE[key]
+    for key in [key for key in INDICATOR_ENGINES if key[0] not in active_symbols]:
+        del INDICATOR_ENGINES[key]
+    for key in [key for key in ANALYSIS_SCHEDULE if key[0] not in active_symbols]:
+        del ANALYSIS_SCHEDULE[key]
+    if COMPUTE_EXECUTOR is not None:
+        COMPUTE_EXECUTOR.prune(symbols)
+
+# ====================================================================================
+# INCREMENTAL INDICATORS (ストリーミング指標計算)
+# ====================================================================================
+
+INDICATOR_COLUMNS = (
+    'SMA_50', 'SMA_200', 'RSI', 'MACD', 'MACDh', 'MACDs',
+    'BBL', 'BBU', 'BBM', 'ATR', 'OBV', 'Volume_Avg_5', 'Volume_Change',
+)
+
+class IncrementalIndicatorEngine:
+    """
+    calculate_technical_indicators と同じ指標を、新しい足ごとに O(1) で更新するエンジン。
+
+    確定足までの計算状態 (SMA/BBの移動合計、RSI/ATRのWilder平滑化、MACDのEMA、累積OBVなど) を保持し、
+    形成中の最終足は確定状態から毎回計算し直す (状態は更新しない)。
+    初回やギャップ発生時は、バッファ先頭から全足を再計算する (pandas_ta と同じ初期化: EMA/ATRはSMAで開始)。
+    """
+
+    RSI_LENGTH = 14
+    ATR_LENGTH = 14
+    MACD_FAST = 12
+    MACD_SLOW = 26
+    MACD_SIGNAL = 9
+    BB_LENGTH = 20
+    BB_STD = 2.0
+    VOLUME_AVG_LENGTH = 5
+
+    def __init__(self, capacity: int):
+        self.indicators = ColumnarRingBuffer(capacity, ('timestamp',) + INDICATOR_COLUMNS)
+        self._state: Optional[Dict[str, float]] = None # 最後の確定足までの状態
+        self._committed_timestamp: Optional[float] = None
+
+    @staticmethod
+    def _initial_state() -> Dict[str, float]:
+        return {
+            'n': 0, 'sum_20': 0.0, 'sum_50': 0.0, 'sum_200': 0.0, 'volume_sum_5': 0.0,
+            'rsi_gain': np.nan, 'rsi_loss': np.nan,
+            'ema_fast': np.nan, 'ema_slow': np.nan, 'macd_signal': np.nan, 'macd_signal_seed': 0.0,
+            'atr': np.nan, 'atr_seed': 0.0, 'obv': 0.0,
+        }
+
+    def _step(self, state: Dict[str, float], close: np.ndarray, high: np.ndarray, low: np.ndarray, volume: np.ndarray, j: int) -> Tuple[Dict[str, float], Tuple[float, ...]]:
+        """ j 番目の足を1本分進め、(新しい状態, 指標値) を返す。stateは変更しない """
+        s = dict(state)
+        n = s['n']
+        c = float(close[j])
+        h = float(high[j])
+        l = float(low[j])
+        v = float(volume[j])
+        prev_c = float(close[j - 1]) if n > 0 else np.nan
+
+        # 1. SMA_50 / SMA_200 / BBM (移動合計)
+        for length in (self.BB_LENGTH, 50, LONG_TERM_SMA_LENGTH):
+            key = f'sum_{length}'
+            s[key] += c
+            if n >= length:
+                s[key] -= float(close[j - length])
+        sma_50 = s['sum_50'] / 50 if n >= 49 else np.nan
+        sma_200 = s[f'sum_{LONG_TERM_SMA_LENGTH}'] / LONG_TERM_SMA_LENGTH if n >= LONG_TERM_SMA_LENGTH - 1 else np.nan
+
+        # 2. Bollinger Bands (中心線は移動合計、標準偏差は直近20本から計算)
+        if n >= self.BB_LENGTH - 1:
+            bbm = s[f'sum_{self.BB_LENGTH}'] / self.BB_LENGTH
+            bb_std = float(np.std(close[j - self.BB_LENGTH + 1:j + 1], ddof=1))
+            bbu = bbm + self.BB_STD * bb_std
+            bbl = bbm - self.BB_STD * bb_std
+        else:
+            bbm = bbu = bbl = np.nan
+
+        # 3. RSI (Wilder平滑化)
+        rsi = np.nan
+        if n > 0:
+            diff = c - prev_c
+            gain = max(diff, 0.0)
+            loss = max(-diff, 0.0)
+            alpha = 1.0 / self.RSI_LENGTH
+            if n == 1:
+                s['rsi_gain'], s['rsi_loss'] = gain, loss
+            else:
+                s['rsi_gain'] = (1 - alpha) * s['rsi_gain'] + alpha * gain
+                s['rsi_loss'] = (1 - alpha) * s['rsi_loss'] + alpha * loss
+            denominator = s['rsi_gain'] + s['rsi_loss']
+            if denominator > 0:
+                rsi = 100.0 * s['rsi_gain'] / denominator
+
+        # 4. MACD (EMAはSMAで初期化)
+        for key, length in (('ema_fast', self.MACD_FAST), ('ema_slow', self.MACD_SLOW)):
+            if n == length - 1:
+                s[key] = float(np.mean(close[j - length + 1:j + 1]))
+            elif n >= length:
+                alpha = 2.0 / (length + 1)
+                s[key] = (1 - alpha) * s[key] + alpha * c
+        macd = macd_signal = macd_hist = np.nan
+        if n >= self.MACD_SLOW - 1:
+            macd = s['ema_fast'] - s['ema_slow']
+            signal_start = self.MACD_SLOW - 1 + self.MACD_SIGNAL - 1
+            if n < signal_start:
+                s['macd_signal_seed'] += macd
+            elif n == signal_start:
+                s['macd_signal'] = (s['macd_signal_seed'] + macd) / self.MACD_SIGNAL
+            else:
+                alpha = 2.0 / (self.MACD_SIGNAL + 1)
+                s['macd_signal'] = (1 - alpha) * s['macd_signal'] + alpha * macd
+            macd_signal = s['macd_signal']
+            macd_hist = macd - macd_signal
+
+        # 5. ATR (True RangeのWilder平滑化、SMAで初期化)
+        true_range = h - l if n == 0 else max(h - l, abs(h - prev_c), abs(prev_c - l))
+        atr = np.nan
+        if n < self.ATR_LENGTH - 1:
+            s['atr_seed'] += true_range
+        elif n == self.ATR_LENGTH - 1:
+            s['atr'] = (s['atr_seed'] + true_range) / self.ATR_LENGTH
+            atr = s['atr']
+        else:
+            alpha = 1.0 / self.ATR_LENGTH
+            s['atr'] = (1 - alpha) * s['atr'] + alpha * true_range
+            atr = s['atr']
+
+        # 6. OBV (累積値。表示時にバッファ先頭を基準に付け替える)
+        if n > 0 and c != prev_c:
+            s['obv'] += v if c > prev_c else -v
+
+        # 7. 出来高の5期間平均と変化率
+        s['volume_sum_5'] += v
+        if n >= self.VOLUME_AVG_LENGTH:
+            s['volume_sum_5'] -= float(volume[j - self.VOLUME_AVG_LENGTH])
+        volume_avg_5 = s['volume_sum_5'] / self.VOLUME_AVG_LENGTH if n >= self.VOLUME_AVG_LENGTH - 1 else np.nan
+        with np.errstate(divide='ignore', invalid='ignore'):
+            volume_change = float(np.float64(v) / volume_avg_5) - 1.0
+
+        s['n'] = n + 1
+        values = (sma_50, sma_200, rsi, macd, macd_hist, macd_signal, bbl, bbu, bbm, atr, s['obv'], volume_avg_5, volume_change)
+        return s, values
+
+    def _write_row(self, timestamp: float, values: Tuple[float, ...]):
+        row = (timestamp,) + values
+        if len(self.indicators) == 0 or timestamp > self.indicators.last('timestamp'):
+            self.indicators.append(row)
+        else:
+            self.indicators.replace_last(row)
+
+    def _rebuild(self, candles: ColumnarRingBuffer):
+        """ バッファ内の全足から状態を再計算する (ウォームアップ/ギャップ時) """
+        self.indicators.clear()
+        self._state = self._initial_state()
+        self._committed_timestamp = None
+        self._advance(candles, 0)
+
+    def _advance(self, candles: ColumnarRingBuffer, start: int):
+        """ start 番目以降の足を処理する。最終足以外は確定し、最終足は形成中として計算する """
+        timestamps = candles.view('timestamp')
+        close, high, low, volume = (candles.view(col) for col in ('close', 'high', 'low', 'volume'))
+        last = len(timestamps) - 1
+
+        for j in range(start, last):
+            self._state, values = self._step(self._state, close, high, low, volume, j)
+            self._committed_timestamp = timestamps[j]
+            self._write_row(timestamps[j], values)
+
+        _, values = self._step(self._state, close, high, low, volume, last)
+        self._write_row(timestamps[last], values)
+
+    def update(self, candles: ColumnarRingBuffer):
+        """ ローソク足バッファの最新状態に指標を同期する """
+        if len(candles) == 0:
+            return
+
+        timestamps = candles.view('timestamp')
+        start = None
+        if self._state is not None and self._committed_timestamp is not None:
+            index = int(np.searchsorted(timestamps, self._committed_timestamp))
+            # 移動合計の更新に必要な過去の足 (最大200本) がバッファに残っている場合のみ差分更新
+            if index < len(timestamps) and timestamps[index] == self._committed_timestamp and index >= LONG_TERM_SMA_LENGTH:
+                start = index + 1
+
+        if start is None or start >= len(timestamps):
+            self._rebuild(candles)
+        else:
+            self._advance(candles, start)
+
+    def export_state(self) -> Dict[str, Any]:
+        """ 計算状態を書き出す (ウォーム状態のスナップショット用) """
+        return {
+            'capacity': self.indicators.capacity,
+            'indicators': self.indicators.to_columns(),
+            'state': dict(self._state) if self._state is not None else None,
+            'committed_timestamp': self._committed_timestamp,
+        }
+
+    @classmethod
+    def from_state(cls, data: Dict[str, Any]) -> 'IncrementalIndicatorEngine':
+        """ export_state() の出力からエンジンを復元する。次回の update() は確定足以降の差分だけを計算する """
+        engine = cls(data['capacity'])
+        engine.indicators = ColumnarRingBuffer.from_columns(data['capacity'], data['indicators'])
+        engine._state = data['state']
+        engine._committed_timestamp = data['committed_timestamp']
+        return engine
+
+    def to_frame(self, candles: ColumnarRingBuffer) -> pd.DataFrame:
+        """ ローソク足と指標のビューを結合したDataFrameを返す (calculate_technical_indicators と同じ列構成) """
+        columns = {col: candles.view(col) for col in candles.columns}
+        for col in INDICATOR_COLUMNS:
+            columns[col] = self.indicators.view(col)
+        # OBVはpandas_taと同様に、バッファ先頭の足を起点とした累積値に付け替える
+        obv = columns['OBV'] - columns['OBV'][0]
+        obv[0] = np.nan
+        columns['OBV'] = obv
+        # pandas_taは足数が必要本数に満たない指標を列ごと返さない (NaN になる) ため、ウォームアップ中はそれに合わせる
+        size = len(candles)
+        for cols, min_bars in ((('RSI',), self.RSI_LENGTH + 1), (('ATR',), self.ATR_LENGTH + 1),
+                               (('MACD', 'MACDh', 'MACDs'), self.MACD_SLOW + self.MACD_SIGNAL - 1)):
+            if size < min_bars:
+                for col in cols:
+                    columns[col] = np.full(size, np.nan)
+        return pd.DataFrame(columns, copy=False)
+
+def get_indicator_engine(symbol: str, tf: str, capacity: int) -> IncrementalIndicatorEngine:
+    """ (symbol, timeframe) ごとの指標エンジンを取得する (無ければ作成) """
+    global INDICATOR_ENGINES
+
+    key = (symbol, tf)
+    engine = INDICATOR_ENGINES.get(key)
+    if engine is None or engine.indicators.capacity != capacity:
+        engine = IncrementalIndicatorEngine(capacity)
+        INDICATOR_ENGINES[key] = engine
+    return engine
+
+# ====================================================================================
+# COMPUTE EXECUTOR (指標計算/スコアリングのオフロード)
+# ====================================================================================
+
+def analyze_candles(symbol: str, tf: str, limit: int, candles: ColumnarRingBuffer, market_ticker: Dict, macro_context: Dict,
+                    timings: Optional[Dict[str, float]] = None) -> Optional[Dict]:
+    """
+    ローソク足から指標を計算し、スコアリングする (同期処理。計算エグゼキューター上で実行される)
+    timings を渡した場合は、指標計算とスコアリングの所要時間 (秒) を 'indicators' / 'scoring' に書き込む。
+    """
+    started = time.perf_counter()
+    if INCREMENTAL_INDICATORS:
+        # 前回からの新しい足だけを指標エンジンに反映 (初回/ギャップ時のみ全件計算)
+        engine = get_indicator_engine(symbol, tf, limit)
+        engine.update(candles)
+        df = engine.to_frame(candles)
+    else:
+        # DataFrameに変換 (リングバッファのビューをそのまま使用し、コピーしない)
+        df = calculate_technical_indicators(candles.to_frame())
+
+    scoring_started = time.perf_counter()
+    signal = score_signal(df, tf, market_ticker, macro_context)
+    if timings is not None:
+        timings['indicators'] = scoring_started - started
+        timings['scoring'] = time.perf_counter() - scoring_started
+    return signal
+
+def _analyze_candles_in_worker(symbol: str, tf: str, limit: int, columns: Dict[str, np.ndarray], market_ticker: Dict, macro_context: Dict) -> Tuple[Optional[Dict], Dict[str, float]]:
+    """
+    ワーカープロセス側の入口。受け取った列配列からバッファを復元して分析する (指標エンジンはワーカー内に保持)
+    計測値はワーカー側のメトリクスに記録できないため、(シグナル, 所要時間) を返す。
+    """
+    candles = ColumnarRingBuffer.from_columns(limit, columns, dtype=CANDLE_STORE_DTYPE, column_dtypes={'timestamp': np.float64})
+    timings: Dict[str, float] = {}
+    signal = analyze_candles(symbol, tf, limit, candles, market_ticker, macro_context, timings)
+    return signal, timings
+
+def _prune_worker_engines(symbols: List[str]):
+    """ ワーカープロセス内の、監視対象から外れた銘柄の指標エンジンを削除する """
+    active_symbols = set(symbols)
+    for key in [key for key in INDICATOR_ENGINES if key[0] not in active_symbols]:
+        del INDICATOR_ENGINES[key]
+
+def _export_indicator_engines() -> Dict[Tuple[str, str], Dict[str, Any]]:
+    """ 指標エンジンの状態を書き出す (processモードではワーカープロセス側で実行される) """
+    return {key: engine.export_state() for key, engine in INDICATOR_ENGINES.items()}
+
+def _restore_indicator_engines(states: Dict[Tuple[str, str], Dict[str, Any]]):
+    """ 書き出した状態から指標エンジンを復元する (processモードではワーカープロセス側で実行される) """
+    for key, state in states.items():
+        INDICATOR_ENGINES[key] = IncrementalIndicatorEngine.from_state(state)
+
+def _worker_ready() -> int:
+    return os.getpid()
+
+class ComputeExecutor:
+    """
+    指標計算とスコアリングをイベントループの外で実行するエグゼキューター。
+
+    - 'process': (symbol, timeframe) ごとに固定のワーカープロセス (1プロセスのプール) へ振り分ける。
+      指標エンジンの状態はワーカープロセス内に保持されるため、送るのはローソク足の列配列だけで、戻り値はシグナルのdictのみ
+    - 'thread': スレッドプールで実行する (指標エンジンはメインプロセスのものを使用)
+    - 'inline': イベントループ上でそのまま実行する
+
+    ワーカープロセスを起動できない環境や、停止が続く場合はスレッドプールに切り替える。
+    """
+
+    MAX_PROCESS_FAILURES = 3
+
+    def __init__(self, mode: str, workers: int):
+        self.mode = mode
+        self.workers = max(1, workers)
+        self._process_pools: List[ProcessPoolExecutor] = []
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        self._process_failures = 0
+        if mode == 'process':
+            try:
+                # 子プロセスにイベントループやスレッドを引き継がないよう、spawnで起動する
+                self._context = multiprocessing.get_context('spawn')
+                self._process_pools = [self._create_process_pool() for _ in range(self.workers)]
+            except (OSError, ValueError, NotImplementedError) as e:
+                self._fall_back_to_threads(e)
+
+    def _create_process_pool(self) -> ProcessPoolExecutor:
+        return ProcessPoolExecutor(max_workers=1, mp_context=self._context)
+
+    def _get_thread_pool(self) -> ThreadPoolExecutor:
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='compute')
+        return self._thread_pool
+
+    def _slot(self, key: Tuple[str, str]) -> int:
+        """ (symbol, timeframe) を担当するワーカープロセスの番号 """
+        return hash(key) % len(self._process_pools)
+
+    def _fall_back_to_threads(self, error: BaseException):
+        logging.warning(f"⚠️ 計算用のワーカープロセスを利用できません。スレッドプールで実行します: {error}")
+        for pool in self._process_pools:
+            pool.shutdown(wait=False, cancel_futures=True)
+        self._process_pools = []
+        self.mode = 'thread'
+
+    def start(self):
+        """ ワーカープロセスを事前に起動する (初回の分析でプロセス起動を待たないようにする) """
+        for pool in self._process_pools:
+            pool.submit(_worker_ready)
+
+    async def analyze(self, symbol: str, tf: str, limit: int, candles: ColumnarRingBuffer, market_ticker: Dict, macro_context: Dict) -> Optional[Dict]:
+        """ analyze_candles をモードに応じた実行先で実行する (所要時間はメトリクスに記録する) """
+        with METRICS.timer('apex_analysis_duration_seconds', stage='compute', timeframe=tf):
+            signal, timings = await self._analyze(symbol, tf, limit, candles, market_ticker, macro_context)
+        for stage, seconds in timings.items():
+            METRICS.observe('apex_analysis_duration_seconds', seconds, stage=stage, timeframe=tf)
+        return signal
+
+    async def _analyze(self, symbol: str, tf: str, limit: int, candles: ColumnarRingBuffer, market_ticker: Dict, macro_context: Dict) -> Tuple[Optional[Dict], Dict[str, float]]:
+        # ワーカーに送るティッカーはスコアリングに使う項目だけに絞る
+        ticker = {'symbol': market_ticker['symbol'], 'last': market_ticker['last'], 'quoteVolume': market_ticker.get('quoteVolume')}
+        loop = asyncio.get_running_loop()
+        timings: Dict[str, float] = {}
+
+        if self.mode == 'process':
+            slot = self._slot((symbol, tf))
+            columns = {col: candles.view(col) for col in candles.columns}
+            try:
+                result = await loop.run_in_executor(self._process_pools[slot], _analyze_candles_in_worker, symbol, tf, limit, columns, ticker, macro_context)
+                self._process_failures = 0
+                return result
+            except (BrokenProcessPool, OSError) as e:
+                # ワーカーが停止した場合は作り直し (指標エンジンは次回の分析で再構築される)、今回はスレッドで実行する
+                self._process_failures += 1
+                logging.error(f"❌ 計算ワーカープロセスが停止しました ({self._process_failures}回目): {e}")
+                if self._process_failures >= self.MAX_PROCESS_FAILURES:
+                    self._fall_back_to_threads(e)
+                else:
+                    self._process_pools[slot].shutdown(wait=False, cancel_futures=True)
+                    self._process_pools[slot] = self._create_process_pool()
+
+        if self.mode == 'inline':
+            signal = analyze_candles(symbol, tf, limit, candles, ticker, macro_context, timings)
+        else:
+            signal = await loop.run_in_executor(self._get_thread_pool(), analyze_candles, symbol, tf, limit, candles, ticker, macro_context, timings)
+        return signal, timings
+
+    def prune(self, symbols: List[str]):
+        """ ワーカープロセス内の、監視対象外になった銘柄の指標エンジンを削除する (結果は待たない) """
+        for pool in self._process_pools:
+            try:
+                pool.submit(_prune_worker_engines, list(symbols))
+            except (BrokenProcessPool, RuntimeError):
+                pass
+
+    async def export_engines(self) -> Dict[Tuple[str, str], Dict[str, Any]]:
+        """ 指標エンジンの状態を集める (processモードでは各ワーカープロセスから取得する) """
+        if self.mode != 'process':
+            return _export_indicator_engines()
+
+        loop = asyncio.get_running_loop()
+        states: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        for pool in self._process_pools:
+            try:
+                states.update(await loop.run_in_executor(pool, _export_indicator_engines))
+            except (BrokenProcessPool, OSError, RuntimeError) as e:
+                logging.warning(f"⚠️ 計算ワーカープロセスから指標エンジンの状態を取得できませんでした: {e}")
+        return states
+
+    def restore_engines(self, states: Dict[Tuple[str, str], Dict[str, Any]]):
+        """
+        指標エンジンを復元する。processモードでは担当のワーカープロセスへ送る (結果は待たない)。
+        ワーカーは投入順に処理するため、復元はその後の分析より先に完了する。
+        """
+        if self.mode != 'process':
+            _restore_indicator_engines(states)
+            return
+
+        states_by_slot: Dict[int, Dict[Tuple[str, str], Dict[str, Any]]] = {}
+        for key, state in states.items():
+            states_by_slot.setdefault(self._slot(key), {})[key] = state
+        for slot, slot_states in states_by_slot.items():
+            try:
+                self._process_pools[slot].submit(_restore_indicator_engines, slot_states)
+            except (BrokenProcessPool, RuntimeError):
+                pass
+
+    def shutdown(self):
+        for pool in self._process_pools:
+            pool.shutdown(wait=False, cancel_futures=True)
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=False, cancel_futures=True)
+
+def get_compute_executor() -> ComputeExecutor:
+    """ 計算エグゼキューターを取得する (無ければ作成) """
+    global COMPUTE_EXECUTOR
+
+    if COMPUTE_EXECUTOR is None:
+        COMPUTE_EXECUTOR = ComputeExecutor(COMPUTE_EXECUTOR_MODE, COMPUTE_EXECUTOR_WORKERS)
+    return COMPUTE_EXECUTOR
+
 async def fetch_ohlcv_and_analyze(symbol: str, tf: str, limit: int, market_ticker: dict, macro_context: Dict) -> Optional[Dict]:
     """ 
     OHLCVデータを取得し、テクニカル分析とスコアリングを実行する 
+    (指標計算とスコアリングは計算エグゼキューター上で実行し、イベントループをブロックしない)
     """
     global EXCHANGE_CLIENT
     
@@ -1264,21 +3448,16 @@ async def fetch_ohlcv_and_analyze(symbol: str, tf: str, limit: int, market_ticke
         return None
         
     try:
-        # OHLCVデータを取得
-        ohlcv = await EXCHANGE_CLIENT.fetch_ohlcv(symbol, tf, limit=limit)
+        # OHLCVデータを取得 (キャッシュ済みの場合は新しい足のみ、上位足は下位足から合成)
+        with METRICS.timer('apex_analysis_duration_seconds', stage='ohlcv', timeframe=tf):
+            candles = await fetch_candles(symbol, tf, limit)
         
-        if len(ohlcv) < limit:
-            # logging.warning(f"⚠️ {symbol} ({tf}): 必要なデータ数 ({limit}) を取得できませんでした ({len(ohlcv)})。スキップします。")
+        if len(candles) < limit:
+            # logging.warning(f"⚠️ {symbol} ({tf}): 必要なデータ数 ({limit}) を取得できませんでした ({len(candles)})。スキップします。")
             return None
 
-        # DataFrameに変換
-        df = pd.DataFrame(ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-        
-        # テクニカル指標の計算
-        df = calculate_technical_indicators(df)
-        
-        # スコアリング
-        signal = score_signal(df, tf, market_ticker, macro_context)
+        # テクニカル指標の計算とスコアリング
+        signal = await get_compute_executor().analyze(symbol, tf, limit, candles, market_ticker, macro_context)
         
         return signal
         
@@ -1289,32 +3468,137 @@ async def fetch_ohlcv_and_analyze(symbol: str, tf: str, limit: int, market_ticke
         # logging.error(f"❌ {symbol} ({tf}) の分析中に予期せぬエラーが発生: {e}")
         return None
 
+# ====================================================================================
+# WARM STATE SNAPSHOT (再起動時のウォームスタート)
+# ====================================================================================
+
+def _read_warm_state(path: str) -> Dict:
+    with open(path, 'rb') as f:
+        return pickle.load(f)
+
+def _write_warm_state(path: str, data: Dict):
+    # 書き込み途中のファイルを読まないよう、一時ファイルに書いてから置き換える
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+
+async def save_warm_state():
+    """
+    ローソク足のキャッシュ、指標エンジンの状態、分析スケジュール、クールダウン、監視銘柄をディスクに保存する。
+    ポジションは PositionStore (SQLite) に随時保存されているため含めない。
+    """
+    global LAST_WARM_STATE_SAVE_TIME
+
+    # キャッシュが空 (起動直後に終了した場合など) のときは、既存のスナップショットを上書きしない
+    if not WARM_STATE_PATH or not OHLCV_CACHE:
+        return
+
+    started = time.monotonic()
+    try:
+        engines = await get_compute_executor().export_engines() if INCREMENTAL_INDICATORS else {}
+        # 列はイベントループ上でコピーし (分析による更新と競合しないように)、シリアライズと書き込みはスレッドで行う
+        data = {
+            'version': WARM_STATE_VERSION,
+            'exchange': CCXT_CLIENT_NAME.lower(),
+            'saved_at': time.time(),
+            'monitor_symbols': list(CURRENT_MONITOR_SYMBOLS),
+            'last_signal_time': dict(LAST_SIGNAL_TIME),
+            'candles': {key: {'capacity': buffer.capacity, 'columns': buffer.to_columns()} for key, buffer in OHLCV_CACHE.items() if len(buffer) > 0},
+            'indicator_engines': engines,
+            'analysis_schedule': {key: dict(entry) for key, entry in ANALYSIS_SCHEDULE.items()},
+        }
+        await asyncio.to_thread(_write_warm_state, WARM_STATE_PATH, data)
+        LAST_WARM_STATE_SAVE_TIME = time.time()
+        logging.info(f"✅ ウォーム状態を保存しました (ローソク足: {len(data['candles'])}件, 指標エンジン: {len(engines)}件, {time.monotonic() - started:.2f}秒)。")
+    except Exception as e:
+        logging.warning(f"⚠️ ウォーム状態を保存できませんでした: {e}")
+
+def _discard_warm_state(reason: str):
+    """ 復元できないスナップショットを削除する (次回以降もコールドスタートで起動できるように) """
+    logging.warning(f"⚠️ ウォーム状態を復元できませんでした: {reason}。スナップショットを削除してコールドスタートします。")
+    try:
+        os.remove(WARM_STATE_PATH)
+    except OSError:
+        pass
+
+async def load_warm_state() -> bool:
+    """
+    保存済みのウォーム状態を復元する。存在しない/形式や取引所が異なる/古すぎる場合は何もしない。
+
+    ローソク足は保存時点までの分が復元され、それ以降の足は次回の分析時に fetch_ohlcv_incremental が差分だけ取得する
+    (停止期間が limit 本を超えた場合は、通常のコールドスタートと同じく全件取得する)。
+    指標エンジンも確定足までの状態から差分更新されるため、初回の分析から全件の再計算を行わない。
+    読み込みや復元に失敗した場合は、状態を一切変更せずにスナップショットを削除する。
+    """
+    global CURRENT_MONITOR_SYMBOLS, LAST_WARM_STATE_SAVE_TIME
+
+    if not WARM_STATE_PATH or not os.path.exists(WARM_STATE_PATH):
+        return False
+    try:
+        data = await asyncio.to_thread(_read_warm_state, WARM_STATE_PATH)
+        if data.get('version') != WARM_STATE_VERSION or data.get('exchange') != CCXT_CLIENT_NAME.lower():
+            logging.info("ℹ️ ウォーム状態の形式または取引所が異なるため、コールドスタートします。")
+            return False
+        age = time.time() - data.get('saved_at', 0.0)
+        if age > WARM_STATE_MAX_AGE_SECONDS:
+            logging.info(f"ℹ️ ウォーム状態が古いため使用しません ({age / 3600:.1f}時間前)。コールドスタートします。")
+            return False
+
+        # 全ての項目を作成できた場合のみグローバルな状態に反映する (途中で失敗した場合に一部だけ復元しない)
+        candles = {
+            key: ColumnarRingBuffer.from_columns(entry['capacity'], entry['columns'], dtype=CANDLE_STORE_DTYPE, column_dtypes={'timestamp': np.float64})
+            for key, entry in data['candles'].items()
+        }
+        engine_states = dict(data['indicator_engines']) if INCREMENTAL_INDICATORS else {}
+        for state in engine_states.values():
+            IncrementalIndicatorEngine.from_state(state) # processモードではワーカーで復元するため、ここでは形式の確認のみ
+        analysis_schedule = {key: dict(entry) for key, entry in data['analysis_schedule'].items()}
+        last_signal_time = {symbol: float(signal_time) for symbol, signal_time in data['last_signal_time'].items()}
+        monitor_symbols = [str(symbol) for symbol in data['monitor_symbols']]
+    except Exception as e:
+        _discard_warm_state(str(e) or type(e).__name__)
+        return False
+
+    OHLCV_CACHE.update(candles)
+    if engine_states:
+        get_compute_executor().restore_engines(engine_states)
+    ANALYSIS_SCHEDULE.update(analysis_schedule)
+    # 起動後に記録されたクールダウンは上書きしない
+    for symbol, signal_time in last_signal_time.items():
+        LAST_SIGNAL_TIME.setdefault(symbol, signal_time)
+    if monitor_symbols:
+        CURRENT_MONITOR_SYMBOLS = monitor_symbols
+    LAST_WARM_STATE_SAVE_TIME = time.time() # 復元直後は保存しない (次回は通常の間隔で保存する)
+
+    logging.info(f"✅ ウォーム状態を復元しました ({age / 60:.1f}分前に保存, ローソク足: {len(candles)}件, 指標エンジン: {len(engine_states)}件, 監視銘柄: {len(CURRENT_MONITOR_SYMBOLS)})。")
+    return True
+
 # ====================================================================================
 # TRADING LOGIC - ORDER MANAGEMENT
 # ====================================================================================
 
-async def get_dynamic_lot_size(score: float, current_usdt_balance: float) -> Tuple[float, float]:
+def calculate_dynamic_lot_size(score: float, current_usdt_balance: float, total_equity: float) -> Tuple[float, float]:
     """ 
-    スコアと現在のUSDT残高に基づいて、動的なロットサイズを計算する。
+    スコア、現在のUSDT残高、総資産額に基づいて、動的なロットサイズを計算する (バックテストと共通)。
     
     Args:
         score (float): 取引シグナルスコア (0.0 - 1.0)
         current_usdt_balance (float): 現在の利用可能USDT残高
+        total_equity (float): 総資産額 (USDT換算)
         
     Returns:
         Tuple[float, float]: (ロットサイズUSDT, ロットサイズ割合)
     """
-    global GLOBAL_TOTAL_EQUITY, BASE_TRADE_SIZE_USDT, DYNAMIC_LOT_MIN_PERCENT, DYNAMIC_LOT_MAX_PERCENT, DYNAMIC_LOT_SCORE_MAX
-    
     # 1. ベースロットサイズ (最小値保証)
     min_lot_usdt = BASE_TRADE_SIZE_USDT
     
     # 2. 総資産ベースのロットサイズ (動的ロット)
-    if GLOBAL_TOTAL_EQUITY > 0:
+    if total_equity > 0:
         # 最小ロット (総資産のX%)
-        min_dynamic_lot = GLOBAL_TOTAL_EQUITY * DYNAMIC_LOT_MIN_PERCENT
+        min_dynamic_lot = total_equity * DYNAMIC_LOT_MIN_PERCENT
         # 最大ロット (総資産のY%)
-        max_dynamic_lot = GLOBAL_TOTAL_EQUITY * DYNAMIC_LOT_MAX_PERCENT
+        max_dynamic_lot = total_equity * DYNAMIC_LOT_MAX_PERCENT
         
         # スコアに基づいて、最小ロットから最大ロットの間で線形補間
         # DYNAMIC_LOT_SCORE_MAX (例: 0.96) で最大ロットが適用される
@@ -1345,10 +3629,23 @@ async def get_dynamic_lot_size(score: float, current_usdt_balance: float) -> Tup
     final_lot_usdt = min(final_lot_usdt, max_available_lot)
     
     # 5. ロットサイズの割合 (表示用)
-    lot_percent = (final_lot_usdt / GLOBAL_TOTAL_EQUITY) * 100 if GLOBAL_TOTAL_EQUITY > 0 else 0.0
+    lot_percent = (final_lot_usdt / total_equity) * 100 if total_equity > 0 else 0.0
     
     return final_lot_usdt, lot_percent
 
+async def get_dynamic_lot_size(score: float, current_usdt_balance: float) -> Tuple[float, float]:
+    """ 
+    スコアと現在のUSDT残高に基づいて、動的なロットサイズを計算する (総資産額は GLOBAL_TOTAL_EQUITY を使用)。
+    
+    Args:
+        score (float): 取引シグナルスコア (0.0 - 1.0)
+        current_usdt_balance (float): 現在の利用可能USDT残高
+        
+    Returns:
+        Tuple[float, float]: (ロットサイズUSDT, ロットサイズ割合)
+    """
+    return calculate_dynamic_lot_size(score, current_usdt_balance, GLOBAL_TOTAL_EQUITY)
+
 async def adjust_order_amount(symbol: str, usdt_amount: float, price: float) -> Tuple[float, float]:
     """
     USDT建ての想定金額と価格から、取引所の精度要件を満たすベース通貨の数量を計算し、丸める。
@@ -1363,50 +3660,31 @@ async def adjust_order_amount(symbol: str, usdt_amount: float, price: float) ->
     """
     global EXCHANGE_CLIENT
     
-    if symbol not in EXCHANGE_CLIENT.markets:
+    rules = MARKET_RULES.get(symbol)
+    if rules is None:
         return 0.0, 0.0
-        
-    market = EXCHANGE_CLIENT.markets[symbol]
     
     # 1. 注文数量の計算 (ベース通貨建て)
     base_amount = usdt_amount / price
     
-    # 2. 数量の精度要件 (amount precision)
-    precision = market['precision']['amount']
-    
-    # 3. 最小注文数量 (minAmount)
-    min_amount = market['limits']['amount']['min']
-
-    # 4. 数量の丸め
-    if precision is None:
-        # 精度が設定されていない場合は、一旦小数点以下4桁としておく
-        precision_digits = 4
-    elif isinstance(precision, float) and precision < 1:
-        # 例: 0.0001
-        try:
-            precision_digits = max(0, int(-math.log10(precision)))
-        except ValueError: # math.log10(0) を避ける
-            precision_digits = 8 
-    elif isinstance(precision, int):
-        # 例: 4 (小数第4位)
-        precision_digits = precision
-    else:
-        precision_digits = 4
-
-    # 精度桁数で丸め（四捨五入）
-    if precision_digits > 0:
-        # 0.5を加算してfloorすることで四捨五入に近い動作を実現
-        base_amount_rounded = math.floor(base_amount * (10**precision_digits)) / (10**precision_digits)
-        # base_amount_rounded = round(base_amount, precision_digits) # 通常はこれを使用するが、取引所によっては切り捨てを求めるため、安全を見てfloorを使用
+    # 2. 数量の丸め (精度桁数で切り捨て。桁数は build_market_rules で事前計算済み)
+    if rules['amount_digits'] > 0:
+        base_amount_rounded = math.floor(base_amount * rules['amount_scale']) / rules['amount_scale']
     else:
         # 整数に丸め
         base_amount_rounded = math.floor(base_amount)
         
-    # 5. 最小注文数量のチェック
+    # 3. 最小注文数量 (minAmount) のチェック
+    min_amount = rules['min_amount']
     if base_amount_rounded < min_amount:
         logging.warning(f"⚠️ {symbol}: 計算数量 ({base_amount_rounded:.8f}) が最小要件 ({min_amount:.8f}) を満たしません。")
         return 0.0, 0.0
 
+    # 4. 最小注文金額 (minNotional) のチェック
+    if base_amount_rounded * price < rules['min_notional']:
+        logging.warning(f"⚠️ {symbol}: 注文金額 ({format_usdt(base_amount_rounded * price)} USDT) が最小注文金額 ({rules['min_notional']} USDT) を満たしません。")
+        return 0.0, 0.0
+
     final_usdt_amount = base_amount_rounded * price
     return base_amount_rounded, final_usdt_amount
 
@@ -1438,6 +3716,9 @@ async def place_sl_tp_orders(
     if filled_amount <= 0:
          return {'status': 'error', 'error_message': '約定数量がゼロ以下です'}
 
+    # 利用可能な注文タイプ (build_market_rules で事前計算済み)
+    allowed_order_types = MARKET_RULES.get(symbol, {}).get('order_types', frozenset())
+
     logging.info(f"💡 SL/TP注文を設定します: {symbol} (Qty: {filled_amount:.4f}, SL: {format_price_precision(stop_loss)}, TP: {format_price_precision(take_profit)})")
 
     # 1. 共通設定: 数量はポジションの保有数量
@@ -1461,8 +3742,11 @@ async def place_sl_tp_orders(
         # CCXTの抽象化に頼らず、ネイティブなパラメータで実現可能な `create_order` の拡張を使用
         
         # ccxtは`type='take_profit_limit'`や`type='stop_loss_limit'`に対応している場合がある
-        if 'take_profit_limit' in EXCHANGE_CLIENT.market(symbol)['info'].get('options', {}).get('default_allowed_orders', []):
-            tp_order = await EXCHANGE_CLIENT.create_order(
+        if 'take_profit_limit' in allowed_order_types:
+            tp_order = await exchange_request(
+                'create_order',
+                priority=PRIORITY_ORDER_MANAGEMENT,
+                key=symbol,
                 symbol=symbol,
                 type='take_profit_limit', # CCXT標準のTP指値
                 side='sell',
@@ -1472,7 +3756,10 @@ async def place_sl_tp_orders(
             )
         else:
              # fall back to standard limit order if exchange does not support TP/SL
-             tp_order = await EXCHANGE_CLIENT.create_order(
+             tp_order = await exchange_request(
+                 'create_order',
+                 priority=PRIORITY_ORDER_MANAGEMENT,
+                 key=symbol,
                  symbol=symbol,
                  type='limit', # 通常の指値注文
                  side='sell',
@@ -1496,8 +3783,11 @@ async def place_sl_tp_orders(
     
     try:
         # ストップリミット注文: 価格がsl_trigger_priceに達したらsl_limit_priceで売る
-        if 'stop_loss_limit' in EXCHANGE_CLIENT.market(symbol)['info'].get('options', {}).get('default_allowed_orders', []):
-            sl_order = await EXCHANGE_CLIENT.create_order(
+        if 'stop_loss_limit' in allowed_order_types:
+            sl_order = await exchange_request(
+                'create_order',
+                priority=PRIORITY_ORDER_MANAGEMENT,
+                key=symbol,
                 symbol=symbol,
                 type='stop_loss_limit', # CCXT標準のSL指値
                 side='sell',
@@ -1507,7 +3797,10 @@ async def place_sl_tp_orders(
             )
         else:
             # fall back to standard order with stop loss parameter if supported
-            sl_order = await EXCHANGE_CLIENT.create_order(
+            sl_order = await exchange_request(
+                'create_order',
+                priority=PRIORITY_ORDER_MANAGEMENT,
+                key=symbol,
                 symbol=symbol,
                 type='limit', # 通常の指値注文 (トリガー機能がない場合)
                 side='sell',
@@ -1525,7 +3818,7 @@ async def place_sl_tp_orders(
         # 🚨 SL注文失敗は致命的。TP注文をキャンセルし、ポジションを強制クローズする
         try:
             if tp_order_id:
-                await EXCHANGE_CLIENT.cancel_order(tp_order_id, symbol)
+                await exchange_request('cancel_order', tp_order_id, symbol, priority=PRIORITY_ORDER_MANAGEMENT, key=symbol)
                 logging.warning(f"⚠️ TP注文 (ID: {tp_order_id}) をキャンセルしました。")
         except Exception as cancel_e:
             logging.error(f"❌ TP注文のキャンセルにも失敗: {cancel_e}")
@@ -1555,7 +3848,7 @@ async def close_position_immediately(symbol: str, amount: float) -> Dict:
         # 数量の丸め（成行注文でも精度は重要）
         # 注文数量を正確に計算する必要がある。ここでは、おおよそ現在の価格でUSDT額を計算
         market = EXCHANGE_CLIENT.markets[symbol]
-        ticker = await EXCHANGE_CLIENT.fetch_ticker(symbol)
+        ticker = await get_ticker(symbol, priority=PRIORITY_ORDER_MANAGEMENT)
         current_price = ticker['last']
         
         # amount はベース通貨量 (例: BTC)
@@ -1575,7 +3868,10 @@ async def close_position_immediately(symbol: str, amount: float) -> Dict:
              return {'status': 'skipped', 'error_message': 'スキップ: 丸め後の数量がゼロです。'}
 
         # 成行売り注文
-        close_order = await EXCHANGE_CLIENT.create_order(
+        close_order = await exchange_request(
+            'create_order',
+            priority=PRIORITY_ORDER_MANAGEMENT,
+            key=symbol,
             symbol=symbol,
             type='market',
             side='sell',
@@ -1587,6 +3883,7 @@ async def close_position_immediately(symbol: str, amount: float) -> Dict:
         
         if closed_amount > 0:
             logging.info(f"✅ 強制クローズ成功: {symbol} (約定数量: {closed_amount:.4f})")
+            apply_fill_to_account_status(symbol, 'sell', closed_amount, close_order.get('average') or close_order.get('price') or current_price)
             return {
                 'status': 'ok', 
                 'closed_amount': closed_amount, 
@@ -1618,7 +3915,6 @@ async def execute_trade(signal: Dict, lot_size_usdt: float) -> Dict:
         Dict: 取引結果 (成功/失敗、約定価格、SL/TP注文IDなど)
     """
     global EXCHANGE_CLIENT
-    global OPEN_POSITIONS # <--- この行を追加！
     
     symbol = signal['symbol']
     entry_price = signal['entry_price']
@@ -1645,7 +3941,10 @@ async def execute_trade(signal: Dict, lot_size_usdt: float) -> Dict:
 
         # 2. 現物指値買い注文 (IOC: Immediate-Or-Cancel) を実行
         # IOC注文は、即座に約定可能な数量だけ約定させ、残りをキャンセルする
-        order = await EXCHANGE_CLIENT.create_order(
+        order = await exchange_request(
+            'create_order',
+            priority=PRIORITY_TRADE_EXECUTION,
+            key=symbol,
             symbol=symbol,
             type='limit', # 指値注文
             side='buy',
@@ -1661,6 +3960,7 @@ async def execute_trade(signal: Dict, lot_size_usdt: float) -> Dict:
         # 💡 即時約定が発生した場合
         if filled_amount > 0 and filled_usdt > 0:
             logging.info(f"✅ 指値買い注文 約定成功: {symbol} (Qty: {filled_amount:.4f}, USDT: {format_usdt(filled_usdt)})")
+            apply_fill_to_account_status(symbol, 'buy', filled_amount, order.get('price', entry_price))
 
             # 4. SL/TP注文の設定
             sl_tp_result = await place_sl_tp_orders(
@@ -1677,6 +3977,8 @@ async def execute_trade(signal: Dict, lot_size_usdt: float) -> Dict:
                     'id': str(uuid.uuid4()), # ユニークなIDを付与
                     'symbol': symbol,
                     'timeframe': signal['timeframe'],
+                    'score': signal['score'],
+                    'rr_ratio': signal.get('rr_ratio', 0.0),
                     'entry_price': order.get('price', entry_price),
                     'filled_amount': filled_amount,
                     'filled_usdt': filled_usdt,
@@ -1686,7 +3988,7 @@ async def execute_trade(signal: Dict, lot_size_usdt: float) -> Dict:
                     'tp_order_id': sl_tp_result['tp_order_id'],
                     'timestamp': time.time()
                 }
-                OPEN_POSITIONS.append(new_position)
+                POSITION_STORE.add(new_position)
                 logging.info(f"✅ 取引成功: {symbol} にポジションを追加しました。")
 
                 return {
@@ -1735,155 +4037,597 @@ async def execute_trade(signal: Dict, lot_size_usdt: float) -> Dict:
         return {'status': 'error', 'error_message': error_message, 'close_status': 'skipped'}
 
 
+async def reconcile_position_orders(position: Dict, open_order_ids: set, order_updates: Optional[Dict[str, Dict]] = None) -> bool:
+    """
+    1つのポジションのSL/TP注文を、銘柄のオープン注文一覧 (open_order_ids) と突き合わせる。
+    両方がオープンのままなら追加のAPI呼び出しは行わず、一覧から消えた注文のみ fetch_order で状態を確認し、
+    決済処理 (残った注文のキャンセル、通知) または欠落した注文の再設定を行う。
+    order_updates (注文ID -> 注文) に含まれる注文は、注文更新フィードで受信した状態をそのまま使う。
+
+    Returns:
+        bool: ポジションが決済された場合は True
+    """
+    symbol = position['symbol']
+    sl_order_id = position['sl_order_id']
+    tp_order_id = position['tp_order_id']
+    
+    sl_status = None
+    tp_status = None
+    is_closed = False # ポジションが決済されたかどうか
+
+    try:
+        # 1/2. SL/TP注文のステータスを確認
+        # オープン注文一覧に含まれる注文は状態が変わっていないため、個別の照会は行わない
+        order_updates = order_updates or {}
+        if sl_order_id in order_updates:
+            sl_status = order_updates[sl_order_id]
+        elif sl_order_id in open_order_ids:
+            sl_status = {'id': sl_order_id, 'status': 'open'}
+        elif sl_order_id:
+            sl_status = await exchange_request('fetch_order', sl_order_id, symbol, priority=PRIORITY_ORDER_MANAGEMENT, key=symbol)
+
+        if tp_order_id in order_updates:
+            tp_status = order_updates[tp_order_id]
+        elif tp_order_id in open_order_ids:
+            tp_status = {'id': tp_order_id, 'status': 'open'}
+        elif tp_order_id:
+            tp_status = await exchange_request('fetch_order', tp_order_id, symbol, priority=PRIORITY_ORDER_MANAGEMENT, key=symbol)
+
+        if sl_status and tp_status and sl_status['status'] == 'open' and tp_status['status'] == 'open':
+            return False # 変化なし
+        
+        # 3. 決済判定
+        # SL注文が約定完了 (closed/filled) した場合
+        if sl_status and sl_status['status'] in ['closed', 'filled']:
+            logging.info(f"🛑 SL約定: {symbol} - SL注文 (ID: {sl_order_id}) が約定しました。")
+            is_closed = True
+            exit_price = sl_status.get('average') or sl_status['price']
+            exit_type = 'Stop Loss'
+            
+        # TP注文が約定完了 (closed/filled) した場合
+        elif tp_status and tp_status['status'] in ['closed', 'filled']:
+            logging.info(f"🛑 TP約定: {symbol} - TP注文 (ID: {tp_order_id}) が約定しました。")
+            is_closed = True
+            exit_price = tp_status.get('average') or tp_status['price']
+            exit_type = 'Take Profit'
+
+    except ccxt.OrderNotFound:
+        # 注文IDが見つからない = 取引所側でキャンセルされた、または約定後すぐに削除された可能性
+        # ここでは安全を見て、両方の注文がNot Foundで、かつポジション残高がないことを確認する必要があるが、
+        # 監視ループの複雑性を避けるため、一旦注文が約定完了したという前提で、ポジションの残高チェックを簡略化する。
+        # ただし、注文IDがない場合は、ステップ4の再設定ロジックに任せる。
+        pass
+    
+    except Exception as e:
+        logging.error(f"❌ 注文ステータス取得中にエラーが発生 ({symbol}): {e}")
+        return False # このポジションの処理をスキップ
+
+    # 4. 決済処理の実行
+    if is_closed:
+        # 残った注文をキャンセル
+        if exit_type == 'Stop Loss' and tp_status and tp_status['status'] == 'open':
+            try:
+                await exchange_request('cancel_order', tp_order_id, symbol, priority=PRIORITY_ORDER_MANAGEMENT, key=symbol)
+                logging.info(f"✅ SL約定に伴い、TP注文 (ID: {tp_order_id}) をキャンセルしました。")
+            except Exception as e:
+                logging.error(f"❌ TP注文のキャンセル失敗 ({symbol}): {e}")
+                
+        elif exit_type == 'Take Profit' and sl_status and sl_status['status'] == 'open':
+            try:
+                await exchange_request('cancel_order', sl_order_id, symbol, priority=PRIORITY_ORDER_MANAGEMENT, key=symbol)
+                logging.info(f"✅ TP約定に伴い、SL注文 (ID: {sl_order_id}) をキャンセルしました。")
+            except Exception as e:
+                logging.error(f"❌ SL注文のキャンセル失敗 ({symbol}): {e}")
+
+        # 損益 (PnL) の計算
+        pnl_usdt = (exit_price - position['entry_price']) * position['filled_amount']
+        pnl_percent = (exit_price / position['entry_price'] - 1) * 100
+
+        # 約定を口座ステータスのキャッシュに反映し、最新の総資産を更新 (期限切れ時はバックグラウンドで再取得)
+        apply_fill_to_account_status(symbol, 'sell', position['filled_amount'], exit_price)
+        account_status = await fetch_account_status()
+        
+        # 通知メッセージを作成し、Telegramで送信
+        trade_result = {
+            'status': 'closed',
+            'exit_type': exit_type,
+            'exit_price': exit_price,
+            'entry_price': position['entry_price'],
+            'filled_amount': position['filled_amount'],
+            'pnl_usdt': pnl_usdt,
+            'pnl_percent': pnl_percent
+        }
+        
+        # 決済シグナルをログに記録
+        log_signal({**position, 'trade_result': trade_result}, "ポジション決済")
+        
+        # 決済通知
+        message = format_telegram_message(position, "ポジション決済", 0.0, trade_result, exit_type)
+        await telegram_send_message(message)
+        
+        # グローバルポジションリストからの削除は、呼び出し元でまとめて行う (リストのインデックス問題を避ける)
+        return True
+
+    # ★ 5. SL/TPが片方または両方存在しない場合の再設定ロジック (V19.0.53で追加)
+    # 注文が約定完了していない (is_closed == False) かつ、
+    # SL注文またはTP注文がオープンでない (オープン注文IDがない or ステータスがオープンではない)
+    sl_open = sl_status and sl_status['status'] == 'open'
+    tp_open = tp_status and tp_status['status'] == 'open'
+    
+    if not is_closed and (not sl_open or not tp_open):
+        logging.warning(f"⚠️ {symbol}: SL({sl_order_id}:{sl_status.get('status') if sl_status else 'N/A'}) または TP({tp_order_id}:{tp_status.get('status') if tp_status else 'N/A'}) の注文が欠落しています。再設定を試みます。")
+
+        # まず、残っている注文があればキャンセルする (二重注文防止)
+        if sl_open:
+            try:
+                await exchange_request('cancel_order', sl_order_id, symbol, priority=PRIORITY_ORDER_MANAGEMENT, key=symbol)
+                logging.info(f"✅ SL再設定のため、既存SL注文 (ID: {sl_order_id}) をキャンセルしました。")
+            except Exception as e:
+                logging.error(f"❌ 既存SL注文のキャンセル失敗 ({symbol}): {e}")
+                
+        if tp_open:
+            try:
+                await exchange_request('cancel_order', tp_order_id, symbol, priority=PRIORITY_ORDER_MANAGEMENT, key=symbol)
+                logging.info(f"✅ TP再設定のため、既存TP注文 (ID: {tp_order_id}) をキャンセルしました。")
+            except Exception as e:
+                logging.error(f"❌ 既存TP注文のキャンセル失敗 ({symbol}): {e}")
+
+        # SL/TPを再設定
+        re_place_result = await place_sl_tp_orders(
+            symbol=position['symbol'],
+            filled_amount=position['filled_amount'],
+            stop_loss=position['stop_loss'],
+            take_profit=position['take_profit']
+        )
+
+        if re_place_result['status'] == 'ok':
+            # 注文IDを更新 (索引と永続化にも反映)
+            POSITION_STORE.update(position['id'], sl_order_id=re_place_result['sl_order_id'], tp_order_id=re_place_result['tp_order_id'])
+            logging.info(f"✅ {symbol}: SL/TP注文の再設定に成功しました。")
+        else:
+            logging.critical(f"🚨 {symbol}: SL/TP注文の再設定に失敗しました。ポジション ({position['id']}) の監視を継続しますが、手動での確認が必要です。")
+
+    return False
+
 async def open_order_management_loop():
     """ 
     オープンポジションのSL/TP注文のステータスを監視し、決済が発生したらポジションリストから削除する。
     10秒ごと (MONITOR_INTERVAL) に実行される。
+    銘柄ごとに fetch_open_orders を1回だけ呼び出し、全ポジションを並列に突き合わせる。
     """
-    global EXCHANGE_CLIENT, OPEN_POSITIONS, GLOBAL_TOTAL_EQUITY
+    global EXCHANGE_CLIENT, GLOBAL_TOTAL_EQUITY
     
     if not EXCHANGE_CLIENT or not IS_CLIENT_READY:
         logging.warning("⚠️ オープン注文監視をスキップ: クライアントが準備できていません。")
         return
 
-    # 処理中にリストが変更されるのを防ぐため、コピーをイテレート
-    positions_to_check = OPEN_POSITIONS[:]
-    
-    # 決済済みポジションのIDを保持するリスト
-    closed_position_ids = []
+    # 処理中にストアが変更されても影響しないよう、スナップショットをイテレート
+    positions_to_check = POSITION_STORE.all()
+    if not positions_to_check:
+        return
 
-    for position in positions_to_check:
-        symbol = position['symbol']
-        sl_order_id = position['sl_order_id']
-        tp_order_id = position['tp_order_id']
-        
-        sl_status = None
-        tp_status = None
-        is_closed = False # ポジションが決済されたかどうか
+    # 1. 銘柄ごとのオープン注文IDを一括取得
+    symbols = sorted({position['symbol'] for position in positions_to_check})
+    results = await asyncio.gather(
+        *(exchange_request('fetch_open_orders', symbol, priority=PRIORITY_ORDER_MANAGEMENT, key=symbol) for symbol in symbols),
+        return_exceptions=True
+    )
+    open_order_ids_by_symbol: Dict[str, set] = {}
+    for symbol, result in zip(symbols, results):
+        if isinstance(result, Exception):
+            logging.error(f"❌ オープン注文の取得中にエラーが発生 ({symbol}): {result}")
+            continue # この銘柄のポジションは次回確認する
+        open_order_ids_by_symbol[symbol] = {order['id'] for order in result}
+
+    # 2. 各ポジションを並列に突き合わせる
+    targets = [position for position in positions_to_check if position['symbol'] in open_order_ids_by_symbol]
+    # (注文更新フィードで処理中のポジションはロックで待ち合わせ、決済済みならスキップする)
+    results = await asyncio.gather(
+        *(reconcile_position_exclusively(position, open_order_ids_by_symbol[position['symbol']]) for position in targets),
+        return_exceptions=True
+    )
+
+    # 決済済みポジションは reconcile_position_exclusively でリストから削除済み
+    for position, result in zip(targets, results):
+        if isinstance(result, Exception):
+            logging.error(f"❌ ポジション監視中にエラーが発生 ({position['symbol']}): {result}", exc_info=result)
+
+
+# ====================================================================================
+# POSITION STORE (ポジション管理)
+# ====================================================================================
+
+class PositionStore:
+    """
+    ボットが管理するポジションのストア。
+
+    ポジションID・銘柄・注文ID (SL/TP) で索引し、O(1) で検索できる。
+    変更はSQLite (WALモード) に即座に書き込み、再起動時に load() で復元する。
+    決済済みのポジションは削除せず status='closed' として残す。
+    """
+
+    def __init__(self, path: Optional[str]):
+        self.path = path
+        self._by_id: Dict[str, Dict] = {} # 追加順を保持
+        self._by_symbol: Dict[str, set] = {}
+        self._by_order_id: Dict[str, str] = {}
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
+    def __bool__(self) -> bool:
+        return bool(self._by_id)
+
+    def __contains__(self, position_id: str) -> bool:
+        return position_id in self._by_id
+
+    def all(self) -> List[Dict]:
+        """ 全ポジションのリスト (追加順) を返す。リスト自体はコピーのため、走査中に追加/削除しても安全 """
+        return list(self._by_id.values())
+
+    def get(self, position_id: str) -> Optional[Dict]:
+        return self._by_id.get(position_id)
+
+    def by_symbol(self, symbol: str) -> List[Dict]:
+        return [self._by_id[position_id] for position_id in self._by_symbol.get(symbol, ())]
+
+    def has_symbol(self, symbol: str) -> bool:
+        return bool(self._by_symbol.get(symbol))
+
+    def by_order_id(self, order_id: str) -> Optional[Dict]:
+        """ SL/TP注文IDからポジションを検索する """
+        position_id = self._by_order_id.get(order_id)
+        return self._by_id.get(position_id) if position_id else None
+
+    def add(self, position: Dict):
+        self._index(position)
+        self._persist(position, 'open')
+
+    def update(self, position_id: str, **fields):
+        """ ポジションの項目 (SL/TPの注文IDなど) を更新し、索引と永続化に反映する (追加順は変えない) """
+        position = self._by_id[position_id]
+        self._unindex_keys(position)
+        position.update(fields)
+        self._index_keys(position)
+        self._persist(position, 'open')
+
+    def remove(self, position_id: str) -> Optional[Dict]:
+        """ ポジションを決済済みとして取り除く """
+        position = self._by_id.get(position_id)
+        if position is not None:
+            self._unindex(position)
+            self._persist(position, 'closed')
+        return position
+
+    def _index(self, position: Dict):
+        self._by_id[position['id']] = position
+        self._index_keys(position)
+
+    def _unindex(self, position: Dict):
+        self._by_id.pop(position['id'], None)
+        self._unindex_keys(position)
+
+    def _index_keys(self, position: Dict):
+        """ 銘柄・注文IDの索引に登録する """
+        position_id = position['id']
+        self._by_symbol.setdefault(position['symbol'], set()).add(position_id)
+        for key in ('sl_order_id', 'tp_order_id'):
+            if position.get(key):
+                self._by_order_id[position[key]] = position_id
+
+    def _unindex_keys(self, position: Dict):
+        """ 銘柄・注文IDの索引から取り除く """
+        position_id = position['id']
+        symbol_ids = self._by_symbol.get(position['symbol'])
+        if symbol_ids is not None:
+            symbol_ids.discard(position_id)
+            if not symbol_ids:
+                del self._by_symbol[position['symbol']]
+        for key in ('sl_order_id', 'tp_order_id'):
+            if position.get(key) and self._by_order_id.get(position[key]) == position_id:
+                del self._by_order_id[position[key]]
+
+    def _connect(self) -> Optional[sqlite3.Connection]:
+        if self._conn is None and self.path:
+            self._conn = sqlite3.connect(self.path)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL") # WALではコミット単位の耐久性を保ちつつfsync回数を減らす
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS positions ("
+                "id TEXT PRIMARY KEY, symbol TEXT NOT NULL, status TEXT NOT NULL, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS idx_positions_status ON positions (status)")
+            self._conn.commit()
+        return self._conn
 
+    def _persist(self, position: Dict, status: str):
         try:
-            # 1. SL注文のステータスを確認
-            sl_status = await EXCHANGE_CLIENT.fetch_order(sl_order_id, symbol)
-            
-            # 2. TP注文のステータスを確認
-            tp_status = await EXCHANGE_CLIENT.fetch_order(tp_order_id, symbol)
-            
-            # 3. 決済判定
-            # SL注文が約定完了 (closed/filled) した場合
-            if sl_status and sl_status['status'] in ['closed', 'filled']:
-                logging.info(f"🛑 SL約定: {symbol} - SL注文 (ID: {sl_order_id}) が約定しました。")
-                is_closed = True
-                exit_price = sl_status['average'] or sl_status['price']
-                exit_type = 'Stop Loss'
-                
-            # TP注文が約定完了 (closed/filled) した場合
-            elif tp_status and tp_status['status'] in ['closed', 'filled']:
-                logging.info(f"🛑 TP約定: {symbol} - TP注文 (ID: {tp_order_id}) が約定しました。")
-                is_closed = True
-                exit_price = tp_status['average'] or tp_status['price']
-                exit_type = 'Take Profit'
-
-        except ccxt.OrderNotFound:
-            # 注文IDが見つからない = 取引所側でキャンセルされた、または約定後すぐに削除された可能性
-            # ここでは安全を見て、両方の注文がNot Foundで、かつポジション残高がないことを確認する必要があるが、
-            # 監視ループの複雑性を避けるため、一旦注文が約定完了したという前提で、ポジションの残高チェックを簡略化する。
-            # ただし、注文IDがない場合は、ステップ4の再設定ロジックに任せる。
-            pass
-        
+            conn = self._connect()
+            if conn is None:
+                return
+            # INSERT OR REPLACE は行を作り直して rowid が変わるため、UPSERTで既存行を更新し追加順 (rowid) を保つ
+            conn.execute(
+                "INSERT INTO positions (id, symbol, status, data, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET symbol = excluded.symbol, status = excluded.status, "
+                "data = excluded.data, updated_at = excluded.updated_at",
+                (position['id'], position['symbol'], status, json.dumps(position, default=_json_default), time.time())
+            )
+            conn.commit()
         except Exception as e:
-            logging.error(f"❌ 注文ステータス取得中にエラーが発生 ({symbol}): {e}")
-            continue # このポジションの処理をスキップ
+            logging.error(f"❌ ポジションの保存に失敗しました ({position.get('symbol')}): {e}")
 
-        # 4. 決済処理の実行
+    def load(self) -> int:
+        """ 保存済みのオープンポジションを読み込み、読み込んだ件数を返す """
+        try:
+            conn = self._connect()
+            if conn is None:
+                return 0
+            rows = conn.execute("SELECT data FROM positions WHERE status = 'open' ORDER BY rowid").fetchall()
+        except Exception as e:
+            logging.error(f"❌ 保存済みポジションの読み込みに失敗しました: {e}")
+            return 0
+        for (data,) in rows:
+            self._index(json.loads(data))
+        return len(rows)
+
+POSITION_STORE = PositionStore(POSITION_STORE_PATH) # 現在保有中のポジション (注文IDトラッキング用)
+
+async def restore_positions():
+    """
+    起動時に保存済みのポジションを復元し、取引所のオープン注文と突き合わせる。
+    停止中に約定/キャンセルされたSL/TPは通常の監視処理と同じく決済処理または再設定を行う。
+    """
+    count = POSITION_STORE.load()
+    if count == 0:
+        return
+
+    logging.info(f"💡 保存済みのポジションを {count} 件復元しました。取引所のオープン注文と照合します...")
+    await open_order_management_loop()
+    logging.info(f"✅ ポジションの照合が完了しました。監視中のポジション: {len(POSITION_STORE)} 件")
+
+# ====================================================================================
+# ORDER UPDATE FEED (注文約定のイベント駆動検知)
+# ====================================================================================
+
+class OrderUpdateFeed(abc.ABC):
+    """ 注文の状態変化 (CCXTの注文構造体) を受信するフィードの基底クラス """
+
+    name = "base"
+
+    @abc.abstractmethod
+    def stream(self, on_connected: Callable[[], None]) -> AsyncIterator[Dict]:
+        """
+        注文の更新を受信した順に返す非同期イテレータ。
+        購読が実際に機能した時点 (最初の受信、または再生の開始) で on_connected() を呼び出す。
+        """
+
+    async def close(self):
+        pass
+
+class CcxtProOrderFeed(OrderUpdateFeed):
+    """ ccxt.pro の watch_orders (プライベートWebSocket) から注文の更新を受信する """
+
+    name = "ccxt.pro"
+
+    def __init__(self, client):
+        self.client = client
+
+    @classmethod
+    def create(cls) -> Optional['CcxtProOrderFeed']:
+        """ ccxt.pro が利用でき、取引所が watchOrders に対応している場合のみフィードを作成する """
+        if ccxt_pro is None:
+            return None
+        exchange_class = getattr(ccxt_pro, CCXT_CLIENT_NAME.lower(), None)
+        if exchange_class is None:
+            return None
+        client = exchange_class({'apiKey': API_KEY, 'secret': SECRET_KEY, 'enableRateLimit': True})
+        if not client.has.get('watchOrders'):
+            return None
+        # マーケットデータはRESTクライアントでロード済みのものを共有する (再ダウンロードしない)
+        client.set_markets(EXCHANGE_CLIENT.markets, EXCHANGE_CLIENT.currencies)
+        return cls(client)
+
+    async def stream(self, on_connected: Callable[[], None]):
+        while True:
+            orders = await self.client.watch_orders()
+            on_connected()
+            for order in orders:
+                yield order
+
+    async def close(self):
+        await self.client.close()
+
+class ReplayOrderFeed(OrderUpdateFeed):
+    """
+    オフラインテスト用のフィード。
+    push() で注文の更新を直接流すか、JSONLファイル (1行に1件の注文。'delay' キーで前の行からの待機秒数を指定) を再生する。
+    """
+
+    name = "replay"
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._replay_task: Optional[asyncio.Task] = None
+
+    def push(self, order: Dict):
+        self._queue.put_nowait(order)
+
+    def _read_lines(self) -> List[str]:
+        with open(self.path, 'r') as f:
+            return [line for line in f if line.strip()]
+
+    async def _replay_file(self, lines: List[str]):
+        try:
+            for line in lines:
+                order = json.loads(line)
+                await asyncio.sleep(float(order.pop('delay', 0.0)))
+                self.push(order)
+        except Exception as e:
+            # 再生の失敗は stream() で送出し、リスナーに切断として扱わせる
+            self._queue.put_nowait(e)
+
+    async def stream(self, on_connected: Callable[[], None]):
+        if self.path:
+            lines = await asyncio.to_thread(self._read_lines) # ファイルが読めない場合はここで失敗する
+            if self._replay_task is not None:
+                self._replay_task.cancel()
+            self._replay_task = asyncio.create_task(self._replay_file(lines))
+        on_connected()
+        while True:
+            item = await self._queue.get()
+            if isinstance(item, Exception):
+                raise item
+            yield item
+
+    async def close(self):
+        if self._replay_task is not None:
+            self._replay_task.cancel()
+
+def create_order_update_feed() -> Optional[OrderUpdateFeed]:
+    """ ORDER_FEED_MODE に応じて注文更新フィードを作成する (利用できない場合は None = ポーリングのみ) """
+    if ORDER_FEED_MODE == 'off':
+        return None
+    if ORDER_FEED_MODE == 'replay':
+        if not ORDER_FEED_REPLAY_PATH:
+            logging.warning("⚠️ ORDER_FEED_MODE=replay ですが ORDER_FEED_REPLAY_PATH が設定されていません。")
+            return None
+        return ReplayOrderFeed(ORDER_FEED_REPLAY_PATH)
+    return CcxtProOrderFeed.create()
+
+def get_position_lock(position_id: str) -> asyncio.Lock:
+    """ ポジションごとのロック (ポーリングとイベント受信で同じポジションを同時に処理しないため) """
+    lock = POSITION_LOCKS.get(position_id)
+    if lock is None:
+        lock = POSITION_LOCKS[position_id] = asyncio.Lock()
+    return lock
+
+async def reconcile_position_exclusively(position: Dict, open_order_ids: set, order_updates: Optional[Dict[str, Dict]] = None) -> bool:
+    """
+    ポジションのロックを取得して reconcile_position_orders を実行し、決済された場合はポジションリストから削除する。
+    ロック待ちの間に他方の処理で決済済みになったポジションは処理しない。
+    """
+    position_id = position['id']
+    async with get_position_lock(position_id):
+        if position_id not in POSITION_STORE:
+            return False
+        is_closed = await reconcile_position_orders(position, open_order_ids, order_updates)
         if is_closed:
-            closed_position_ids.append(position['id'])
-            
-            # 残った注文をキャンセル
-            if exit_type == 'Stop Loss' and tp_status and tp_status['status'] == 'open':
-                try:
-                    await EXCHANGE_CLIENT.cancel_order(tp_order_id, symbol)
-                    logging.info(f"✅ SL約定に伴い、TP注文 (ID: {tp_order_id}) をキャンセルしました。")
-                except Exception as e:
-                    logging.error(f"❌ TP注文のキャンセル失敗 ({symbol}): {e}")
-                    
-            elif exit_type == 'Take Profit' and sl_status and sl_status['status'] == 'open':
-                try:
-                    await EXCHANGE_CLIENT.cancel_order(sl_order_id, symbol)
-                    logging.info(f"✅ TP約定に伴い、SL注文 (ID: {sl_order_id}) をキャンセルしました。")
-                except Exception as e:
-                    logging.error(f"❌ SL注文のキャンセル失敗 ({symbol}): {e}")
+            POSITION_STORE.remove(position_id)
 
-            # 損益 (PnL) の計算
-            pnl_usdt = (exit_price - position['entry_price']) * position['filled_amount']
-            pnl_percent = (exit_price / position['entry_price'] - 1) * 100
+    if is_closed:
+        POSITION_LOCKS.pop(position_id, None)
+    return is_closed
 
-            # 口座ステータスを再取得し、最新の総資産を更新
-            account_status = await fetch_account_status()
-            
-            # 通知メッセージを作成し、Telegramで送信
-            trade_result = {
-                'status': 'closed',
-                'exit_type': exit_type,
-                'exit_price': exit_price,
-                'entry_price': position['entry_price'],
-                'filled_amount': position['filled_amount'],
-                'pnl_usdt': pnl_usdt,
-                'pnl_percent': pnl_percent
-            }
-            
-            # 決済シグナルをログに記録
-            log_signal({**position, 'trade_result': trade_result}, "ポジション決済")
-            
-            # 決済通知
-            message = format_telegram_message(position, "ポジション決済", 0.0, trade_result, exit_type)
-            await telegram_send_message(message)
-            
-            # グローバルポジションリストから削除
-            # この処理はループ終了後にまとめて行うことで、リストのインデックス問題を避ける
+async def handle_order_update(order: Dict):
+    """
+    注文の更新を1件処理する。追跡中のSL/TP注文が約定した場合は、もう一方の注文を即座にキャンセルして決済処理を行う。
+    """
+    order_id = order.get('id')
+    if not order_id or order.get('status') not in ['closed', 'filled']:
+        return
 
-        # ★ 5. SL/TPが片方または両方存在しない場合の再設定ロジック (V19.0.53で追加)
-        # 注文が約定完了していない (is_closed == False) かつ、
-        # SL注文またはTP注文がオープンでない (オープン注文IDがない or ステータスがオープンではない)
-        sl_open = sl_status and sl_status['status'] == 'open'
-        tp_open = tp_status and tp_status['status'] == 'open'
-        
-        if not is_closed and (not sl_open or not tp_open):
-            logging.warning(f"⚠️ {symbol}: SL({sl_order_id}:{sl_status.get('status') if sl_status else 'N/A'}) または TP({tp_order_id}:{tp_status.get('status') if tp_status else 'N/A'}) の注文が欠落しています。再設定を試みます。")
+    position = POSITION_STORE.by_order_id(order_id)
+    if position is None:
+        return
+    other_order_id = position['tp_order_id'] if order_id == position['sl_order_id'] else position['sl_order_id']
 
-            # まず、残っている注文があればキャンセルする (二重注文防止)
-            if sl_open:
-                try:
-                    await EXCHANGE_CLIENT.cancel_order(sl_order_id, symbol)
-                    logging.info(f"✅ SL再設定のため、既存SL注文 (ID: {sl_order_id}) をキャンセルしました。")
-                except Exception as e:
-                    logging.error(f"❌ 既存SL注文のキャンセル失敗 ({symbol}): {e}")
-                    
-            if tp_open:
+    logging.info(f"⚡ 注文約定イベントを受信: {position['symbol']} (ID: {order_id})")
+    # 約定していない側の注文はオープンとみなし、照会せずにキャンセルする
+    open_order_ids = {other_order_id} if other_order_id else set()
+    await reconcile_position_exclusively(position, open_order_ids, {order_id: order})
+
+async def order_update_listener():
+    """
+    注文更新フィードを購読し、約定を即座に処理するバックグラウンドタスク。
+    フィードが利用できない場合は終了し、監視は MONITOR_INTERVAL のポーリングのみで行う。
+    """
+    global ORDER_FEED, ORDER_FEED_ACTIVE
+
+    # クライアントの初期化 (マーケットデータのロード) を待つ
+    while not IS_CLIENT_READY:
+        await asyncio.sleep(1)
+
+    ORDER_FEED = create_order_update_feed()
+    if ORDER_FEED is None:
+        logging.info("ℹ️ 注文更新フィードは利用できません。注文監視はポーリングのみで行います。")
+        return
+
+    def on_connected():
+        # 購読が機能していることを確認できるまでは、通常間隔のポーリングを続ける
+        global ORDER_FEED_ACTIVE
+        if not ORDER_FEED_ACTIVE:
+            ORDER_FEED_ACTIVE = True
+            logging.info(f"✅ 注文更新フィード ({ORDER_FEED.name}) に接続しました。ポーリングは {ORDER_FEED_SAFETY_POLL_INTERVAL} 秒ごとの安全確認に切り替えます。")
+
+    logging.info(f"💡 注文更新フィード ({ORDER_FEED.name}) の購読を開始します。")
+    retry_delay = 1.0
+    while True:
+        try:
+            async for order in ORDER_FEED.stream(on_connected):
+                retry_delay = 1.0
                 try:
-                    await EXCHANGE_CLIENT.cancel_order(tp_order_id, symbol)
-                    logging.info(f"✅ TP再設定のため、既存TP注文 (ID: {tp_order_id}) をキャンセルしました。")
+                    await handle_order_update(order)
                 except Exception as e:
-                    logging.error(f"❌ 既存TP注文のキャンセル失敗 ({symbol}): {e}")
-
-            # SL/TPを再設定
-            re_place_result = await place_sl_tp_orders(
-                symbol=position['symbol'],
-                filled_amount=position['filled_amount'],
-                stop_loss=position['stop_loss'],
-                take_profit=position['take_profit']
-            )
+                    logging.error(f"❌ 注文更新イベントの処理中にエラーが発生: {e}", exc_info=True)
+        except asyncio.CancelledError:
+            ORDER_FEED_ACTIVE = False
+            await ORDER_FEED.close()
+            raise
+        except Exception as e:
+            # 切断中は通常間隔のポーリングに戻し、指数バックオフで再接続する
+            ORDER_FEED_ACTIVE = False
+            logging.error(f"❌ 注文更新フィードが切断されました: {e}。{retry_delay:.0f}秒後に再接続します。")
+            await asyncio.sleep(retry_delay)
+            retry_delay = min(retry_delay * 2, 60.0)
 
-            if re_place_result['status'] == 'ok':
-                # 注文IDを更新
-                position['sl_order_id'] = re_place_result['sl_order_id']
-                position['tp_order_id'] = re_place_result['tp_order_id']
-                logging.info(f"✅ {symbol}: SL/TP注文の再設定に成功しました。")
-            else:
-                logging.critical(f"🚨 {symbol}: SL/TP注文の再設定に失敗しました。ポジション ({position['id']}) の監視を継続しますが、手動での確認が必要です。")
+def _macro_signature(macro_context: Dict) -> Tuple[float, float]:
+    return (macro_context.get('fgi_proxy', 0.0), macro_context.get('forex_bonus', 0.0))
 
-    # ループ終了後、決済済みポジションをリストから削除
-    OPEN_POSITIONS = [p for p in OPEN_POSITIONS if p['id'] not in closed_position_ids]
-    
+def is_analysis_due(symbol: str, tf: str, current_price: float, macro_context: Dict) -> bool:
+    """
+    (symbol, timeframe) を再分析する必要があるかを判定する。
+    次の足が確定した、価格が前回分析時から ANALYSIS_PRICE_BAND_PERCENT 以上動いた、
+    またはマクロ環境が変化した場合に True を返す。
+    """
+    entry = ANALYSIS_SCHEDULE.get((symbol, tf))
+    if not CANDLE_CLOSE_SCHEDULING or entry is None:
+        return True
+    if EXCHANGE_CLIENT.milliseconds() >= entry['next_close_ms']:
+        return True
+    if entry['macro'] != _macro_signature(macro_context):
+        return True
+    last_price = entry['price']
+    return last_price <= 0 or abs(current_price / last_price - 1.0) >= ANALYSIS_PRICE_BAND_PERCENT
+
+def record_analysis(symbol: str, tf: str, current_price: float, macro_context: Dict, signal: Dict):
+    """ 分析結果と、形成中の足が確定する時刻を記録する """
+    tf_ms = get_timeframe_ms(tf)
+    ANALYSIS_SCHEDULE[(symbol, tf)] = {
+        'next_close_ms': (EXCHANGE_CLIENT.milliseconds() // tf_ms + 1) * tf_ms,
+        'price': current_price,
+        'macro': _macro_signature(macro_context),
+        'signal': dict(signal), # 呼び出し側での変更 (trade_resultの付与など) の影響を受けないようにコピー
+    }
+
+def reuse_cached_signal(symbol: str, tf: str, market_ticker: Dict) -> Optional[Dict]:
+    """
+    前回の分析結果を再利用する。スコアはそのままとし、エントリー価格とSL/TPのみ最新価格で再計算する。
+    """
+    signal = ANALYSIS_SCHEDULE[(symbol, tf)]['signal']
+    current_price = market_ticker['last']
+    stop_loss, take_profit, rr_ratio = calculate_stop_loss_take_profit(current_price, signal['tech_data']['atr_value'])
+
+    return {
+        **signal,
+        'entry_price': current_price,
+        'current_price': current_price,
+        'stop_loss': stop_loss,
+        'take_profit': take_profit,
+        'rr_ratio': rr_ratio,
+        'last_log_time': time.time(),
+    }
 
 async def analyze_and_get_signals(symbol: str, market_ticker: Dict, macro_context: Dict) -> List[Dict]:
     """ 
@@ -1899,10 +4643,19 @@ async def analyze_and_get_signals(symbol: str, market_ticker: Dict, macro_contex
         HOURLY_ATTEMPT_LOG[symbol] = "クールダウン"
         return signals
 
+    # TARGET_TIMEFRAMES は下位足から順に処理する (上位足は同じサイクルで更新された下位足から合成される)
     for tf in TARGET_TIMEFRAMES:
         limit = REQUIRED_OHLCV_LIMITS[tf]
         try:
-            signal = await fetch_ohlcv_and_analyze(symbol, tf, limit, market_ticker, macro_context)
+            if is_analysis_due(symbol, tf, market_ticker['last'], macro_context):
+                signal = await fetch_ohlcv_and_analyze(symbol, tf, limit, market_ticker, macro_context)
+                if signal:
+                    # 取得/分析に失敗した場合は記録せず、次のサイクルで再試行する
+                    record_analysis(symbol, tf, market_ticker['last'], macro_context, signal)
+            else:
+                # 足が確定しておらず価格もバンド内: 前回の結果を再利用する (取得・再スコアリングなし)
+                signal = reuse_cached_signal(symbol, tf, market_ticker)
+                
             if signal and signal['score'] >= 0.50: # ベーススコア以上のシグナルのみを返す
                 signals.append(signal)
         except Exception as e:
@@ -1915,13 +4668,48 @@ async def analyze_and_get_signals(symbol: str, market_ticker: Dict, macro_contex
 # MAIN LOOP & API ENDPOINT
 # ====================================================================================
 
+async def initialize_bot():
+    """
+    起動時の初期化。互いに依存しない処理を並行して実行する。
+
+    1. 取引所クライアントの初期化 (マーケットデータ)、マクロデータの取得、ウォーム状態の復元
+    2. クライアントの準備完了後: ポジションの復元、口座ステータスと全銘柄ティッカーの取得
+
+    2の結果は各キャッシュに残るため、直後のメインループは取引所を待たずに分析を開始できる。
+    """
+    global GLOBAL_MACRO_CONTEXT, IS_WARM_STATE_CHECKED
+
+    started = time.monotonic()
+    init_tasks = [initialize_exchange_client(), fetch_fgi_data()]
+    if not IS_WARM_STATE_CHECKED:
+        # 初期化に失敗して再試行する場合は、復元済みの状態を読み直さない
+        IS_WARM_STATE_CHECKED = True
+        init_tasks.append(load_warm_state())
+    results = await asyncio.gather(*init_tasks, return_exceptions=True)
+    for step, result in zip(('取引所クライアントの初期化', 'マクロデータの取得', 'ウォーム状態の復元'), results):
+        if isinstance(result, Exception):
+            logging.error(f"❌ 起動時の{step}に失敗しました: {result}", exc_info=result)
+    if not isinstance(results[1], Exception):
+        GLOBAL_MACRO_CONTEXT = results[1]
+
+    if not IS_CLIENT_READY:
+        return
+
+    # 前回起動時のポジションを復元し (SL/TPの監視を再開する)、口座ステータスとティッカーのキャッシュを用意する
+    results = await asyncio.gather(restore_positions(), fetch_account_status(), get_ticker_snapshot(), return_exceptions=True)
+    for step, result in zip(('ポジションの復元', '口座ステータスの取得', 'ティッカーの取得'), results):
+        if isinstance(result, Exception):
+            logging.error(f"❌ 起動時の{step}に失敗しました: {result}。メインループで再試行します。")
+
+    logging.info(f"✅ 起動時の初期化が完了しました ({time.monotonic() - started:.2f}秒)。")
+
 async def main_bot_loop():
     """ボットのメイン実行ループ (1分ごと)"""
     global LAST_SUCCESS_TIME, LAST_SIGNAL_TIME, LAST_ANALYSIS_SIGNALS, CURRENT_MONITOR_SYMBOLS, GLOBAL_MACRO_CONTEXT, LAST_HOURLY_NOTIFICATION_TIME, IS_FIRST_MAIN_LOOP_COMPLETED, HOURLY_SIGNAL_LOG, HOURLY_ATTEMPT_LOG, BOT_VERSION
     
-    # メインループの初回起動時のみ、クライアント初期化とステータス通知を実行
+    # メインループの初回起動時のみ、クライアント初期化 (ポジション/ウォーム状態の復元を含む) を実行
     if not IS_CLIENT_READY:
-        await initialize_exchange_client()
+        await initialize_bot()
         
         # 初期化失敗時は即座にリターンし、次のループを待つ
         if not IS_CLIENT_READY:
@@ -1932,6 +4720,7 @@ async def main_bot_loop():
     start_time = time.time()
     now_jst = datetime.now(JST).strftime("%Y/%m/%d %H:%M:%S")
     logging.info(f"--- 💡 {now_jst} - BOT LOOP START (M1 Frequency) ---")
+    stages = METRICS.laps('apex_stage_duration_seconds') # ステージごとの所要時間
 
     try:
         # 1. FGIデータを取得し、グローバルマクロコンテキストを更新
@@ -1939,9 +4728,11 @@ async def main_bot_loop():
         # FGIの値をスコアリングに反映する準備
         macro_influence_score = (GLOBAL_MACRO_CONTEXT.get('fgi_proxy', 0.0) + GLOBAL_MACRO_CONTEXT.get('forex_bonus', 0.0))
         current_threshold = get_current_threshold(GLOBAL_MACRO_CONTEXT) # 動的閾値を決定
+        stages.lap('macro')
         
         # 2. 口座ステータスを取得し、新規取引の可否をチェック
         account_status = await fetch_account_status()
+        stages.lap('account_status')
         
         if account_status.get('error'):
              logging.critical("🚨 口座ステータスの取得に失敗しました。取引処理をスキップします。")
@@ -1953,9 +4744,12 @@ async def main_bot_loop():
 
         # 3. 監視銘柄リストの更新 (出来高上位銘柄を組み込む)
         CURRENT_MONITOR_SYMBOLS = await update_monitor_symbols()
-        
-        # 4. 全銘柄のティッカー情報を取得 (並列化は不要、単一APIコールで十分)
-        tickers = await EXCHANGE_CLIENT.fetch_tickers()
+        prune_ohlcv_cache(CURRENT_MONITOR_SYMBOLS) # 監視対象外になった銘柄のキャッシュを解放
+        stages.lap('universe')
+
+        # 4. 全銘柄のティッカー情報を取得 (口座ステータス/監視銘柄更新と同じスナップショットを共有)
+        tickers = await get_ticker_snapshot()
+        stages.lap('tickers')
         
         # 5. すべての銘柄/タイムフレームの分析を非同期で実行
         all_signals: List[Dict] = []
@@ -1989,6 +4783,9 @@ async def main_bot_loop():
         # スコア降順でソート
         all_signals.sort(key=lambda x: x['score'], reverse=True)
         LAST_ANALYSIS_SIGNALS = all_signals # 最後の分析結果を保存
+        stages.lap('analysis')
+        METRICS.set('apex_cycle_signals', len(all_signals))
+        METRICS.inc('apex_signals_total', len(all_signals))
 
         # 6. ベストシグナル候補の選定と取引実行
         best_signal: Optional[Dict] = all_signals[0] if all_signals else None
@@ -2003,10 +4800,10 @@ async def main_bot_loop():
                 if account_status['total_usdt_balance'] >= MIN_USDT_BALANCE_FOR_TRADE:
                     
                     # クールダウンチェック (analyze_and_get_signalsでもチェックしているが、最終確認)
-                    symbol_cooldown_expired = symbol not in LAST_SIGNAL_TIME or (time.time() - LAST_SIGNAL_TIME[best_signal['symbol']] >= TRADE_SIGNAL_COOLDOWN)
+                    symbol_cooldown_expired = best_signal['symbol'] not in LAST_SIGNAL_TIME or (time.time() - LAST_SIGNAL_TIME[best_signal['symbol']] >= TRADE_SIGNAL_COOLDOWN)
                     
                     # ポジション保有チェック (二重エントリー防止)
-                    has_position = any(p['symbol'] == best_signal['symbol'] for p in OPEN_POSITIONS)
+                    has_position = POSITION_STORE.has_symbol(best_signal['symbol'])
 
                     if symbol_cooldown_expired and not has_position:
                         
@@ -2057,6 +4854,7 @@ async def main_bot_loop():
                 
         else:
             logging.info("ℹ️ 有効な取引シグナルは見つかりませんでした。")
+        stages.lap('execution')
             
         # 7. Hourly Report用のシグナルログを更新
         HOURLY_SIGNAL_LOG.extend([s for s in all_signals if s['score'] >= 0.50])
@@ -2085,20 +4883,30 @@ async def main_bot_loop():
             HOURLY_ATTEMPT_LOG = {}
             LAST_HOURLY_NOTIFICATION_TIME = time.time()
             logging.info("✅ Hourly Reportを送信し、ログをリセットしました。")
+        stages.lap('notification')
+
+        # 10. ウォーム状態のスナップショットを保存 (再起動時の復元用)
+        if time.time() - LAST_WARM_STATE_SAVE_TIME >= WARM_STATE_SAVE_INTERVAL_SECONDS:
+            await save_warm_state()
+            stages.lap('warm_state')
 
 
     except Exception as e:
         logging.critical(f"🚨 メインBOTループで致命的なエラーが発生: {e}", exc_info=True)
+        METRICS.inc('apex_cycle_errors_total')
         # 連続的なエラーを防ぐため、強制的にクールダウン
         await asyncio.sleep(LOOP_INTERVAL * 5)
         
     finally:
         end_time = time.time()
+        METRICS.observe('apex_cycle_duration_seconds', end_time - start_time)
+        METRICS.inc('apex_cycles_total')
         sleep_time = LOOP_INTERVAL - (end_time - start_time)
         if sleep_time > 0:
             # logging.debug(f"ℹ️ メインループ完了。次まで {sleep_time:.2f}秒待機します。")
             await asyncio.sleep(sleep_time)
         else:
+            METRICS.inc('apex_cycle_overruns_total')
             logging.warning(f"⚠️ メインループがオーバーランしました ({-(sleep_time):.2f}秒超過)。即座に再実行します。")
             # オーバーランしても、次のループを待つ
 
@@ -2110,12 +4918,18 @@ async def monitor_loop_wrapper():
         except Exception as e:
             logging.critical(f"🚨 注文監視ループで致命的なエラーが発生: {e}", exc_info=True)
         
-        await asyncio.sleep(MONITOR_INTERVAL)
+        # 注文更新フィードの購読中は、ポーリングは取りこぼし対策の安全確認のみ
+        await asyncio.sleep(ORDER_FEED_SAFETY_POLL_INTERVAL if ORDER_FEED_ACTIVE else MONITOR_INTERVAL)
 
 async def main_loop_wrapper():
     """メインBOTループのラッパー (並行実行用)"""
     while True:
-        await main_bot_loop()
+        try:
+            await main_bot_loop()
+        except Exception as e:
+            # 初期化処理など main_bot_loop の try の外で発生した例外でも、ループを止めない
+            logging.critical(f"🚨 メインBOTループの実行に失敗しました: {e}", exc_info=True)
+            await asyncio.sleep(LOOP_INTERVAL)
 
 
 # ====================================================================================
@@ -2134,22 +4948,42 @@ app = FastAPI(
 async def startup_event():
     """アプリケーション起動時にメインループをバックグラウンドで開始する"""
     logging.info("🚀 FastAPIサーバーが起動しました。BOTループを開始します。")
+    if TELEGRAM_NOTIFIER:
+        TELEGRAM_NOTIFIER.start() # Telegram送信キューの処理を開始
+    get_compute_executor().start() # 計算用ワーカープロセスを起動
+    LOOP_LAG_MONITOR.start() # イベントループの遅延監視を開始
     # asyncio.create_taskで非同期タスクとして実行
     asyncio.create_task(main_loop_wrapper())
     asyncio.create_task(monitor_loop_wrapper())
+    asyncio.create_task(order_update_listener())
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """アプリケーション終了時にウォーム状態、未送信のTelegram通知とバッファ済みのログを書き出し、外部APIの接続を閉じる"""
+    LOOP_LAG_MONITOR.stop()
+    await save_warm_state() # 計算ワーカーの停止前に、指標エンジンの状態を含めて保存する
+    if TELEGRAM_NOTIFIER:
+        await TELEGRAM_NOTIFIER.close()
+    if HTTP_SESSION is not None and not HTTP_SESSION.closed:
+        await HTTP_SESSION.close()
+    await asyncio.to_thread(SIGNAL_LOG_WRITER.close) # バッファ済みのログを書き出す
+    if COMPUTE_EXECUTOR is not None:
+        COMPUTE_EXECUTOR.shutdown()
 
 # 疎通確認用エンドポイント (Renderのヘルスチェック対応)
 # ヘルスチェックは通常、このエンドポイントを見てサービスが生きているかを判断します。
-@app.get("/health", include_in_schema=False)
-def health_check():
-    """Renderのヘルスチェック用エンドポイント。BOTの稼働状態とアップタイムを返す。"""
-    
 @app.get("/health", response_class=JSONResponse)
 def health_check():
-    """ボットの稼働状態チェック"""
+    """Renderのヘルスチェック用エンドポイント。BOTの稼働状態とイベントループの遅延を返す。"""
     is_bot_ready = IS_CLIENT_READY and IS_FIRST_MAIN_LOOP_COMPLETED
     status = "OK" if is_bot_ready else "INITIALIZING"
-    return JSONResponse(content={"status": status, "version": BOT_VERSION, "client_ready": IS_CLIENT_READY})
+    return JSONResponse(content={"status": status, "version": BOT_VERSION, "client_ready": IS_CLIENT_READY, "loop_lag": LOOP_LAG_MONITOR.summary()})
+
+# Prometheus形式のメトリクス (サイクル/ステージの所要時間、取引所リクエストの応答時間、キューの長さなど)
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """メトリクスをPrometheusのテキスト形式で返す (レジストリはロックを取らないため、イベントループ上で読み出す)"""
+    return PlainTextResponse(METRICS.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
 
 # ボットの現在の状態を表示するエンドポイント
 @app.get("/status", response_class=JSONResponse)
@@ -2167,7 +5001,8 @@ async def get_bot_status():
         "macro_context": GLOBAL_MACRO_CONTEXT,
         "current_signal_threshold": current_threshold,
         "monitoring_symbols_count": len(CURRENT_MONITOR_SYMBOLS),
-        "open_positions_count": len(OPEN_POSITIONS),
+        "open_positions_count": len(POSITION_STORE),
+        "loop_lag": LOOP_LAG_MONITOR.summary(),
         "last_signals": [
             {
                 "symbol": s['symbol'], 
@@ -2188,13 +5023,48 @@ async def get_bot_status():
                 "tp": format_price_precision(p['take_profit']),
                 "id": p['id'][:8] + '...'
             }
-            for p in OPEN_POSITIONS
+            for p in POSITION_STORE.all()
         ],
     }
     
     # JSONResponseを使用して、意図的にHTMLタグをエンコードせずに返す
     return JSONResponse(content=status_data)
 
+# シグナル/取引ログの検索エンドポイント
+# 期間 (since/until) はUNIX秒またはISO形式 (例: 2025-01-01, 2025-01-01T09:00:00)。タイムゾーン省略時はJST
+@app.get("/history/signals", response_class=JSONResponse)
+async def get_signal_history(symbol: Optional[str] = None, timeframe: Optional[str] = None, context: Optional[str] = None,
+                             since: Optional[str] = None, until: Optional[str] = None, limit: int = 100):
+    """条件に一致するシグナル/取引ログを新しい順に返す"""
+    try:
+        filters = {'symbol': symbol, 'timeframe': timeframe, 'context': context, 'since': _parse_history_time(since), 'until': _parse_history_time(until)}
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": f"日時の形式が不正です: {e}"})
+    rows = await query_signal_history('signals', limit=min(max(limit, 1), 5000), **filters)
+    return JSONResponse(content={"count": len(rows), "signals": rows})
+
+@app.get("/history/scores", response_class=JSONResponse)
+async def get_score_history(symbol: Optional[str] = None, timeframe: Optional[str] = None, context: Optional[str] = None,
+                            since: Optional[str] = None, until: Optional[str] = None, bins: int = 10):
+    """スコアの統計値と分布を返す"""
+    try:
+        filters = {'symbol': symbol, 'timeframe': timeframe, 'context': context, 'since': _parse_history_time(since), 'until': _parse_history_time(until)}
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": f"日時の形式が不正です: {e}"})
+    result = await query_signal_history('score_distribution', bins=min(max(bins, 1), 100), **filters)
+    return JSONResponse(content=result)
+
+@app.get("/history/trades", response_class=JSONResponse)
+async def get_trade_history(symbol: Optional[str] = None, timeframe: Optional[str] = None,
+                            since: Optional[str] = None, until: Optional[str] = None):
+    """決済タイプ別のPnL、TP到達率、エントリー約定率を返す"""
+    try:
+        filters = {'symbol': symbol, 'timeframe': timeframe, 'since': _parse_history_time(since), 'until': _parse_history_time(until)}
+    except ValueError as e:
+        return JSONResponse(status_code=400, content={"error": f"日時の形式が不正です: {e}"})
+    result = await query_signal_history('trade_stats', **filters)
+    return JSONResponse(content=result)
+
 # if __name__ == "__main__":
 #     # このブロックはUvicornが直接呼び出すのではなく、uvicorn main_render\ (43):app で実行される
 #     # 開発環境でのみ、直接実行したい場合はコメントアウトを解除
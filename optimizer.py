@@ -0,0 +1,222 @@
+# ====================================================================================
+# Apex BOT - スコアリング定数のパラメータスイープ
+# backtest.py のバックテストを、スコアリング定数の組み合わせごとにプロセスプールで並列実行し、
+# 成績順に並べた表を出力する。指標は親プロセスで一度だけ計算し、共有メモリで全ワーカーに渡す。
+#
+# 使い方:
+#   python optimizer.py data/ --timeframe 5m \
+#       --param TREND_ALIGNMENT_BONUS=0.05,0.10,0.15 --param threshold=0.78:0.86:0.02 \
+#       --workers 8 --sort-by sharpe_ratio --output optimizer_results.csv
+# ====================================================================================
+
+import os
+import sys
+import time
+import random
+import logging
+import argparse
+import itertools
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import Dict, List, Optional, Tuple, Any
+
+import numpy as np
+import pandas as pd
+
+import main_render as bot
+import backtest
+
+# 共有メモリに載せる列 (OHLCV + スコアリングに使う指標)
+SHARED_COLUMNS = bot.OHLCV_COLUMNS + bot.INDICATOR_COLUMNS
+# スコアリング定数以外にスイープできるパラメータ
+THRESHOLD_PARAMETER = 'threshold'
+# 結果の表に含める統計
+RESULT_STAT_COLUMNS = (
+    'total_return_percent', 'sharpe_ratio', 'max_drawdown_percent', 'trades',
+    'win_rate_percent', 'profit_factor', 'average_pnl_percent',
+)
+
+# ワーカープロセスの状態 (_init_worker で設定)
+WORKER_STATE: Dict[str, Any] = {}
+
+
+# ====================================================================================
+# PARAMETER GRID
+# ====================================================================================
+
+def parse_param_spec(spec: str) -> Tuple[str, List[float]]:
+    """
+    '--param' の指定を (名前, 値のリスト) に変換する。
+    'NAME=0.05,0.10,0.15' (列挙) または 'NAME=start:stop:step' (stopを含む範囲) を受け付ける。
+    """
+    if '=' not in spec:
+        raise ValueError(f"パラメータの指定が不正です (NAME=値): {spec}")
+    name, values = (part.strip() for part in spec.split('=', 1))
+    if name != THRESHOLD_PARAMETER and name not in bot.SCORING_PARAMETER_NAMES:
+        raise ValueError(f"不明なパラメータ: {name}")
+
+    if ':' in values:
+        start, stop, step = (float(v) for v in values.split(':'))
+        if step <= 0:
+            raise ValueError(f"ステップは正の値を指定してください: {spec}")
+        count = int(np.floor((stop - start) / step + 1e-9)) + 1
+        return name, [round(start + i * step, 10) for i in range(count)]
+    return name, [float(v) for v in values.split(',') if v.strip()]
+
+def build_parameter_grid(specs: List[str], samples: Optional[int] = None, seed: int = 0) -> List[Dict[str, float]]:
+    """ パラメータの全組み合わせを作成する (samples を指定した場合はランダムに抽出する) """
+    axes = dict(parse_param_spec(spec) for spec in specs)
+    names = list(axes)
+    grid = [dict(zip(names, values)) for values in itertools.product(*(axes[name] for name in names))]
+    if samples is not None and samples < len(grid):
+        grid = random.Random(seed).sample(grid, samples)
+    return grid
+
+
+# ====================================================================================
+# SHARED INDICATOR ARRAYS
+# ====================================================================================
+
+def share_frames(frames: Dict[str, pd.DataFrame]) -> Tuple[shared_memory.SharedMemory, Dict[str, Any]]:
+    """
+    銘柄ごとの指標DataFrameを1つの共有メモリブロック (列 x 全銘柄の行) にコピーする。
+
+    Returns:
+        Tuple[SharedMemory, Dict]: (共有メモリ, ワーカーが復元に使うレイアウト情報)
+    """
+    symbols = list(frames)
+    lengths = [len(frames[s]) for s in symbols]
+    offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(int).tolist()
+    shape = (len(SHARED_COLUMNS), offsets[-1])
+
+    shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * 8))
+    block = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+    for k, symbol in enumerate(symbols):
+        for c, col in enumerate(SHARED_COLUMNS):
+            block[c, offsets[k]:offsets[k + 1]] = frames[symbol][col].to_numpy(dtype=np.float64)
+
+    layout = {'name': shm.name, 'shape': shape, 'symbols': symbols, 'offsets': offsets}
+    return shm, layout
+
+def attach_frames(layout: Dict[str, Any]) -> Tuple[shared_memory.SharedMemory, Dict[str, pd.DataFrame]]:
+    """ 共有メモリから銘柄ごとのDataFrameを復元する (列は共有メモリのビューで、コピーしない) """
+    shm = shared_memory.SharedMemory(name=layout['name'])
+    block = np.ndarray(layout['shape'], dtype=np.float64, buffer=shm.buf)
+    block.flags.writeable = False
+    offsets = layout['offsets']
+    frames = {
+        symbol: pd.DataFrame({col: block[c, offsets[k]:offsets[k + 1]] for c, col in enumerate(SHARED_COLUMNS)}, copy=False)
+        for k, symbol in enumerate(layout['symbols'])
+    }
+    return shm, frames
+
+
+# ====================================================================================
+# WORKERS
+# ====================================================================================
+
+def _init_worker(layout: Dict[str, Any], timeframe: str, macro_context: Dict, simulate_kwargs: Dict):
+    logging.getLogger().setLevel(logging.WARNING)
+    shm, frames = attach_frames(layout)
+    WORKER_STATE.update({
+        'shm': shm, # 参照を保持して共有メモリを開いたままにする
+        'frames': frames,
+        'timeframe': timeframe,
+        'macro_context': macro_context,
+        'simulate_kwargs': simulate_kwargs,
+    })
+
+def evaluate(params: Dict[str, float]) -> Dict[str, Any]:
+    """ 1つのパラメータの組み合わせでバックテストを実行し、統計を返す (ワーカープロセスで実行) """
+    scoring_params = dict(params)
+    threshold = scoring_params.pop(THRESHOLD_PARAMETER, None)
+    if threshold is None:
+        threshold = bot.get_current_threshold(WORKER_STATE['macro_context'])
+
+    frames = WORKER_STATE['frames']
+    scores = backtest.compute_scores(frames, WORKER_STATE['timeframe'], WORKER_STATE['macro_context'], scoring_params)
+    result = backtest.simulate(frames, scores, WORKER_STATE['timeframe'], threshold, **WORKER_STATE['simulate_kwargs'])
+    return result['stats']
+
+def run_sweep(frames: Dict[str, pd.DataFrame], grid: List[Dict[str, float]], timeframe: str, macro_context: Dict,
+              workers: Optional[int] = None, sort_by: str = 'sharpe_ratio', **simulate_kwargs) -> pd.DataFrame:
+    """
+    パラメータの組み合わせをプロセスプールで評価し、sort_by の降順に並べた表を返す。
+    失敗した組み合わせは 'error' 列にエラー内容を記録する。
+    """
+    workers = workers or os.cpu_count() or 1
+    shm, layout = share_frames(frames)
+    rows: List[Dict[str, Any]] = []
+    started = time.monotonic()
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(layout, timeframe, macro_context, simulate_kwargs)) as executor:
+            futures = {executor.submit(evaluate, params): params for params in grid}
+            for done, future in enumerate(as_completed(futures), start=1):
+                params = futures[future]
+                try:
+                    stats = future.result()
+                    rows.append({**params, **{col: stats.get(col, np.nan) for col in RESULT_STAT_COLUMNS}, 'error': None})
+                except Exception as e:
+                    rows.append({**params, 'error': str(e)})
+                if done % max(1, len(grid) // 20) == 0 or done == len(grid):
+                    elapsed = time.monotonic() - started
+                    logging.info(f"ℹ️ {done}/{len(grid)} 件完了 ({elapsed:.0f}秒経過, 残り約{elapsed / done * (len(grid) - done):.0f}秒)")
+    finally:
+        shm.close()
+        shm.unlink()
+
+    table = pd.DataFrame(rows)
+    if sort_by in table:
+        table = table.sort_values(sort_by, ascending=False, na_position='last')
+    table = table.reset_index(drop=True)
+    table.insert(0, 'rank', np.arange(1, len(table) + 1))
+    return table
+
+
+# ====================================================================================
+# ENTRY POINT
+# ====================================================================================
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Apex BOT スコアリング定数のパラメータスイープ")
+    parser.add_argument('paths', nargs='+', help="OHLCVのCSV/Parquetファイル、ディレクトリまたはglobパターン")
+    parser.add_argument('--param', action='append', required=True, metavar='NAME=VALUES',
+                        help="スイープするパラメータ (例: MACD_CROSS_PENALTY=0.15,0.20,0.25 / threshold=0.78:0.86:0.02)")
+    parser.add_argument('--timeframe', help="タイムフレーム (省略時は足の間隔から推定)")
+    parser.add_argument('--samples', type=int, help="全組み合わせからランダムに抽出する件数")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, help="ワーカープロセス数 (省略時はCPUコア数)")
+    parser.add_argument('--sort-by', default='sharpe_ratio', choices=RESULT_STAT_COLUMNS)
+    parser.add_argument('--top', type=int, default=20, help="表示する上位件数")
+    parser.add_argument('--initial-balance', type=float, default=backtest.DEFAULT_INITIAL_BALANCE)
+    parser.add_argument('--fee-rate', type=float, default=backtest.DEFAULT_FEE_RATE)
+    parser.add_argument('--max-volume-participation', type=float, default=backtest.DEFAULT_MAX_VOLUME_PARTICIPATION)
+    parser.add_argument('--fgi-proxy', type=float, default=0.0, help="期間中一定とみなすFGIプロキシ値")
+    parser.add_argument('--forex-bonus', type=float, default=0.0, help="期間中一定とみなす為替ボーナス")
+    parser.add_argument('--output', default='optimizer_results.csv')
+    args = parser.parse_args(argv)
+
+    logging.getLogger().setLevel(logging.INFO)
+    grid = build_parameter_grid(args.param, args.samples, args.seed)
+    data = backtest.load_ohlcv_files(args.paths)
+    timeframe = args.timeframe or backtest.infer_timeframe(data)
+    frames = backtest.prepare_indicators(data)
+    logging.info(f"ℹ️ {len(frames)} 銘柄 / {len(grid)} 通りの組み合わせを評価します。")
+
+    table = run_sweep(
+        frames, grid, timeframe,
+        macro_context={'fgi_proxy': args.fgi_proxy, 'forex_bonus': args.forex_bonus},
+        workers=args.workers,
+        sort_by=args.sort_by,
+        initial_balance=args.initial_balance,
+        fee_rate=args.fee_rate,
+        max_volume_participation=args.max_volume_participation,
+    )
+    table.to_csv(args.output, index=False)
+    with pd.option_context('display.max_columns', None, 'display.width', 200):
+        print(table.head(args.top).to_string(index=False))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
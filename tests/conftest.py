@@ -0,0 +1,17 @@
+import os
+import sys
+import tempfile
+
+# main_render は読み込み時にログ/DBを開くため、保存先を一時ディレクトリにしてから読み込む
+STATE_DIR = tempfile.mkdtemp()
+for name, filename in (
+    ('SIGNAL_LOG_PATH', 'apex_bot_signals.json'),
+    ('POSITION_STORE_PATH', 'positions.db'),
+    ('MARKET_CACHE_PATH', 'market_cache.json'),
+    ('SIGNAL_HISTORY_DB_PATH', 'signal_history.db'),
+    ('WARM_STATE_PATH', 'warm_state.pkl'),
+):
+    os.environ.setdefault(name, os.path.join(STATE_DIR, filename))
+os.environ.setdefault('TEST_MODE', 'True')
+os.environ.setdefault('ORDER_FEED_MODE', 'off')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
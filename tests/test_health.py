@@ -0,0 +1,15 @@
+from fastapi.testclient import TestClient
+
+import main_render as bot
+
+
+def test_health_includes_loop_lag():
+    # startup イベント (BOTループ) は起動しない
+    client = TestClient(bot.app)
+    response = client.get("/health")
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["status"] == "INITIALIZING"
+    assert body["version"] == bot.BOT_VERSION
+    assert set(body["loop_lag"]) >= {"p50_ms", "p99_ms", "max_ms", "samples", "stall_count", "last_offenders"}
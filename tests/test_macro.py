@@ -0,0 +1,24 @@
+import asyncio
+
+import main_render as bot
+
+
+def test_failed_cold_source_caches_default_until_retry(monkeypatch):
+    calls = []
+
+    async def failing_fetch():
+        calls.append(1)
+        raise TimeoutError("timeout")
+
+    ttl = 600
+    default = {'forex_bonus': 0.0}
+    monkeypatch.setattr(bot, 'MACRO_SOURCES', {'forex': (failing_fetch, ttl, default, '為替データ')})
+    monkeypatch.setattr(bot, 'MACRO_CACHE', {'forex': {'value': None, 'timestamp': 0.0}})
+
+    assert asyncio.run(bot._refresh_macro_source('forex')) == default
+    entry = bot.MACRO_CACHE['forex']
+    assert entry['value'] == default
+    # MACRO_FAILURE_RETRY_SECONDS 後に期限切れとなり、以降はバックグラウンドで再取得される
+    remaining = ttl - (bot.time.monotonic() - entry['timestamp'])
+    assert 0 < remaining <= bot.MACRO_FAILURE_RETRY_SECONDS
+    assert len(calls) == 1
@@ -0,0 +1,19 @@
+import main_render as bot
+
+
+def test_render_prints_large_counts_exactly():
+    registry = bot.MetricsRegistry((0.1, 1.0))
+    registry.describe('requests_total', 'counter', "requests")
+    registry.describe('latency_seconds', 'histogram', "latency")
+    registry.inc('requests_total', 1234567)
+    for _ in range(3):
+        registry.observe('latency_seconds', 0.05, method='fetch_ohlcv')
+    registry._histograms['latency_seconds'][(('method', 'fetch_ohlcv'),)][0] += 1234567 - 3
+    registry._histograms['latency_seconds'][(('method', 'fetch_ohlcv'),)][-1] += 1234567 - 3
+
+    lines = registry.render().splitlines()
+
+    assert "requests_total 1234567.0" in lines
+    assert 'latency_seconds_bucket{method="fetch_ohlcv",le="0.1"} 1234567' in lines
+    assert 'latency_seconds_bucket{method="fetch_ohlcv",le="+Inf"} 1234567' in lines
+    assert 'latency_seconds_count{method="fetch_ohlcv"} 1234567' in lines
@@ -0,0 +1,53 @@
+import asyncio
+import json
+
+import pytest
+
+import main_render as bot
+
+
+async def _collect(feed, count):
+    connected = []
+    orders = []
+    async for order in feed.stream(lambda: connected.append(True)):
+        orders.append(order)
+        if len(orders) == count:
+            break
+    return connected, orders
+
+
+def test_replay_feed_connects_after_reading_file(tmp_path):
+    path = tmp_path / "orders.jsonl"
+    path.write_text("\n".join(json.dumps({'id': str(i), 'status': 'closed', 'delay': 0}) for i in range(2)) + "\n")
+
+    connected, orders = asyncio.run(_collect(bot.ReplayOrderFeed(str(path)), 2))
+
+    assert connected
+    assert [order['id'] for order in orders] == ['0', '1']
+
+
+def test_replay_feed_missing_file_fails_before_connecting(tmp_path):
+    connected = []
+
+    async def run():
+        async for _ in bot.ReplayOrderFeed(str(tmp_path / "missing.jsonl")).stream(lambda: connected.append(True)):
+            pass
+
+    with pytest.raises(FileNotFoundError):
+        asyncio.run(run())
+    assert not connected
+
+
+def test_replay_feed_surfaces_replay_errors(tmp_path):
+    path = tmp_path / "orders.jsonl"
+    path.write_text(json.dumps({'id': '0', 'status': 'closed'}) + "\nnot json\n")
+
+    with pytest.raises(json.JSONDecodeError):
+        asyncio.run(_collect(bot.ReplayOrderFeed(str(path)), 2))
+
+
+def test_replay_mode_without_path_disables_feed(monkeypatch):
+    monkeypatch.setattr(bot, 'ORDER_FEED_MODE', 'replay')
+    monkeypatch.setattr(bot, 'ORDER_FEED_REPLAY_PATH', None)
+
+    assert bot.create_order_update_feed() is None
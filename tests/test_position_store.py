@@ -0,0 +1,28 @@
+import main_render as bot
+
+
+def _position(position_id, symbol):
+    return {'id': position_id, 'symbol': symbol, 'sl_order_id': None, 'tp_order_id': None}
+
+
+def test_update_keeps_insertion_order_across_reload(tmp_path):
+    path = str(tmp_path / "positions.db")
+    store = bot.PositionStore(path)
+    for position_id, symbol in (('p1', 'BTC/USDT'), ('p2', 'ETH/USDT'), ('p3', 'SOL/USDT')):
+        store.add(_position(position_id, symbol))
+
+    # 先頭のポジションにSL/TP注文IDを後から付与する
+    store.update('p1', sl_order_id='sl-1', tp_order_id='tp-1')
+    store.update('p1', sl_order_id='sl-2')
+    store.remove('p2')
+    assert [p['id'] for p in store.all()] == ['p1', 'p3']
+    assert store.by_order_id('sl-1') is None
+    assert store.by_order_id('sl-2')['id'] == 'p1'
+
+    reloaded = bot.PositionStore(path)
+    assert reloaded.load() == 2
+    assert [p['id'] for p in reloaded.all()] == ['p1', 'p3']
+    assert reloaded.by_order_id('sl-2')['id'] == 'p1'
+    assert reloaded.by_order_id('tp-1')['id'] == 'p1'
+    assert reloaded.by_order_id('sl-1') is None
+    assert reloaded.has_symbol('SOL/USDT') and not reloaded.has_symbol('ETH/USDT')
@@ -0,0 +1,36 @@
+import json
+import os
+
+import main_render as bot
+
+
+def _write_records(path, start, count):
+    with open(path, 'w') as f:
+        for i in range(start, start + count):
+            f.write(json.dumps({
+                'timestamp_jst': f"2026-01-01T00:{i // 60:02d}:{i % 60:02d}+09:00",
+                'context': "取引シグナル", 'symbol': f"S{i}/USDT", 'timeframe': '1h', 'score': 0.5,
+            }) + "\n")
+
+
+def test_sync_rereads_live_file_replaced_by_rotation(tmp_path):
+    log_path = str(tmp_path / "signals.json")
+    store = bot.SignalHistoryStore(str(tmp_path / "history.db"), log_path)
+
+    _write_records(log_path, 0, 3)
+    assert store.sync() == 3
+
+    # ローテーション: 新しいファイルが前回の読み込み位置より大きくなってから取り込む
+    os.replace(log_path, str(tmp_path / "signals.old.json"))
+    _write_records(log_path, 100, 10)
+    assert store.sync() == 10
+    assert len(store.signals(limit=100)) == 13
+
+
+def test_sort_by_mtime_skips_deleted_files(tmp_path):
+    paths = [str(tmp_path / name) for name in ("a.gz", "b.gz")]
+    for path in paths:
+        open(path, 'w').close()
+    os.remove(paths[0])
+
+    assert bot._sort_by_mtime(paths) == [paths[1]]
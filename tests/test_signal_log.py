@@ -0,0 +1,40 @@
+import json
+
+import numpy as np
+
+import main_render as bot
+
+
+def test_log_record_is_snapshotted_when_written(tmp_path):
+    path = tmp_path / "signals.json"
+    writer = bot.SignalLogWriter(str(path), 60.0, 500, 'never', 10.0, 10 ** 9, 10 ** 9, 1)
+    trade_result = {'status': 'ok', 'pnl_usdt': np.float64(1.5)}
+
+    writer.write({'symbol': 'BTC/USDT', 'trade_result': trade_result})
+    # 書き込みスレッドがフラッシュする前に、呼び出し元がネストしたdictを変更する
+    trade_result['status'] = 'closed'
+    trade_result['extra'] = 1
+    writer.close()
+
+    record = json.loads(path.read_text().splitlines()[0])
+    assert record['trade_result'] == {'status': 'ok', 'pnl_usdt': 1.5}
+
+
+def test_reopened_file_rotates_by_first_record_age(tmp_path):
+    path = tmp_path / "signals.json"
+    old = (bot.datetime.now(bot.JST) - bot.timedelta(hours=2)).isoformat()
+    recent = bot.datetime.now(bot.JST).isoformat()
+    # 2時間前に開始され、直近にも追記されたファイル (st_ctime は直近の追記時刻になる)
+    path.write_text(
+        json.dumps({'symbol': 'BTC/USDT', 'timestamp_jst': old}) + "\n"
+        + json.dumps({'symbol': 'ETH/USDT', 'timestamp_jst': recent}) + "\n"
+    )
+
+    writer = bot.SignalLogWriter(str(path), 60.0, 500, 'never', 10.0, 10 ** 9, 3600, 3)
+    writer.write({'symbol': 'SOL/USDT', 'timestamp_jst': recent})
+    writer.close()
+
+    backups = list(tmp_path.glob("signals.*.json.gz"))
+    assert len(backups) == 1
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [r['symbol'] for r in records] == ['SOL/USDT']
@@ -0,0 +1,21 @@
+import asyncio
+
+import main_render as bot
+
+
+def test_full_queue_drops_oldest_message_across_chats():
+    async def run():
+        notifier = bot.TelegramNotifier("token", max_queue_size=3, min_interval=60.0, max_retries=0)
+        notifier.start = lambda: None # 送信タスクは起動しない
+        notifier._wakeup = asyncio.Event()
+        notifier.enqueue("a-1", "chat-a")
+        notifier.enqueue("b-1", "chat-b")
+        notifier.enqueue("b-2", "chat-b")
+        notifier.enqueue("b-3", "chat-b") # 上限: 最も古い a-1 を破棄する (件数の多い chat-b ではなく)
+        return notifier
+
+    notifier = asyncio.run(run())
+    assert notifier.dropped_count == 1
+    assert notifier.queue_size == 3
+    assert not notifier._pending["chat-a"]
+    assert notifier._take_batch("chat-b") == "b-1\n\nb-2\n\nb-3"
@@ -0,0 +1,28 @@
+import asyncio
+
+import main_render as bot
+
+
+def test_order_management_ticker_does_not_wait_for_snapshot_refresh(monkeypatch):
+    calls = []
+
+    async def fake_exchange_request(method, *args, priority=bot.PRIORITY_MARKET_DATA, key=None, **kwargs):
+        calls.append((method, priority))
+        if method == 'fetch_tickers':
+            await asyncio.Event().wait() # スキャンの後ろで待機し続ける更新
+        return {'symbol': args[0], 'last': 1.5}
+
+    monkeypatch.setattr(bot, 'exchange_request', fake_exchange_request)
+    monkeypatch.setattr(bot, 'TICKER_SNAPSHOT', {'tickers': {}, 'timestamp': 0.0})
+    monkeypatch.setattr(bot, 'TICKER_SNAPSHOT_TASK', None)
+
+    async def run():
+        refresh = asyncio.create_task(bot.get_ticker_snapshot())
+        await asyncio.sleep(0)
+        ticker = await asyncio.wait_for(bot.get_ticker('BTC/USDT', priority=bot.PRIORITY_ORDER_MANAGEMENT), timeout=1.0)
+        refresh.cancel()
+        bot.TICKER_SNAPSHOT_TASK.cancel()
+        return ticker
+
+    assert asyncio.run(run())['last'] == 1.5
+    assert ('fetch_ticker', bot.PRIORITY_ORDER_MANAGEMENT) in calls
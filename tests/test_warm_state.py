@@ -0,0 +1,43 @@
+import asyncio
+import os
+import pickle
+import time
+
+import main_render as bot
+
+
+def _write_snapshot(path, **overrides):
+    data = {
+        'version': bot.WARM_STATE_VERSION,
+        'exchange': bot.CCXT_CLIENT_NAME.lower(),
+        'saved_at': time.time(),
+        'monitor_symbols': ['BTC/USDT'],
+        'last_signal_time': {},
+        'candles': {},
+        'indicator_engines': {},
+        'analysis_schedule': {},
+    }
+    data.update(overrides)
+    with open(path, 'wb') as f:
+        pickle.dump(data, f)
+
+
+def test_partial_snapshot_falls_back_to_cold_start(tmp_path, monkeypatch):
+    path = str(tmp_path / "warm_state.pkl")
+    monkeypatch.setattr(bot, 'WARM_STATE_PATH', path)
+    monkeypatch.setattr(bot, 'OHLCV_CACHE', {})
+    # 同じバージョンだが、ローソク足の項目が欠けている (古い形式/書き込み途中)
+    _write_snapshot(path, candles={('BTC/USDT', '1m'): {'columns': {}}})
+
+    assert asyncio.run(bot.load_warm_state()) is False
+    assert bot.OHLCV_CACHE == {}
+    assert not os.path.exists(path)
+
+
+def test_corrupt_snapshot_is_deleted(tmp_path, monkeypatch):
+    path = tmp_path / "warm_state.pkl"
+    path.write_bytes(b"not a pickle")
+    monkeypatch.setattr(bot, 'WARM_STATE_PATH', str(path))
+
+    assert asyncio.run(bot.load_warm_state()) is False
+    assert not path.exists()